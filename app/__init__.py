@@ -3,7 +3,6 @@ from pathlib import Path
 
 from flask import Flask
 from flask_bootstrap import Bootstrap
-from flask_bcrypt import Bcrypt
 from flask_cors import CORS
 from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
@@ -16,7 +15,6 @@ APP_FOLDER = Path(__file__).resolve().parent
 bootstrap = Bootstrap()
 cors = CORS()
 db = SQLAlchemy()
-bcrypt = Bcrypt()
 migrate = Migrate()
 
 
@@ -35,6 +33,59 @@ def create_app(config_name):
     bootstrap.init_app(app)
     db.init_app(app)
     migrate.init_app(app, db)
-    bcrypt.init_app(app)
     cors.init_app(app)
+
+    from app.models.api_key import api_key_cache
+    from app.models.blacklist_token import blacklist_filter, start_blacklist_reaper
+    from app.models.product import product_cache, product_counter
+    from app.models.user import token_cache, token_version_cache
+    from app.util.admission import credential_admission
+    from app.util.assets import asset_manifest
+    from app.util.bcrypt_pool import bcrypt_pool
+    from app.util.crypto import rsa_key_cache
+    from app.util.rate_limit import MemoryBackend, SqliteBackend, rate_limiter
+
+    rsa_key_cache.get()
+    asset_manifest.configure(app.config.get("ASSETS_FOLDER"))
+    token_cache.configure(maxsize=app.config.get("TOKEN_CACHE_SIZE"))
+    token_version_cache.configure(
+        maxsize=app.config.get("TOKEN_VERSION_CACHE_SIZE"),
+        ttl_seconds=app.config.get("TOKEN_VERSION_CACHE_SECONDS"),
+    )
+    api_key_cache.configure(
+        maxsize=app.config.get("API_KEY_CACHE_SIZE"),
+        ttl_seconds=app.config.get("API_KEY_CACHE_SECONDS"),
+    )
+    product_cache.configure(
+        maxsize=app.config.get("PRODUCT_CACHE_SIZE"),
+        ttl_seconds=app.config.get("PRODUCT_CACHE_SECONDS"),
+    )
+    product_counter.configure(
+        refresh_seconds=app.config.get("PRODUCT_COUNT_REFRESH_SECONDS")
+    )
+    bcrypt_pool.configure(
+        max_workers=app.config.get("BCRYPT_POOL_SIZE"),
+        max_queue=app.config.get("BCRYPT_POOL_MAX_QUEUE"),
+        timeout_seconds=app.config.get("BCRYPT_POOL_TIMEOUT_SECONDS"),
+    )
+    credential_admission.configure(
+        max_concurrent=app.config.get("CREDENTIAL_MAX_CONCURRENT"),
+        max_queue=app.config.get("CREDENTIAL_MAX_QUEUE"),
+        queue_timeout_seconds=app.config.get("CREDENTIAL_QUEUE_TIMEOUT_SECONDS"),
+    )
+    if app.config.get("RATE_LIMIT_BACKEND") == "sqlite":
+        rate_limit_backend = SqliteBackend(app.config.get("RATE_LIMIT_SQLITE_PATH"))
+    else:
+        rate_limit_backend = MemoryBackend()
+    rate_limiter.configure(
+        enabled=app.config.get("RATE_LIMIT_ENABLED"),
+        backend=rate_limit_backend,
+        limits=dict(
+            ip=app.config.get("RATE_LIMIT_PER_IP"),
+            email=app.config.get("RATE_LIMIT_PER_EMAIL"),
+        ),
+    )
+    app.before_first_request(blacklist_filter.load)
+    if app.config.get("BLACKLIST_PURGE_INTERVAL_SECONDS"):
+        app.extensions["blacklist_reaper"] = start_blacklist_reaper(app)
     return app
@@ -30,11 +30,15 @@ API_DESCRIPTION = (
     "is sent in the header of any request. If a request is sent without an auth token "
     "or with an expired/invalid auth token, the status code of the response will be "
     '<strong style="color:#f93e3e">401 UNAUTHORIZED</strong>.</p>'
+    "<p>Service clients can send an API key created with "
+    "<strong>POST /auth/api_keys</strong> instead, in the format "
+    "<code>ApiKey &lt;key&gt;</code>.</p>"
     "<p>API methods that require a valid authorization token AND administrator "
     "privileges are:</p>"
     '<ul><li style="margin:0 0 5px 0"><strong>POST product/{name}</strong></li>'
     '<li style="margin:0 0 5px 0"><strong>PUT product/{name}</strong></li>'
-    '<li style="margin:0 0 5px 0"><strong>DELETE product/{name}</strong></li></ul>'
+    '<li style="margin:0 0 5px 0"><strong>DELETE product/{name}</strong></li>'
+    '<li style="margin:0 0 5px 0"><strong>GET metrics</strong></li></ul>'
     "<p>If a user without administrator access sends a request containing a valid "
     "authorization token to any of these methods, the status code of the response "
     'will be <strong style="color:#f93e3e">403 FORBIDDEN</strong>. Administrator '
@@ -75,6 +79,10 @@ API_DESCRIPTION = (
     "using the public-key below:</p>"
     f'<div style="{responsive_style}"><pre style="{public_key_style}">'
     f'<code style="background:None">{public_key}</code></pre></div>'
+    "<p>The public keys are also published as a JSON Web Key Set at "
+    '<a href="../../.well-known/jwks.json">/.well-known/jwks.json</a>, the '
+    "<strong>kid</strong> header of each auth token identifies the key that signed "
+    "it.</p>"
 )
 
 api_bp = Blueprint("api", __name__, url_prefix="/api/v1")
@@ -91,7 +99,11 @@ api = Api(
 )
 
 from app.api.auth import auth_ns
+from app.api.auth.decorator import add_rate_limit_headers
+from app.api.metrics import metrics_ns
 from app.api.products import product_ns
 
 api.add_namespace(auth_ns, path="/auth")
 api.add_namespace(product_ns, path="/products")
+api.add_namespace(metrics_ns, path="/metrics")
+api_bp.after_request(add_rate_limit_headers)
@@ -1,5 +1,7 @@
 from flask_restplus import Namespace
 
-auth_ns = Namespace(name='auth', validate=True)
+from app.api.auth.decorator import rate_limited
+
+auth_ns = Namespace(name='auth', validate=True, decorators=[rate_limited])
 
 from app.api.auth import endpoints
\ No newline at end of file
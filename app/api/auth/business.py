@@ -1,21 +1,30 @@
 """Business logic for /auth API endpoints."""
 from http import HTTPStatus
 
-from flask import request
+from flask import current_app, g, request
 from flask_restplus import abort
 
 from app import db
+from app.models.api_key import ApiKey
 from app.models.blacklist_token import BlacklistToken
-from app.models.user import User
-from app.util.crypto import decrypt_user_credentials
+from app.models.refresh_token import RefreshToken
+from app.models.user import User, strip_bearer_prefix, token_cache
+from app.util.bcrypt_pool import PasswordHashingUnavailable
+from app.util.crypto import (
+    decrypt_user_credentials,
+    decrypt_user_credentials_ecdh,
+    get_token_digest,
+)
+from app.util.rate_limit import rate_limiter
 from app.util.result import Result
 
 
 def register_new_user(data):
-    result = decrypt_user_credentials(data["key"], data["iv"], data["ct"])
+    result = decrypt_credentials(data)
     if result.failure:
         abort(HTTPStatus.UNAUTHORIZED, result.error, status="fail")
     user_credentials = result.value
+    check_email_rate_limit(user_credentials["email"])
     if User.find_by_email(user_credentials["email"]):
         error = f"{user_credentials['email']} is already registered. Please Log in."
         abort(HTTPStatus.CONFLICT, error, status="fail")
@@ -26,6 +35,8 @@ def register_new_user(data):
         db.session.add(new_user)
         db.session.commit()
         return generate_token(new_user)
+    except PasswordHashingUnavailable as e:
+        abort(HTTPStatus.SERVICE_UNAVAILABLE, str(e), status="fail")
     except Exception as e:
         error = f"Error: {repr(e)}"
         abort(HTTPStatus.INTERNAL_SERVER_ERROR, error, status="fail")
@@ -34,12 +45,15 @@ def register_new_user(data):
 def generate_token(user):
     try:
         auth_token = user.encode_auth_token()
+        refresh_token = RefreshToken.issue(user)
+        db.session.commit()
         response_data = dict(
             status="success",
             message="Successfully registered",
             email=user.email,
             public_id=user.public_id,
             Authorization=auth_token.decode(),
+            refresh_token=refresh_token,
         )
         return response_data, HTTPStatus.CREATED
     except Exception as e:
@@ -48,18 +62,26 @@ def generate_token(user):
 
 
 def process_login(data):
-    result = decrypt_user_credentials(data["key"], data["iv"], data["ct"])
+    result = decrypt_credentials(data)
     if result.failure:
         abort(HTTPStatus.UNAUTHORIZED, result.error, status="fail")
     user_credentials = result.value
+    check_email_rate_limit(user_credentials["email"])
     user = User.find_by_email(user_credentials["email"])
-    if user and user.check_password(user_credentials["password"]):
+    try:
+        password_match = user and user.check_password(user_credentials["password"])
+    except PasswordHashingUnavailable as e:
+        abort(HTTPStatus.SERVICE_UNAVAILABLE, str(e), status="fail")
+    if password_match:
         auth_token = user.encode_auth_token()
+        refresh_token = RefreshToken.issue(user)
+        db.session.commit()
         response_data = dict(
             status="success",
             message="Successfully logged in",
             user=user.public_id,
             Authorization=auth_token.decode(),
+            refresh_token=refresh_token,
         )
         return response_data, HTTPStatus.OK
     else:
@@ -67,10 +89,76 @@ def process_login(data):
         abort(HTTPStatus.UNAUTHORIZED, error, status="fail")
 
 
-def process_logout():
+def process_refresh(data):
+    refresh_token = RefreshToken.find_by_token(data["refresh_token"])
+    if not refresh_token or refresh_token.expired:
+        error = "Invalid refresh token. Please log in again."
+        abort(HTTPStatus.UNAUTHORIZED, error, status="fail")
+    # the conditional update ensures each refresh token is exchanged exactly once,
+    # even if the same token is presented by two concurrent requests
+    if not RefreshToken.revoke_once(refresh_token.id):
+        RefreshToken.revoke_family(refresh_token.family)
+        db.session.commit()
+        error = "Refresh token has already been used. Please log in again."
+        abort(HTTPStatus.UNAUTHORIZED, error, status="fail")
+    try:
+        user = refresh_token.user
+        new_refresh_token = RefreshToken.issue(user, family=refresh_token.family)
+        db.session.commit()
+        auth_token = user.encode_auth_token()
+        response_data = dict(
+            status="success",
+            message="Successfully refreshed",
+            Authorization=auth_token.decode(),
+            refresh_token=new_refresh_token,
+        )
+        return response_data, HTTPStatus.OK
+    except Exception as e:
+        db.session.rollback()
+        error = f"Error: {repr(e)}"
+        abort(HTTPStatus.INTERNAL_SERVER_ERROR, error, status="fail")
+
+
+def introspect_tokens(data):
     check_auth_token()
-    auth_token = request.headers.get("Authorization")
+    max_tokens = current_app.config.get("INTROSPECT_MAX_TOKENS")
+    if len(data["tokens"]) > max_tokens:
+        error = f"At most {max_tokens} tokens can be introspected per request."
+        abort(HTTPStatus.BAD_REQUEST, error, status="fail")
+    results = []
+    verified = {}
+    for auth_token in data["tokens"]:
+        auth_token = strip_bearer_prefix(auth_token)
+        result = User.verify_auth_token(auth_token)
+        if result.failure:
+            results.append(dict(active=False, error=result.error))
+            continue
+        claims = result.value
+        user_dict = dict(public_id=claims["sub"], ver=claims.get("ver", 0))
+        result = User.check_token_version(user_dict)
+        if result.failure:
+            results.append(dict(active=False, error=result.error))
+            continue
+        token_result = dict(active=True, claims=claims, exp=claims["exp"])
+        verified.setdefault(get_token_digest(auth_token), []).append(token_result)
+        results.append(token_result)
+    for token_digest in BlacklistToken.find_blacklisted_digests(verified):
+        for token_result in verified[token_digest]:
+            token_result.update(
+                active=False,
+                claims=None,
+                error="Token blacklisted. Please log in again.",
+            )
+    return dict(status="success", results=results), HTTPStatus.OK
+
+
+def process_logout():
+    user_dict = check_user_auth_token()
+    if current_app.config.get("LOGOUT_REVOKES_ALL_SESSIONS"):
+        return process_revoke_all_sessions(user_dict)
+    auth_token = strip_bearer_prefix(request.headers.get("Authorization"))
     blacklist_token = BlacklistToken(auth_token)
+    token_cache.pop(get_token_digest(auth_token))
     try:
         db.session.add(blacklist_token)
         db.session.commit()
@@ -81,17 +169,99 @@ def process_logout():
         abort(HTTPStatus.INTERNAL_SERVER_ERROR, error, status="fail")
 
 
+def process_revoke_all_sessions(user_dict=None):
+    user_dict = user_dict or check_user_auth_token()
+    user = User.find_by_public_id(user_dict["public_id"])
+    try:
+        user.revoke_all_sessions()
+        RefreshToken.revoke_user(user.id)
+        db.session.commit()
+        response_dict = dict(status="success", message="Successfully logged out.")
+        return response_dict, HTTPStatus.OK
+    except Exception as e:
+        db.session.rollback()
+        error = f"Error: {repr(e)}"
+        abort(HTTPStatus.INTERNAL_SERVER_ERROR, error, status="fail")
+
+
 def get_logged_in_user():
     user_dict = check_auth_token()
+    if "email" in user_dict:
+        # the user details were signed into the token, no need to query the database
+        user_dict["registered_on_str"] = user_dict.pop("registered_on")
+        return user_dict, HTTPStatus.OK
     user = User.find_by_public_id(user_dict["public_id"])
     return user, HTTPStatus.OK
 
 
+def create_api_key(data):
+    user_dict = check_user_auth_token()
+    user = User.find_by_public_id(user_dict["public_id"])
+    try:
+        api_key = ApiKey.generate(data["name"], user)
+        db.session.commit()
+        response_data = dict(
+            status="success",
+            message="Successfully created API key, it will not be shown again.",
+            name=data["name"],
+            prefix=api_key.split(".")[0],
+            api_key=api_key,
+        )
+        return response_data, HTTPStatus.CREATED
+    except Exception as e:
+        db.session.rollback()
+        error = f"Error: {repr(e)}"
+        abort(HTTPStatus.INTERNAL_SERVER_ERROR, error, status="fail")
+
+
+def revoke_api_key(prefix):
+    user_dict = check_user_auth_token()
+    api_key = ApiKey.find_by_prefix(prefix)
+    if not api_key or api_key.user.public_id != user_dict["public_id"]:
+        error = f"API key {prefix} not found."
+        abort(HTTPStatus.NOT_FOUND, error, status="fail")
+    api_key.revoke()
+    db.session.commit()
+    return "", HTTPStatus.NO_CONTENT
+
+
+def decrypt_credentials(data):
+    """Decrypt user credentials sent with the ECDH (epk) or the RSA (key) scheme."""
+    if data.get("epk"):
+        return decrypt_user_credentials_ecdh(data["epk"], data["iv"], data["ct"])
+    if data.get("key"):
+        return decrypt_user_credentials(data["key"], data["iv"], data["ct"])
+    return Result.Fail(
+        "Encrypted session key (key) or ephemeral public key (epk) is required."
+    )
+
+
+def check_email_rate_limit(email):
+    """Raise RateLimitExceeded if too many requests have been made for this email."""
+    state = rate_limiter.enforce("email", email.lower())
+    current_state = g.get("rate_limit_state")
+    if state and (not current_state or state.remaining < current_state.remaining):
+        g.rate_limit_state = state
+
+
+def check_user_auth_token():
+    """Return claims of the auth token, rejecting requests authenticated by API key."""
+    if request.headers.get("Authorization", "").startswith("ApiKey "):
+        error = "This action requires an auth token, not an API key."
+        abort(HTTPStatus.FORBIDDEN, error, status="fail")
+    return check_auth_token()
+
+
 def check_auth_token():
     auth_token = request.headers.get("Authorization")
     if not auth_token:
         error = "Invalid token. Please log in again."
         abort(HTTPStatus.UNAUTHORIZED, error, status="fail")
+    if auth_token.startswith("ApiKey "):
+        user_dict = ApiKey.authenticate(auth_token.split("ApiKey")[1].strip())
+        if not user_dict:
+            abort(HTTPStatus.UNAUTHORIZED, "Invalid API key.", status="fail")
+        return user_dict
     result = User.decode_auth_token(auth_token)
     if result.failure:
         abort(HTTPStatus.UNAUTHORIZED, result.error, status="fail")
@@ -1,10 +1,13 @@
-"""Decorator that checks authorization token for administrator privileges."""
+"""Decorators that check authorization tokens and limit request rates."""
 from functools import wraps
 from http import HTTPStatus
 
+from flask import current_app, g, jsonify, request
 from flask_restplus import abort
 
 from app.api.auth.business import check_auth_token
+from app.util.admission import AdmissionRejected, credential_admission
+from app.util.rate_limit import RateLimitExceeded, rate_limiter
 
 
 def admin_token_required(f):
@@ -17,3 +20,59 @@ def admin_token_required(f):
         return f(*args, **kwargs)
 
     return decorated
+
+
+def credential_admission_required(f):
+    """Shed requests that decrypt credentials and hash passwords when overloaded.
+
+    The rejection is returned rather than raised so that it is not logged as a server
+    error, which would add to the load during a login storm.
+    """
+
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        try:
+            with credential_admission.admit():
+                return f(*args, **kwargs)
+        except AdmissionRejected as e:
+            retry_after = current_app.config.get("CREDENTIAL_RETRY_AFTER_SECONDS")
+            response_dict = dict(status="fail", message=str(e))
+            headers = {"Retry-After": str(retry_after)}
+            return response_dict, HTTPStatus.SERVICE_UNAVAILABLE, headers
+
+    return decorated
+
+
+def rate_limited(f):
+    """Apply the per-IP rate limit of each endpoint to a request.
+
+    This is a decorator of the auth namespace, so f returns a Response object. The
+    per-email limit is applied by the login and register business logic once the
+    email address has been decrypted.
+    """
+
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        try:
+            ip_key = f"{request.endpoint}:{request.remote_addr}"
+            g.rate_limit_state = rate_limiter.enforce("ip", ip_key)
+            return f(*args, **kwargs)
+        except RateLimitExceeded as e:
+            g.rate_limit_state = e.state
+            response = jsonify(status="fail", message=str(e))
+            response.status_code = HTTPStatus.TOO_MANY_REQUESTS
+            return response
+
+    return decorated
+
+
+def add_rate_limit_headers(response):
+    """Add RateLimit-* headers for the most restrictive limit applied to the request.
+
+    Registered as an after_request function, so that error responses created by the
+    API error handler include the headers as well.
+    """
+    state = g.get("rate_limit_state")
+    if state:
+        response.headers.extend(state.headers)
+    return response
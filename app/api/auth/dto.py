@@ -20,13 +20,27 @@ def base64_standard(input):
         raise ValueError("Value must be a base64 encoded string")
 
 
+def string_list(input):
+    """Return input if input is a non-empty list of strings, raise an exception if validation fails."""
+    if isinstance(input, list) and input and all(isinstance(i, str) for i in input):
+        return input
+    raise ValueError("Value must be a non-empty list of strings")
+
+
 secure_reqparser = reqparse.RequestParser(bundle_errors=True)
 secure_reqparser.add_argument(
     name="key",
     type=base64_standard,
-    required=True,
+    required=False,
     nullable=False,
-    help="Encrypted session key.",
+    help="Encrypted session key (RSA-OAEP), required unless epk is sent.",
+)
+secure_reqparser.add_argument(
+    name="epk",
+    type=base64_standard,
+    required=False,
+    nullable=False,
+    help="Ephemeral X25519 public key, sent instead of key.",
 )
 secure_reqparser.add_argument(
     name="iv",
@@ -39,6 +53,34 @@ secure_reqparser.add_argument(
     name="ct", type=base64_standard, required=True, nullable=False, help="Ciphertext"
 )
 
+refresh_reqparser = reqparse.RequestParser(bundle_errors=True)
+refresh_reqparser.add_argument(
+    name="refresh_token",
+    type=str,
+    required=True,
+    nullable=False,
+    help="Refresh token issued by login, register or a previous refresh.",
+)
+
+api_key_reqparser = reqparse.RequestParser(bundle_errors=True)
+api_key_reqparser.add_argument(
+    name="name",
+    type=str,
+    required=True,
+    nullable=False,
+    help="Name identifying the service client that will use the API key.",
+)
+
+introspect_reqparser = reqparse.RequestParser(bundle_errors=True)
+introspect_reqparser.add_argument(
+    name="tokens",
+    type=string_list,
+    location="json",
+    required=True,
+    nullable=False,
+    help="List of auth tokens to introspect.",
+)
+
 auth_reqparser = reqparse.RequestParser(bundle_errors=True)
 auth_reqparser.add_argument(
     name="email",
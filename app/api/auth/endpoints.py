@@ -5,13 +5,26 @@ from flask import request
 from flask_restplus import Resource
 
 from app.api.auth import auth_ns
-from app.api.auth.dto import auth_reqparser, secure_reqparser, user_model
+from app.api.auth.dto import (
+    api_key_reqparser,
+    auth_reqparser,
+    introspect_reqparser,
+    refresh_reqparser,
+    secure_reqparser,
+    user_model,
+)
 from app.api.auth.business import (
     register_new_user,
     process_login,
     process_logout,
+    process_refresh,
+    process_revoke_all_sessions,
     get_logged_in_user,
+    create_api_key,
+    revoke_api_key,
+    introspect_tokens,
 )
+from app.api.auth.decorator import credential_admission_required
 
 
 @auth_ns.route("/register")
@@ -20,6 +33,7 @@ class RegisterUser(Resource):
 
     @auth_ns.doc(False)
     @auth_ns.expect(secure_reqparser, validate=True)
+    @credential_admission_required
     def post(self):
         """Register a new user."""
         args = secure_reqparser.parse_args()
@@ -32,12 +46,32 @@ class LoginUser(Resource):
 
     @auth_ns.doc(False)
     @auth_ns.expect(secure_reqparser, validate=True)
+    @credential_admission_required
     def post(self):
         """Authenticate user and return a session token."""
         args = secure_reqparser.parse_args()
         return process_login(data=args)
 
 
+@auth_ns.route("/refresh")
+class RefreshAuthToken(Resource):
+    """Refresh Token Resource."""
+
+    @auth_ns.doc(
+        "refresh auth token",
+        responses={
+            HTTPStatus.OK: "New auth token and refresh token issued.",
+            HTTPStatus.BAD_REQUEST: "Validation error.",
+            HTTPStatus.UNAUTHORIZED: "Refresh token is invalid, expired or reused.",
+        },
+    )
+    @auth_ns.expect(refresh_reqparser, validate=True)
+    def post(self):
+        """Exchange a refresh token for a new auth token and refresh token."""
+        args = refresh_reqparser.parse_args()
+        return process_refresh(data=args)
+
+
 @auth_ns.route("/logout")
 class LogoutUser(Resource):
     """Logout Resource."""
@@ -57,6 +91,25 @@ class LogoutUser(Resource):
         return process_logout()
 
 
+@auth_ns.route("/revoke_all")
+class RevokeAllSessions(Resource):
+    """Revoke All Sessions Resource."""
+
+    @auth_ns.doc(
+        "revoke all sessions",
+        security="Bearer",
+        responses={
+            HTTPStatus.OK: "Every auth token and refresh token of the user is revoked.",
+            HTTPStatus.UNAUTHORIZED: "Token is invalid or expired.",
+            HTTPStatus.FORBIDDEN: "Request was authenticated with an API key.",
+            HTTPStatus.INTERNAL_SERVER_ERROR: "Internal server error.",
+        },
+    )
+    def post(self):
+        """Log out of every session, deauthenticating all tokens of the current user."""
+        return process_revoke_all_sessions()
+
+
 @auth_ns.route("/status")
 class AuthStatus(Resource):
     """Check user's authorization status."""
@@ -75,3 +128,64 @@ class AuthStatus(Resource):
     def get(self):
         """Validate a session token."""
         return get_logged_in_user()
+
+
+@auth_ns.route("/introspect")
+class IntrospectTokens(Resource):
+    """Token Introspection Resource."""
+
+    @auth_ns.doc(
+        "introspect auth tokens",
+        security="Bearer",
+        responses={
+            HTTPStatus.OK: "Result for each token, in the order given.",
+            HTTPStatus.BAD_REQUEST: "Validation error or too many tokens.",
+            HTTPStatus.UNAUTHORIZED: "Token is invalid or expired.",
+        },
+    )
+    @auth_ns.expect(introspect_reqparser, validate=True)
+    def post(self):
+        """Verify a batch of auth tokens, returning claims of the active tokens."""
+        args = introspect_reqparser.parse_args()
+        return introspect_tokens(data=args)
+
+
+@auth_ns.route("/api_keys")
+class CreateApiKey(Resource):
+    """API Key Resource."""
+
+    @auth_ns.doc(
+        "create API key",
+        security="Bearer",
+        responses={
+            HTTPStatus.CREATED: "API key created.",
+            HTTPStatus.BAD_REQUEST: "Validation error.",
+            HTTPStatus.UNAUTHORIZED: "Token is invalid or expired.",
+            HTTPStatus.FORBIDDEN: "Request was authenticated with an API key.",
+        },
+    )
+    @auth_ns.expect(api_key_reqparser, validate=True)
+    def post(self):
+        """Create an API key that service clients can use instead of an auth token."""
+        args = api_key_reqparser.parse_args()
+        return create_api_key(data=args)
+
+
+@auth_ns.route("/api_keys/<prefix>", endpoint="api_key")
+@auth_ns.param("prefix", "API key prefix (the part before the first '.')")
+class RevokeApiKey(Resource):
+    """API Key Resource."""
+
+    @auth_ns.doc(
+        "revoke API key",
+        security="Bearer",
+        responses={
+            HTTPStatus.NO_CONTENT: "API key revoked.",
+            HTTPStatus.UNAUTHORIZED: "Token is invalid or expired.",
+            HTTPStatus.FORBIDDEN: "Request was authenticated with an API key.",
+            HTTPStatus.NOT_FOUND: "API key not found.",
+        },
+    )
+    def delete(self, prefix):
+        """Revoke an API key."""
+        return revoke_api_key(prefix)
@@ -0,0 +1,5 @@
+from flask_restplus import Namespace
+
+metrics_ns = Namespace(name="metrics", validate=True)
+
+from app.api.metrics import endpoints
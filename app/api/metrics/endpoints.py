@@ -0,0 +1,27 @@
+"""API endpoint definitions for /metrics namespace."""
+from http import HTTPStatus
+
+from flask_restplus import Resource
+
+from app.api.auth.decorator import admin_token_required
+from app.api.metrics import metrics_ns
+from app.util.metrics import collect_stats
+
+
+@metrics_ns.route("/")
+class Metrics(Resource):
+    """Runtime statistics for the worker process that handles the request."""
+
+    @metrics_ns.doc(
+        "Retrieve runtime statistics.",
+        security="Bearer",
+        responses={
+            HTTPStatus.OK: "Successfully retrieved runtime statistics.",
+            HTTPStatus.UNAUTHORIZED: "Please login with a valid authorization token.",
+            HTTPStatus.FORBIDDEN: "You are not authorized to perform the requested action.",
+        },
+    )
+    @admin_token_required
+    def get(self):
+        """Retrieve runtime statistics."""
+        return collect_stats(), HTTPStatus.OK
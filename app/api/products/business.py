@@ -1,21 +1,140 @@
 """Business logic for /product API endpoints."""
 from datetime import datetime
+from hashlib import sha256
 from http import HTTPStatus
 
-from flask import jsonify
-from flask_restplus import abort
+from flask import current_app, jsonify, request
+from flask_restplus import abort, marshal
+from werkzeug.http import http_date, is_resource_modified, quote_etag
 
 from app import db
-from app.models.product import Product
+from app.api.products.dto import (
+    cursor_pagination_api_model,
+    encode_cursor,
+    pagination_api_model,
+    product_overview,
+)
+from app.models.product import (
+    Product,
+    ProductSnapshot,
+    product_cache,
+    product_counter,
+)
+
+
+def retrieve_product_list(args):
+    """Return a page of products, using cursor pagination if limit or after is sent.
+
+    Page numbers are kept for existing clients, sorted by id so that pages are
+    stable.
+    """
+    if args.get("limit") or args.get("after"):
+        return retrieve_products_after_cursor(args)
+    if args.get("order_by"):
+        error = "order_by is only supported with cursor pagination (limit/after)."
+        abort(HTTPStatus.BAD_REQUEST, error, status="fail")
+    page = args.get("page", 1)
+    per_page = args.get("per_page", 10)
+    offset = (page - 1) * per_page
+    query = Product.query.order_by(Product.id)
+    products = query.limit(per_page).offset(offset).all()
+    total = count_products(query, args.get("count"), offset, len(products), per_page)
+    pagination = dict(
+        page=page,
+        pages=(total + per_page - 1) // per_page if total is not None else None,
+        per_page=per_page,
+        total=total,
+        items=products,
+    )
+    return conditional_response(
+        get_page_etag(products, total),
+        get_page_last_modified(products),
+        lambda: marshal(pagination, pagination_api_model),
+    )
+
+
+def count_products(query, count, offset, num_items, per_page):
+    """Return total_items for a page of products, or None if count is "none".
+
+    A partial page ends the list, so its total is known without a COUNT query.
+    """
+    if count == "none":
+        return None
+    if num_items and num_items < per_page:
+        return offset + num_items
+    if count == "estimated":
+        return max(product_counter.get(), offset + num_items)
+    return query.order_by(None).count()
+
+
+def retrieve_products_after_cursor(args):
+    order_by = args.get("order_by")
+    after = None
+    if args.get("after"):
+        cursor_order_by, after = args["after"]
+        if order_by and order_by != cursor_order_by:
+            error = f"Cursor was issued for order_by={cursor_order_by}."
+            abort(HTTPStatus.BAD_REQUEST, error, status="fail")
+        order_by = cursor_order_by
+    order_by = order_by or "id"
+    limit = args.get("limit") or args.get("per_page", 10)
+    # one extra row tells whether there is a next page, without counting rows
+    products = Product.find_page_after(order_by, after, limit + 1)
+    next_cursor = None
+    if len(products) > limit:
+        products = products[:limit]
+        next_cursor = encode_cursor(order_by, getattr(products[-1], order_by))
+    page = dict(order_by=order_by, limit=limit, next=next_cursor, items=products)
+    return conditional_response(
+        get_page_etag(products, next_cursor),
+        get_page_last_modified(products),
+        lambda: marshal(page, cursor_pagination_api_model),
+    )
 
 
 def retrieve_product(product_name):
-    release_info = Product.find_by_name(product_name)
-    if release_info:
-        return release_info, HTTPStatus.OK
-    else:
+    release_info = Product.find_snapshot_by_name(product_name)
+    if not release_info:
         error = f"{product_name} not found in database."
         abort(HTTPStatus.NOT_FOUND, error, status="fail")
+    return conditional_response(
+        release_info.etag,
+        release_info.last_update,
+        lambda: marshal(release_info, product_overview),
+    )
+
+
+def conditional_response(etag, last_modified, get_body):
+    """Return 304 Not Modified if the client's copy is current, else the full body.
+
+    get_body is only called when the body is sent, so a 304 skips marshalling.
+    Clients are asked to revalidate every time (no-cache), since products can be
+    changed at any time.
+    """
+    headers = {"ETag": quote_etag(etag), "Cache-Control": "no-cache"}
+    if last_modified and last_modified != datetime.min:
+        headers["Last-Modified"] = http_date(last_modified)
+    else:
+        last_modified = None
+    if not is_resource_modified(
+        request.environ, etag=etag, last_modified=last_modified
+    ):
+        return current_app.response_class(
+            status=HTTPStatus.NOT_MODIFIED, headers=headers
+        )
+    return get_body(), HTTPStatus.OK, headers
+
+
+def get_page_etag(products, position):
+    """Return an ETag for a page of products and its total count or next cursor."""
+    page = repr([product.etag for product in products] + [position])
+    return sha256(page.encode("utf-8")).hexdigest()
+
+
+def get_page_last_modified(products):
+    return max(
+        (product.last_update or datetime.min for product in products), default=None
+    )
 
 
 def create_product(data):
@@ -32,6 +151,8 @@ def create_product(data):
         new_product = Product(**product_dict)
         db.session.add(new_product)
         db.session.commit()
+        product_cache.pop(product_name)
+        product_counter.add(1)
         response_object = dict(
             status="success", message=f"New product added: {product_name}."
         )
@@ -45,20 +166,33 @@ def create_product(data):
 
 
 def update_product(product_name, data):
-    request_data = {k: v for k, v in data.items()}
-    update_product = Product.find_by_name(product_name)
-    if not update_product:
-        error = f"Product name: {product_name} not found."
-        abort(HTTPStatus.NOT_FOUND, error, status="fail")
+    """Update the product with a single UPDATE statement.
+
+    With an If-Match header the product is only updated if it has not changed since
+    the client read it, otherwise the response is 412 Precondition Failed.
+    """
+    values = dict(data, last_update=datetime.utcnow())
+    expected_etags = None
+    if request.if_match and not request.if_match.star_tag:
+        expected_etags = list(request.if_match)
     try:
-        for k, v in request_data.items():
-            setattr(update_product, k, v)
-        setattr(update_product, "last_update", datetime.utcnow())
+        row = Product.update_by_name(product_name, values, expected_etags)
         db.session.commit()
-        return update_product, HTTPStatus.OK
     except Exception as e:
+        db.session.rollback()
         error = f"Error: {repr(e)}"
         abort(HTTPStatus.INTERNAL_SERVER_ERROR, error, status="fail")
+    if not row:
+        if expected_etags is None or not Product.find_by_name(product_name):
+            error = f"Product name: {product_name} not found."
+            abort(HTTPStatus.NOT_FOUND, error, status="fail")
+        product_cache.pop(product_name)
+        error = f"Product name: {product_name} was changed by another request."
+        abort(HTTPStatus.PRECONDITION_FAILED, error, status="fail")
+    updated_product = ProductSnapshot(row)
+    product_cache.set(product_name, updated_product)
+    headers = {"ETag": quote_etag(updated_product.etag)}
+    return updated_product, HTTPStatus.OK, headers
 
 
 def delete_product(product_name):
@@ -69,6 +203,8 @@ def delete_product(product_name):
     try:
         db.session.delete(release_info)
         db.session.commit()
+        product_cache.pop(product_name)
+        product_counter.add(-1)
         return "", HTTPStatus.NO_CONTENT
     except Exception as e:
         error = f"Error: {repr(e)}"
@@ -1,5 +1,7 @@
 """Parsers and serializers for /product API endpoints."""
+import json
 import re
+from base64 import urlsafe_b64decode, urlsafe_b64encode
 
 from flask_restplus import fields, reqparse
 from flask_restplus.inputs import URL
@@ -27,6 +29,32 @@ def xpath_query(xpath):
         raise ValueError("XPath query must not be null or empty string.")
 
 
+# columns that cursor pagination can order by (both have a unique index), and the
+# type of the value stored in a cursor for each
+CURSOR_VALUE_TYPES = dict(id=int, product_name=str)
+
+
+def encode_cursor(order_by, value):
+    """Return opaque cursor identifying the position after value in order_by order."""
+    cursor = json.dumps([order_by, value], separators=(",", ":")).encode("utf-8")
+    return urlsafe_b64encode(cursor).decode("ascii").rstrip("=")
+
+
+def product_cursor(cursor):
+    """Return (order_by, value) encoded in cursor, raise an exception if validation fails."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        order_by, value = json.loads(urlsafe_b64decode(padded.encode("ascii")))
+        valid = isinstance(value, CURSOR_VALUE_TYPES[order_by])
+    except (KeyError, TypeError, ValueError):
+        valid = False
+    if not valid:
+        raise ValueError(
+            "Cursor is not valid, use the value of next from a previous page."
+        )
+    return order_by, value
+
+
 post_product_parser = reqparse.RequestParser(bundle_errors=True)
 post_product_parser.add_argument(
     name="product_name",
@@ -121,6 +149,35 @@ pagination_parser.add_argument("page", type=int, required=False, default=1)
 pagination_parser.add_argument(
     "per_page", type=int, required=False, choices=[5, 10, 25, 50, 100], default=10
 )
+pagination_parser.add_argument(
+    "limit",
+    type=int,
+    required=False,
+    choices=[5, 10, 25, 50, 100],
+    help="Number of items per page, requests cursor pagination (use instead of per_page).",
+)
+pagination_parser.add_argument(
+    "after",
+    type=product_cursor,
+    required=False,
+    help="Cursor returned as next by the previous page, requests cursor pagination.",
+)
+pagination_parser.add_argument(
+    "order_by",
+    type=str,
+    required=False,
+    choices=list(CURSOR_VALUE_TYPES),
+    help="Sort order of cursor pagination (default: id).",
+)
+
+pagination_parser.add_argument(
+    "count",
+    type=str,
+    required=False,
+    choices=["exact", "estimated", "none"],
+    default="exact",
+    help="How total_items is computed: exact (COUNT query), estimated or none (null).",
+)
 
 pagination_api_model = product_ns.model(
     "Pagination",
@@ -132,3 +189,15 @@ pagination_api_model = product_ns.model(
         "items": fields.List(fields.Nested(product_overview)),
     },
 )
+
+cursor_pagination_api_model = product_ns.model(
+    "Cursor Pagination",
+    {
+        "order_by": fields.String,
+        "limit": fields.Integer,
+        "next": fields.String(
+            description="Cursor for the next page, null on the last page."
+        ),
+        "items": fields.List(fields.Nested(product_overview)),
+    },
+)
@@ -7,6 +7,7 @@ from app.api.auth.decorator import admin_token_required
 from app.api.products import product_ns
 from app.api.products.business import (
     retrieve_product,
+    retrieve_product_list,
     create_product,
     update_product,
     delete_product,
@@ -19,7 +20,6 @@ from app.api.products.dto import (
     product_detail,
     pagination_api_model,
 )
-from app.models.product import Product as ProductModel
 
 
 @product_ns.route("/")
@@ -27,19 +27,25 @@ from app.models.product import Product as ProductModel
 class ProductList(Resource):
     """Handlers for HTTP requests to /product API endpoints."""
 
-    @product_ns.doc("Get a list of all products.")
+    @product_ns.doc(
+        "Get a list of all products.",
+        responses={HTTPStatus.NOT_MODIFIED: "Page has not changed (If-None-Match)."},
+    )
     @product_ns.expect(pagination_parser, validate=True)
-    @product_ns.marshal_with(
-        pagination_api_model,
-        code=HTTPStatus.OK,
-        description="Successfully retrieved product list.",
+    @product_ns.response(
+        HTTPStatus.OK, "Successfully retrieved product list.", pagination_api_model
     )
     def get(self):
-        """Get a list of all products."""
+        """Get a list of all products.
+
+        Pages are selected with page and per_page, or with limit and the after cursor
+        (returned as next by the previous page), in which case the response contains
+        order_by, limit, next and items. Cursor pagination remains fast for deep
+        pages and is not affected by products added while paging. With page numbers,
+        count=estimated or count=none avoids counting every product for total_items.
+        """
         args = pagination_parser.parse_args()
-        return ProductModel.query.paginate(
-            args.get("page", 1), args.get("per_page", 10), error_out=False
-        )
+        return retrieve_product_list(args)
 
     @product_ns.doc(
         "Add new product.",
@@ -67,15 +73,21 @@ class Product(Resource):
     """Handlers for HTTP requests to /product/{name} API endpoints."""
 
     @product_ns.doc(
-        "Retrieve a product.", responses={HTTPStatus.NOT_FOUND: "Product not found."}
+        "Retrieve a product.",
+        responses={
+            HTTPStatus.NOT_MODIFIED: "Product has not changed (If-None-Match).",
+            HTTPStatus.NOT_FOUND: "Product not found.",
+        },
     )
-    @product_ns.marshal_with(
-        product_overview,
-        code=HTTPStatus.OK,
-        description="Successfully retrieved product.",
+    @product_ns.response(
+        HTTPStatus.OK, "Successfully retrieved product.", product_overview
     )
     def get(self, name):
-        """Retrieve a product."""
+        """Retrieve a product.
+
+        The response has an ETag and Last-Modified header, a request with a matching
+        If-None-Match or If-Modified-Since header gets a 304 response without a body.
+        """
         return retrieve_product(name)
 
     @product_ns.doc(
@@ -86,6 +98,7 @@ class Product(Resource):
             HTTPStatus.UNAUTHORIZED: "Please login with a valid authorization token.",
             HTTPStatus.FORBIDDEN: "You are not authorized to perform the requested action.",
             HTTPStatus.NOT_FOUND: "Product not found",
+            HTTPStatus.PRECONDITION_FAILED: "Product was changed (If-Match).",
             HTTPStatus.INTERNAL_SERVER_ERROR: "Internal server error.",
         },
     )
@@ -97,7 +110,11 @@ class Product(Resource):
     )
     @admin_token_required
     def put(self, name):
-        """Update an existing product."""
+        """Update an existing product.
+
+        Send the ETag of the product in an If-Match header to update it only if it
+        has not been changed since it was retrieved.
+        """
         args = put_product_parser.parse_args()
         return update_product(product_name=name, data=args)
 
@@ -25,11 +25,80 @@ class Config:
     JWT_KEY_P = os.getenv("JWT_KEY_P")
     JWT_KEY_Q = os.getenv("JWT_KEY_Q")
     JWT_KEY_U = os.getenv("JWT_KEY_U")
+    JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "RS256")
+    JWT_KEY_EC_D = os.getenv("JWT_KEY_EC_D")
+    JWT_KEY_ED25519 = os.getenv("JWT_KEY_ED25519")
+    JWT_RETIRED_PUBLIC_KEYS = os.getenv("JWT_RETIRED_PUBLIC_KEYS")
+    AUTH_ECDH_KEY = os.getenv("AUTH_ECDH_KEY")
+    # "pycryptodome" or "cryptography", compare them with "flask benchmark-crypto"
+    CRYPTO_BACKEND = os.getenv("CRYPTO_BACKEND", "pycryptodome")
+    # public keys are served with an ETag, so clients revalidate cheaply once the
+    # max-age expires (the secure_auth page embeds the keys, /static/public.pem
+    # uses the JWKS value)
+    JWKS_MAX_AGE_SECONDS = 3600
+    SECURE_AUTH_MAX_AGE_SECONDS = 300
+    # written by "flask build-assets", file names change with their content so
+    # they can be cached for a year
+    ASSETS_FOLDER = str(APP_FOLDER / "assets")
+    ASSETS_MAX_AGE_SECONDS = 365 * 24 * 60 * 60
     DEBUG = True
     TESTING = True
     BCRYPT_LOG_ROUNDS = 4
+    BCRYPT_TARGET_P95_MS = 250
+    BCRYPT_POOL_SIZE = 0
+    BCRYPT_POOL_MAX_QUEUE = 16
+    BCRYPT_POOL_TIMEOUT_SECONDS = 5
+    # login and register requests decrypt credentials and hash a password, at most
+    # CREDENTIAL_MAX_CONCURRENT run at once per worker and CREDENTIAL_MAX_QUEUE more
+    # wait; the sum should stay below the gunicorn --threads count (see heroku.sh) so
+    # that other endpoints always have a thread available
+    CREDENTIAL_MAX_CONCURRENT = 2
+    CREDENTIAL_MAX_QUEUE = 1
+    CREDENTIAL_QUEUE_TIMEOUT_SECONDS = 1
+    CREDENTIAL_RETRY_AFTER_SECONDS = 1
+    # sign email and registered_on into auth tokens so that /auth/status does not
+    # query the user table, tokens issued without them are served from the database
+    AUTH_TOKEN_USER_CLAIMS = True
+    # (capacity, period_seconds) token buckets for the /auth endpoints, per client IP
+    # and endpoint, and per email address for login and register; the "sqlite"
+    # backend shares buckets between all worker processes on the same host
+    RATE_LIMIT_ENABLED = True
+    RATE_LIMIT_BACKEND = "memory"
+    RATE_LIMIT_SQLITE_PATH = str(APP_FOLDER / "rate_limit.db")
+    RATE_LIMIT_PER_IP = (30, 60)
+    RATE_LIMIT_PER_EMAIL = (10, 60)
     AUTH_TOKEN_AGE_HOURS = 0
     AUTH_TOKEN_AGE_MINUTES = 0
+    REFRESH_TOKEN_AGE_DAYS = 30
+    INTROSPECT_MAX_TOKENS = 100
+    BLACKLIST_FILTER_ENABLED = True
+    BLACKLIST_FILTER_CAPACITY = 100000
+    BLACKLIST_FILTER_ERROR_RATE = 0.001
+    BLACKLIST_FILTER_REFRESH_SECONDS = 5
+    BLACKLIST_PURGE_BATCH_SIZE = 1000
+    # create_app starts one reaper thread per process when this is non-zero, so every
+    # gunicorn worker runs its own (purging is idempotent, batches are cheap to repeat).
+    # With gunicorn --preload the thread is started in the master and is not inherited
+    # by forked workers; in that case leave this at 0 and run "flask purge-blacklist"
+    # from a scheduler (e.g. cron or the Heroku Scheduler) instead.
+    BLACKLIST_PURGE_INTERVAL_SECONDS = 0
+    TOKEN_CACHE_SIZE = 4096
+    # POST /auth/revoke_all takes effect in other worker processes within
+    # TOKEN_VERSION_CACHE_SECONDS; with LOGOUT_REVOKES_ALL_SESSIONS logout does the
+    # same instead of adding the token to blacklist_tokens
+    TOKEN_VERSION_CACHE_SIZE = 4096
+    TOKEN_VERSION_CACHE_SECONDS = 10
+    LOGOUT_REVOKES_ALL_SESSIONS = False
+    API_KEY_HMAC_SECRET = os.getenv("API_KEY_HMAC_SECRET", SECRET_KEY)
+    API_KEY_CACHE_SIZE = 1024
+    API_KEY_CACHE_SECONDS = 30
+    # GET /products/?count=estimated takes total_items from a per-process counter,
+    # recounted every PRODUCT_COUNT_REFRESH_SECONDS to pick up other workers' changes
+    PRODUCT_COUNT_REFRESH_SECONDS = 60
+    # GET /products/<name> is served from a per-process cache, products changed by
+    # another process are seen by this one within PRODUCT_CACHE_SECONDS
+    PRODUCT_CACHE_SIZE = 1024
+    PRODUCT_CACHE_SECONDS = 60
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     PRESERVE_CONTEXT_ON_EXCEPTION = False
     SWAGGER_UI_DOC_EXPANSION = "list"
@@ -59,7 +128,11 @@ class ProductionConfig(Config):
     DEBUG = False
     TESTING = False
     AUTH_TOKEN_AGE_HOURS = 1
-    BCRYPT_LOG_ROUNDS = 13
+    # set by "flask calibrate-bcrypt --write" to fit BCRYPT_TARGET_P95_MS on the
+    # deployment hardware, existing hashes are upgraded when users log in
+    BCRYPT_LOG_ROUNDS = int(os.getenv("BCRYPT_LOG_ROUNDS", "13"))
+    BCRYPT_POOL_SIZE = 2
+    RATE_LIMIT_BACKEND = "sqlite"
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL", SQLITE_PROD)
     PRESERVE_CONTEXT_ON_EXCEPTION = True
 
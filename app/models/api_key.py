@@ -0,0 +1,92 @@
+"""API Key Model for authenticating service clients without a password."""
+import hmac
+import secrets
+from datetime import datetime
+from hashlib import sha256
+
+from flask import current_app
+
+from app import db
+from app.util.lru_cache import LRUCache
+from app.util.metrics import register_stats
+
+# owner and digest of recently used API keys, keyed by prefix
+api_key_cache = LRUCache()
+register_stats("api_key_cache", api_key_cache.stats)
+
+
+class ApiKey(db.Model):
+    """API Key Model for authenticating service clients without a password.
+
+    An API key is "<prefix>.<secret>". The prefix is stored in plain text and indexed,
+    so the row for a key can be found with a single lookup. The full key is stored
+    as an HMAC-SHA256 digest keyed with API_KEY_HMAC_SECRET. Since API keys are long
+    random strings, a slow password hash such as bcrypt is not needed to protect
+    them. Digests are compared in constant time.
+    """
+
+    __tablename__ = "api_keys"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    prefix = db.Column(db.String(16), unique=True, nullable=False)
+    key_digest = db.Column(db.String(64), nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("site_user.id"), nullable=False)
+    created_on = db.Column(db.DateTime, nullable=False)
+    revoked = db.Column(db.Boolean, nullable=False, default=False)
+
+    user = db.relationship("User")
+
+    def __init__(self, api_key, name, user):
+        self.prefix = api_key.split(".")[0]
+        self.key_digest = get_api_key_digest(api_key)
+        self.name = name
+        self.user = user
+        self.created_on = datetime.utcnow()
+        self.revoked = False
+
+    def __repr__(self):
+        return (
+            f"ApiKey<(prefix={self.prefix}, name={self.name}, revoked={self.revoked})>"
+        )
+
+    @classmethod
+    def generate(cls, name, user):
+        """Add a new API key for user to the session, return the key."""
+        api_key = f"{secrets.token_hex(6)}.{secrets.token_urlsafe(32)}"
+        db.session.add(cls(api_key, name, user))
+        return api_key
+
+    @classmethod
+    def find_by_prefix(cls, prefix):
+        return cls.query.filter_by(prefix=prefix).first()
+
+    @classmethod
+    def authenticate(cls, api_key):
+        """Return claims of the user that owns api_key, or None if it is not valid.
+
+        Rows are cached for API_KEY_CACHE_SECONDS, so a key revoked by another
+        process is accepted by this process for at most that long.
+        """
+        prefix = api_key.split(".")[0]
+        cached = api_key_cache.get(prefix)
+        if not cached:
+            row = cls.find_by_prefix(prefix)
+            if not row or row.revoked:
+                return None
+            user_dict = dict(public_id=row.user.public_id, admin=row.user.admin)
+            cached = (row.key_digest, user_dict)
+            api_key_cache.set(prefix, cached)
+        key_digest, user_dict = cached
+        if not hmac.compare_digest(get_api_key_digest(api_key), key_digest):
+            return None
+        return dict(user_dict)
+
+    def revoke(self):
+        self.revoked = True
+        api_key_cache.pop(self.prefix)
+
+
+def get_api_key_digest(api_key):
+    secret = current_app.config.get("API_KEY_HMAC_SECRET")
+    return hmac.new(secret.encode("utf-8"), api_key.encode("utf-8"), sha256).hexdigest()
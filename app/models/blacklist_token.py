@@ -1,27 +1,277 @@
 """Token Model for storing JWT tokens."""
+import threading
+import time
 from datetime import datetime, timezone
 
+import jwt
+from flask import current_app
+from sqlalchemy import event
+
 from app import db
+from app.util.bloom_filter import BloomFilter
+from app.util.crypto import get_token_digest
+from app.util.metrics import register_stats
+from app.util.periodic_task import PeriodicTask
+from app.util.result import Result
 
 
 class BlacklistToken(db.Model):
-    """Token Model for storing JWT tokens."""
+    """Token Model for storing JWT tokens.
+
+    Tokens are identified by their SHA-256 digest rather than stored in full, which
+    keeps rows and the unique index a fixed size regardless of the signing key
+    length. The token's expiration time is stored so that rows can be removed once
+    the token would be rejected by jwt.decode anyway.
+    """
 
     __tablename__ = "blacklist_tokens"
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    token = db.Column(db.String(500), unique=True, nullable=False)
+    token_digest = db.Column(db.String(64), unique=True, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
     blacklisted_on = db.Column(db.DateTime, nullable=False)
 
     def __init__(self, token):
-        self.token = token
+        self.token_digest = get_token_digest(token)
         self.blacklisted_on = datetime.now(timezone.utc)
+        self.expires_at = get_token_expiration(token)
 
     def __repr__(self):
-        return f"BlacklistToken<(id={self.id}, token={self.token})>"
+        return f"BlacklistToken<(id={self.id}, token_digest={self.token_digest})>"
 
     @classmethod
     def check_blacklist(cls, auth_token):
         # check whether auth token has been blacklisted
-        exists = cls.query.filter_by(token=str(auth_token)).first()
+        token_digest = get_token_digest(str(auth_token))
+        if not blacklist_filter.might_contain(token_digest):
+            return False
+        return cls.find_by_digest(token_digest)
+
+    @classmethod
+    def find_by_digest(cls, token_digest):
+        """Query the database for a digest that the blacklist filter may contain."""
+        exists = cls.query.filter_by(token_digest=token_digest).first()
+        if not exists:
+            blacklist_filter.false_positives += 1
         return True if exists else False
+
+    @classmethod
+    def find_blacklisted_digests(cls, token_digests):
+        """Return the subset of token_digests that have been blacklisted.
+
+        Digests that the blacklist filter rules out are not sent to the database, the
+        remainder are checked with a single query.
+        """
+        candidates = {
+            token_digest
+            for token_digest in token_digests
+            if blacklist_filter.might_contain(token_digest)
+        }
+        if not candidates:
+            return set()
+        rows = db.session.query(cls.token_digest).filter(
+            cls.token_digest.in_(candidates)
+        )
+        blacklisted = {token_digest for (token_digest,) in rows}
+        blacklist_filter.false_positives += len(candidates - blacklisted)
+        return blacklisted
+
+    @classmethod
+    def purge_expired(cls, batch_size):
+        """Delete rows for tokens that have expired, committing every batch_size rows.
+
+        Deleting in small batches keeps each transaction short, so the table is never
+        locked for long while a large backlog of expired rows is removed.
+        """
+        start = time.perf_counter()
+        now = datetime.utcnow()
+        rows_removed = 0
+        try:
+            while True:
+                expired_ids = [
+                    row_id
+                    for (row_id,) in db.session.query(cls.id)
+                    .filter(cls.expires_at < now)
+                    .limit(batch_size)
+                ]
+                if not expired_ids:
+                    break
+                cls.query.filter(cls.id.in_(expired_ids)).delete(
+                    synchronize_session=False
+                )
+                db.session.commit()
+                rows_removed += len(expired_ids)
+                if len(expired_ids) < batch_size:
+                    break
+        except Exception as e:
+            db.session.rollback()
+            error = f"Error occurred purging expired tokens: {repr(e)}"
+            return Result.Fail(error)
+        elapsed = time.perf_counter() - start
+        purge_stats.update(
+            runs=purge_stats["runs"] + 1,
+            rows_removed=purge_stats["rows_removed"] + rows_removed,
+            last_run=now.isoformat(),
+            last_rows_removed=rows_removed,
+            last_elapsed_seconds=elapsed,
+        )
+        return Result.Ok(dict(rows_removed=rows_removed, elapsed_seconds=elapsed))
+
+
+class BlacklistFilter:
+    """Per-process Bloom filter containing the digest of every blacklisted token.
+
+    A token that is not in the filter has definitely not been blacklisted, so
+    check_blacklist only queries the database when the filter reports a possible
+    match. The filter is loaded from the blacklist_tokens table, tokens inserted by
+    this process are added immediately and rows inserted by other processes are
+    picked up every BLACKLIST_FILTER_REFRESH_SECONDS.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bloom = None
+        self._last_id = 0
+        self._last_refresh = 0.0
+        self._refresh_seconds = 0
+        self.checks = 0
+        self.db_checks = 0
+        self.false_positives = 0
+
+    @property
+    def loaded(self):
+        return self._bloom is not None
+
+    def load(self):
+        """Build the filter from the rows currently stored in blacklist_tokens."""
+        config = current_app.config
+        if not config.get("BLACKLIST_FILTER_ENABLED"):
+            self._bloom = None
+            return
+        with self._lock:
+            total_rows = BlacklistToken.query.count()
+            capacity = max(config.get("BLACKLIST_FILTER_CAPACITY"), total_rows * 2)
+            bloom = BloomFilter(capacity, config.get("BLACKLIST_FILTER_ERROR_RATE"))
+            self._refresh_seconds = config.get("BLACKLIST_FILTER_REFRESH_SECONDS")
+            # populate the new filter before publishing it, so that concurrent checks
+            # never see a partially loaded filter and skip the database
+            self._last_id = self._add_new_rows(bloom, last_id=0)
+            self._bloom = bloom
+
+    def add(self, token_digest):
+        bloom = self._bloom
+        if bloom is None:
+            return
+        with self._lock:
+            bloom.add(token_digest)
+
+    def might_contain(self, token_digest):
+        """Return False if token has definitely not been blacklisted."""
+        if not self.loaded:
+            self.load()
+        if not self.loaded:
+            return True
+        if time.monotonic() - self._last_refresh >= self._refresh_seconds:
+            with self._lock:
+                self._last_id = self._add_new_rows(self._bloom, self._last_id)
+        self.checks += 1
+        if token_digest in self._bloom:
+            self.db_checks += 1
+            return True
+        return False
+
+    def stats(self):
+        bloom = self._bloom
+        if bloom is None:
+            return dict(loaded=False)
+        return dict(
+            loaded=True,
+            capacity=bloom.capacity,
+            error_rate=bloom.error_rate,
+            estimated_error_rate=bloom.estimated_error_rate,
+            num_bits=bloom.num_bits,
+            num_hashes=bloom.num_hashes,
+            size_bytes=bloom.size_bytes,
+            tokens=len(bloom),
+            checks=self.checks,
+            db_checks=self.db_checks,
+            false_positives=self.false_positives,
+        )
+
+    def _add_new_rows(self, bloom, last_id):
+        """Add rows inserted after last_id to bloom, returning the new last_id.
+
+        Rows inserted by this process are already in the filter, BloomFilter.add
+        does not count them a second time.
+        """
+        rows = (
+            db.session.query(BlacklistToken.id, BlacklistToken.token_digest)
+            .filter(BlacklistToken.id > last_id)
+            .order_by(BlacklistToken.id)
+            .all()
+        )
+        for row_id, token_digest in rows:
+            bloom.add(token_digest)
+            last_id = row_id
+        self._last_refresh = time.monotonic()
+        return last_id
+
+
+blacklist_filter = BlacklistFilter()
+register_stats("blacklist_filter", blacklist_filter.stats)
+
+purge_stats = dict(
+    runs=0,
+    rows_removed=0,
+    last_run=None,
+    last_rows_removed=None,
+    last_elapsed_seconds=None,
+)
+register_stats("blacklist_purge", lambda: dict(purge_stats))
+
+
+@event.listens_for(BlacklistToken, "after_insert")
+def add_token_to_blacklist_filter(mapper, connection, target):
+    blacklist_filter.add(target.token_digest)
+
+
+def get_token_expiration(auth_token):
+    """Return the (naive, UTC) expiration time of an auth token without verifying it.
+
+    Tokens that cannot be decoded will never pass signature verification, so they are
+    considered to have already expired.
+    """
+    try:
+        payload = jwt.decode(auth_token, verify=False)
+        return datetime.utcfromtimestamp(payload["exp"])
+    except (jwt.InvalidTokenError, KeyError, TypeError, ValueError):
+        return datetime.utcnow()
+
+
+def start_blacklist_reaper(app):
+    """Purge expired blacklisted tokens every BLACKLIST_PURGE_INTERVAL_SECONDS."""
+
+    def purge_expired_tokens():
+        with app.app_context():
+            try:
+                result = BlacklistToken.purge_expired(
+                    app.config.get("BLACKLIST_PURGE_BATCH_SIZE")
+                )
+                if result.failure:
+                    app.logger.error(result.error)
+                    return
+                app.logger.info(
+                    "Purged %d expired blacklisted tokens in %.3f seconds",
+                    result.value["rows_removed"],
+                    result.value["elapsed_seconds"],
+                )
+            finally:
+                db.session.remove()
+
+    reaper = PeriodicTask(
+        app.config.get("BLACKLIST_PURGE_INTERVAL_SECONDS"),
+        purge_expired_tokens,
+        name="blacklist-reaper",
+    )
+    reaper.start()
+    return reaper
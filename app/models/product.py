@@ -1,10 +1,17 @@
 """Defines data model used by /api/product endpoints."""
+import threading
+import time
 from datetime import datetime
 
 from sqlalchemy.ext.hybrid import hybrid_property
 
 from app import db
 from app.util.constants import DT_STR_FORMAT_NAIVE
+from app.util.lru_cache import LRUCache
+from app.util.metrics import register_stats
+
+product_cache = LRUCache()
+register_stats("product_cache", product_cache.stats)
 
 
 class Product(db.Model):
@@ -18,6 +25,15 @@ class Product(db.Model):
     download_url = db.Column(db.String(), unique=False)
     last_update = db.Column(db.DateTime, nullable=True, default=datetime.min)
     last_checked = db.Column(db.DateTime, nullable=True, default=datetime.min)
+    # incremented by every update, the ORM checks it when flushing changes and PUT
+    # /products/<name> compares it with the version in the If-Match ETag
+    version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+    __mapper_args__ = {"version_id_col": version}
+
+    @property
+    def etag(self):
+        return get_product_etag(self.id, self.version)
 
     @hybrid_property
     def last_update_str(self):
@@ -69,3 +85,174 @@ class Product(db.Model):
     @classmethod
     def find_by_name(cls, product_name):
         return cls.query.filter_by(product_name=product_name).first()
+
+    @classmethod
+    def find_snapshot_by_name(cls, product_name):
+        """Return a ProductSnapshot of the product, or None if it does not exist.
+
+        Snapshots are cached for PRODUCT_CACHE_SECONDS, create_product,
+        update_product and delete_product keep the cache of this process current.
+        """
+        snapshot = product_cache.get(product_name)
+        if snapshot is None:
+            product = cls.find_by_name(product_name)
+            if not product:
+                return None
+            snapshot = product.to_snapshot()
+            product_cache.set(product_name, snapshot)
+        return snapshot
+
+    def to_snapshot(self):
+        return ProductSnapshot(self)
+
+    @classmethod
+    def update_by_name(cls, product_name, values, expected_etags=None):
+        """Update the product with a single UPDATE statement, return the new row.
+
+        If expected_etags is given, the row is only updated if its current ETag is
+        one of them. Returns None if no row was updated. The row is read by the
+        UPDATE itself where the database supports UPDATE ... RETURNING.
+        """
+        table = cls.__table__
+        statement = table.update().where(table.c.product_name == product_name)
+        if expected_etags is not None:
+            expected = [db.false()]
+            for etag in expected_etags:
+                product_id, version = parse_product_etag(etag)
+                if product_id is not None:
+                    expected.append(
+                        db.and_(table.c.id == product_id, table.c.version == version)
+                    )
+            statement = statement.where(db.or_(*expected))
+        statement = statement.values(version=table.c.version + 1, **values)
+        if db.session.get_bind().dialect.implicit_returning:
+            return db.session.execute(statement.returning(*table.c)).first()
+        if not db.session.execute(statement).rowcount:
+            return None
+        return db.session.execute(
+            table.select().where(table.c.product_name == product_name)
+        ).first()
+
+    @classmethod
+    def find_page_after(cls, order_by, after, limit):
+        """Return up to limit products that follow after when sorted by order_by.
+
+        order_by must be a column with a unique index, so the page is read with a
+        single index range scan however deep into the list it is.
+        """
+        column = getattr(cls, order_by)
+        query = cls.query.order_by(column)
+        if after is not None:
+            query = query.filter(column > after)
+        return query.limit(limit).all()
+
+
+class ProductSnapshot:
+    """Read-only copy of a Product row, safe to share between requests and threads."""
+
+    __slots__ = (
+        "id",
+        "product_name",
+        "release_info_url",
+        "xpath_version_number",
+        "xpath_download_url",
+        "newest_version_number",
+        "download_url",
+        "last_update",
+        "last_checked",
+        "version",
+    )
+
+    def __init__(self, product):
+        for name in self.__slots__:
+            object.__setattr__(self, name, getattr(product, name))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    @property
+    def etag(self):
+        return get_product_etag(self.id, self.version)
+
+    @property
+    def last_update_str(self):
+        return (
+            self.last_update.strftime(DT_STR_FORMAT_NAIVE) if self.last_update else None
+        )
+
+    @property
+    def last_checked_str(self):
+        return (
+            self.last_checked.strftime(DT_STR_FORMAT_NAIVE)
+            if self.last_checked
+            else None
+        )
+
+
+def get_product_etag(product_id, version):
+    """Return a strong ETag for a product, which changes whenever it is updated."""
+    return f"{product_id}-{version}"
+
+
+def parse_product_etag(etag):
+    """Return (product_id, version) from a product ETag, or (None, None) if invalid."""
+    product_id, _, version = etag.partition("-")
+    if not (product_id.isdigit() and version.isdigit()):
+        return None, None
+    return int(product_id), int(version)
+
+
+class ProductCounter:
+    """Per-process count of the rows in release_info, used to estimate list totals.
+
+    The count is read with COUNT(*) the first time it is needed and again every
+    refresh_seconds, which picks up products added or removed by other processes.
+    create_product and delete_product adjust the count immediately after commit.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._count = None
+        self._last_refresh = 0.0
+        self.refresh_seconds = 0
+        self.reads = 0
+        self.refreshes = 0
+
+    def configure(self, refresh_seconds):
+        with self._lock:
+            self.refresh_seconds = refresh_seconds
+            self._count = None
+
+    def get(self):
+        """Return the estimated number of products."""
+        if (
+            self._count is None
+            or time.monotonic() - self._last_refresh >= self.refresh_seconds
+        ):
+            self.refresh()
+        self.reads += 1
+        return self._count
+
+    def refresh(self):
+        count = db.session.query(db.func.count(Product.id)).scalar()
+        with self._lock:
+            self._count = count
+            self._last_refresh = time.monotonic()
+            self.refreshes += 1
+
+    def add(self, delta):
+        with self._lock:
+            if self._count is not None:
+                self._count = max(0, self._count + delta)
+
+    def stats(self):
+        return dict(
+            count=self._count,
+            refresh_seconds=self.refresh_seconds,
+            reads=self.reads,
+            refreshes=self.refreshes,
+        )
+
+
+product_counter = ProductCounter()
+register_stats("product_counter", product_counter.stats)
@@ -0,0 +1,85 @@
+"""Refresh Token Model for exchanging a long-lived token for new auth tokens."""
+import secrets
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from app import db
+from app.util.crypto import get_token_digest
+
+
+class RefreshToken(db.Model):
+    """Refresh Token Model for exchanging a long-lived token for new auth tokens.
+
+    Refresh tokens are random strings, only their SHA-256 digest is stored. Every
+    token can be used once: it is revoked when exchanged and replaced by a new token
+    in the same family. If a revoked token is presented again it has been copied, so
+    every token in its family is revoked and the user must log in again.
+    """
+
+    __tablename__ = "refresh_tokens"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    token_digest = db.Column(db.String(64), unique=True, nullable=False)
+    family = db.Column(db.String(36), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("site_user.id"), nullable=False)
+    issued_on = db.Column(db.DateTime, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    revoked = db.Column(db.Boolean, nullable=False, default=False)
+
+    user = db.relationship("User")
+
+    def __init__(self, token, user, family):
+        now = datetime.utcnow()
+        self.token_digest = get_token_digest(token)
+        self.family = family
+        self.user = user
+        self.issued_on = now
+        self.expires_at = now + timedelta(
+            days=current_app.config.get("REFRESH_TOKEN_AGE_DAYS")
+        )
+        self.revoked = False
+
+    def __repr__(self):
+        return (
+            "RefreshToken<("
+            f"id={self.id}, "
+            f"family={self.family}, "
+            f"revoked={self.revoked})>"
+        )
+
+    @property
+    def expired(self):
+        return self.expires_at <= datetime.utcnow()
+
+    @classmethod
+    def issue(cls, user, family=None):
+        """Add a new refresh token for user to the session, return the token."""
+        token = secrets.token_urlsafe(32)
+        family = family or secrets.token_hex(16)
+        db.session.add(cls(token, user, family))
+        return token
+
+    @classmethod
+    def find_by_token(cls, token):
+        return cls.query.filter_by(token_digest=get_token_digest(token)).first()
+
+    @classmethod
+    def revoke_once(cls, refresh_token_id):
+        """Revoke token if it has not been revoked yet, return True if it was."""
+        updated = cls.query.filter_by(id=refresh_token_id, revoked=False).update(
+            dict(revoked=True), synchronize_session=False
+        )
+        return updated == 1
+
+    @classmethod
+    def revoke_family(cls, family):
+        cls.query.filter_by(family=family).update(
+            dict(revoked=True), synchronize_session=False
+        )
+
+    @classmethod
+    def revoke_user(cls, user_id):
+        cls.query.filter_by(user_id=user_id, revoked=False).update(
+            dict(revoked=True), synchronize_session=False
+        )
@@ -6,12 +6,31 @@ from datetime import datetime, timedelta
 from flask import current_app
 from sqlalchemy.ext.hybrid import hybrid_property
 
-from app import db, bcrypt
-from app.models.blacklist_token import BlacklistToken
+from app import db
+from app.models.blacklist_token import BlacklistToken, blacklist_filter
+from app.util.bcrypt_pool import bcrypt_pool, get_log_rounds
 from app.util.constants import DT_STR_FORMAT_NAIVE
-from app.util.crypto import get_private_key, get_public_key
+from app.util.crypto import get_signing_key, get_token_digest, get_verification_key
+from app.util.lru_cache import LRUCache
+from app.util.metrics import register_stats
 from app.util.result import Result
 
+# decoded claims of recently verified auth tokens, keyed by token digest
+token_cache = LRUCache()
+register_stats("token_cache", token_cache.stats)
+
+# token_version of recently authenticated users, keyed by public_id
+token_version_cache = LRUCache()
+register_stats("token_version_cache", token_version_cache.stats)
+
+
+def strip_bearer_prefix(auth_token):
+    """Return auth token without the "Bearer" authentication scheme prefix."""
+    if auth_token.startswith("Bearer "):
+        split = auth_token.split("Bearer")
+        auth_token = split[1].strip()
+    return auth_token
+
 
 class User(db.Model):
     """User model for storing logon credentials and other details."""
@@ -24,6 +43,7 @@ class User(db.Model):
     admin = db.Column(db.Boolean, nullable=False, default=False)
     public_id = db.Column(db.String(100), unique=True)
     password_hash = db.Column(db.String(100))
+    token_version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
 
     @hybrid_property
     def registered_on_str(self):
@@ -39,6 +59,7 @@ class User(db.Model):
         self.password = password
         self.registered_on = datetime.utcnow()
         self.admin = admin
+        self.token_version = 0
 
     def __repr__(self):
         return (
@@ -54,12 +75,21 @@ class User(db.Model):
 
     @password.setter
     def password(self, password):
-        self.password_hash = bcrypt.generate_password_hash(
+        self.password_hash = bcrypt_pool.generate_password_hash(
             password, current_app.config.get("BCRYPT_LOG_ROUNDS")
-        ).decode("utf-8")
+        )
 
     def check_password(self, password):
-        return bcrypt.check_password_hash(self.password_hash, password)
+        """Return True if password matches, rehashing it if the cost factor changed.
+
+        The new hash is added to the session and saved with the next commit, so that
+        BCRYPT_LOG_ROUNDS can be raised or lowered without a forced password reset.
+        """
+        password_match = bcrypt_pool.check_password_hash(self.password_hash, password)
+        log_rounds = current_app.config.get("BCRYPT_LOG_ROUNDS")
+        if password_match and get_log_rounds(self.password_hash) != log_rounds:
+            self.password = password
+        return password_match
 
     def encode_auth_token(self):
         """Generate auth token."""
@@ -70,38 +100,89 @@ class User(db.Model):
             seconds=5,
         )
 
-        result = get_private_key()
+        result = get_signing_key()
         if result.success:
-            key = result.value
-            algorithm = "RS256"
+            key = result.value.signing_key
+            algorithm = result.value.algorithm
+            headers = dict(kid=result.value.kid)
         else:
             key = current_app.config.get("SECRET_KEY")
             algorithm = "HS256"
-
-        payload = dict(exp=expire_time, iat=now, sub=self.public_id, admin=self.admin)
-        return jwt.encode(payload, key, algorithm=algorithm)
+            headers = None
+
+        payload = dict(
+            exp=expire_time,
+            iat=now,
+            sub=self.public_id,
+            admin=self.admin,
+            ver=self.token_version,
+        )
+        token_version_cache.set(self.public_id, self.token_version)
+        if current_app.config.get("AUTH_TOKEN_USER_CLAIMS"):
+            payload.update(email=self.email, registered_on=self.registered_on_str)
+        return jwt.encode(payload, key, algorithm=algorithm, headers=headers)
 
     @staticmethod
     def decode_auth_token(auth_token):
         """Decode the auth token."""
-        if auth_token.startswith("Bearer "):
-            split = auth_token.split("Bearer")
-            auth_token = split[1].strip()
-        if BlacklistToken.check_blacklist(auth_token):
-            error = "Token blacklisted. Please log in again."
+        auth_token = strip_bearer_prefix(auth_token)
+        token_digest = get_token_digest(auth_token)
+        if blacklist_filter.might_contain(token_digest):
+            if BlacklistToken.find_by_digest(token_digest):
+                error = "Token blacklisted. Please log in again."
+                return Result.Fail(error)
+        else:
+            # the cache is only consulted once the filter has ruled out the token
+            # being blacklisted, so its hit count matches the claims it returns
+            user_dict = token_cache.get(token_digest)
+            if user_dict:
+                return User.check_token_version(user_dict)
+
+        result = User.verify_auth_token(auth_token)
+        if result.failure:
+            return result
+        payload = result.value
+        user_dict = dict(
+            public_id=payload["sub"], admin=payload["admin"], ver=payload.get("ver", 0)
+        )
+        if "email" in payload:
+            user_dict.update(
+                email=payload["email"], registered_on=payload["registered_on"]
+            )
+        token_cache.set(token_digest, user_dict, expires_at=payload["exp"])
+        return User.check_token_version(user_dict)
+
+    @staticmethod
+    def check_token_version(user_dict):
+        """Reject tokens issued before the user's sessions were revoked.
+
+        Token versions are cached for TOKEN_VERSION_CACHE_SECONDS, so a revocation
+        made by another process takes effect in this process within that time.
+        """
+        token_version = User.get_token_version(user_dict["public_id"])
+        if token_version is None or user_dict["ver"] != token_version:
+            error = "Token revoked. Please log in again."
             return Result.Fail(error)
+        return Result.Ok(dict(user_dict))
 
-        result = get_public_key()
-        if result.success:
-            key = result.value
-            algorithm = "RS256"
-        else:
-            key = current_app.config.get("SECRET_KEY")
-            algorithm = "HS256"
+    @staticmethod
+    def verify_auth_token(auth_token):
+        """Verify signature and expiration of the auth token, return its claims.
 
+        The blacklist is not checked, see decode_auth_token.
+        """
         try:
-            payload = jwt.decode(auth_token, key, algorithms=[algorithm])
-            return Result.Ok(dict(public_id=payload["sub"], admin=payload["admin"]))
+            kid = jwt.get_unverified_header(auth_token).get("kid")
+            result = get_verification_key(kid)
+            if result.success:
+                key = result.value.public_key
+                algorithm = result.value.algorithm
+            elif kid:
+                raise jwt.InvalidTokenError(result.error)
+            else:
+                key = current_app.config.get("SECRET_KEY")
+                algorithm = "HS256"
+            return Result.Ok(jwt.decode(auth_token, key, algorithms=[algorithm]))
         except jwt.ExpiredSignatureError:
             error = "Authorization token expired. Please log in again."
             return Result.Fail(error)
@@ -109,6 +190,27 @@ class User(db.Model):
             error = "Invalid token. Please log in again."
             return Result.Fail(error)
 
+    def revoke_all_sessions(self):
+        """Invalidate every auth token issued to this user, the caller must commit."""
+        User.query.filter_by(id=self.id).update(
+            {User.token_version: User.token_version + 1}, synchronize_session=False
+        )
+        db.session.refresh(self)
+        token_version_cache.set(self.public_id, self.token_version)
+
+    @classmethod
+    def get_token_version(cls, public_id):
+        token_version = token_version_cache.get(public_id)
+        if token_version is None:
+            token_version = (
+                db.session.query(cls.token_version)
+                .filter_by(public_id=public_id)
+                .scalar()
+            )
+            if token_version is not None:
+                token_version_cache.set(public_id, token_version)
+        return token_version
+
     @classmethod
     def find_by_email(cls, email):
         return cls.query.filter_by(email=email).first()
@@ -2,5 +2,7 @@ from flask import Blueprint
 
 routes_bp = Blueprint("routes", __name__, url_prefix="/")
 
+from app.routes import assets
 from app.routes import redirects
 from app.routes import secure_auth
+from app.routes import well_known
@@ -0,0 +1,59 @@
+"""URL route definitions for fingerprinted, precompressed static assets."""
+import mimetypes
+from http import HTTPStatus
+
+from flask import abort, current_app, request, safe_join, send_file, url_for
+
+from app.routes import routes_bp
+from app.util.assets import ENCODINGS, asset_manifest
+
+
+@routes_bp.route("/assets/<path:filename>", methods=["GET"])
+def assets(filename):
+    """Serve a file written by "flask build-assets", precompressed if possible.
+
+    The name of a fingerprinted file changes whenever its content changes, so the
+    response can be cached indefinitely. The br or gzip variant is sent when the
+    client accepts it, with send_file so the WSGI server can use sendfile.
+    """
+    encodings = asset_manifest.get_encodings(filename)
+    if encodings is None:
+        abort(HTTPStatus.NOT_FOUND)
+    path = safe_join(str(asset_manifest.folder), filename)
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    content_encoding = None
+    for encoding, suffix in ENCODINGS:
+        if encoding in encodings and request.accept_encodings[encoding]:
+            path = f"{path}{suffix}"
+            content_encoding = encoding
+            break
+    response = send_file(
+        path,
+        mimetype=mimetype,
+        conditional=True,
+        cache_timeout=current_app.config.get("ASSETS_MAX_AGE_SECONDS"),
+    )
+    if content_encoding:
+        response.headers["Content-Encoding"] = content_encoding
+    response.vary.add("Accept-Encoding")
+    response.headers["Cache-Control"] += ", immutable"
+    return response
+
+
+@routes_bp.app_template_global()
+def asset_url(filename):
+    """Return the URL of a static file, fingerprinted if assets have been built."""
+    hashed_name = asset_manifest.get_path(filename)
+    if hashed_name:
+        return url_for("routes.assets", filename=hashed_name)
+    return url_for("static", filename=filename)
+
+
+# replaces the function of the same name registered by flask-restplus for the
+# Swagger UI page, routes_bp is registered after the API blueprint
+@routes_bp.app_template_global("swagger_static")
+def swagger_static_url(filename):
+    hashed_name = asset_manifest.get_path(f"swaggerui/{filename}")
+    if hashed_name:
+        return url_for("routes.assets", filename=hashed_name)
+    return url_for("restplus_doc.static", filename=filename)
@@ -1,21 +1,90 @@
 """URL route definitions for secure authorization tool."""
 import json
-from flask import render_template, flash, redirect, url_for
+from collections import namedtuple
+from hashlib import sha256
+from http import HTTPStatus
+
+from flask import (
+    Response,
+    current_app,
+    flash,
+    redirect,
+    render_template,
+    request,
+    session,
+    url_for,
+)
 
 from app.routes import routes_bp
-from app.util.crypto import get_public_key_hex
+from app.util.crypto import (
+    get_ecdh_public_key_hex,
+    get_public_key,
+    get_public_key_fingerprint,
+    get_public_key_hex,
+)
+
+RenderedPage = namedtuple("RenderedPage", ["public_keys", "body", "etag"])
+
+# the page only changes when a key is rotated, so it is rendered once per process
+# for the current keys. The ETag is the digest of the page, which is the same in
+# every worker and changes whenever the keys or the template change.
+rendered_secure_auth = RenderedPage(public_keys=None, body=None, etag=None)
 
 
 @routes_bp.route("/secure_auth", methods=["GET", "POST"])
 def secure_auth():
+    global rendered_secure_auth
     result = get_public_key_hex()
     if result.failure:
         flash(result.error)
         return redirect(url_for("routes.secure_auth"))
     public_key = result.value
+    # the X25519 key is optional, without it auth.js encrypts credentials with RSA
+    result = get_ecdh_public_key_hex()
+    ecdh_public_key = result.value if result.success else ""
+    if session.get("_flashes"):
+        return render_secure_auth(public_key, ecdh_public_key)
+
+    page = rendered_secure_auth
+    if page.public_keys != (public_key, ecdh_public_key):
+        body = render_secure_auth(public_key, ecdh_public_key)
+        page = RenderedPage(
+            public_keys=(public_key, ecdh_public_key),
+            body=body,
+            etag=sha256(body.encode("utf-8")).hexdigest(),
+        )
+        rendered_secure_auth = page
+    response = Response(page.body, mimetype="text/html")
+    response.set_etag(page.etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config.get(
+        "SECURE_AUTH_MAX_AGE_SECONDS"
+    )
+    return response.make_conditional(request)
+
+
+@routes_bp.route("/static/public.pem", methods=["GET"])
+def public_key_pem():
+    """RSA public key in PEM format, with the key fingerprint as its ETag.
+
+    This takes precedence over the static file of the same name (written by "flask
+    create-pem"), so the key served is always the one currently in use.
+    """
+    result = get_public_key()
+    if result.failure:
+        return Response(status=HTTPStatus.NOT_FOUND)
+    public_key_pem = result.value
+    response = Response(public_key_pem, mimetype="application/x-pem-file")
+    response.set_etag(get_public_key_fingerprint().value)
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config.get("JWKS_MAX_AGE_SECONDS")
+    return response.make_conditional(request)
+
 
+def render_secure_auth(public_key, ecdh_public_key):
     return render_template(
         "auth.html",
         title="Secure Authorization Tool",
         public_key=public_key,
+        ecdh_public_key=ecdh_public_key,
     )
@@ -0,0 +1,26 @@
+"""URL route definitions for /.well-known resources."""
+from http import HTTPStatus
+
+from flask import Response, current_app, request
+
+from app.routes import routes_bp
+from app.util.crypto import get_jwks
+
+
+@routes_bp.route("/.well-known/jwks.json", methods=["GET"])
+def jwks():
+    """Public keys used to verify auth tokens, as a JSON Web Key Set (RFC 7517).
+
+    The response carries a strong ETag derived from the key set, so clients that
+    cache it can revalidate with If-None-Match and receive 304 NOT MODIFIED until
+    the keys are rotated.
+    """
+    result = get_jwks()
+    if result.failure:
+        return Response(status=HTTPStatus.NOT_FOUND)
+    body, etag = result.value
+    response = Response(body, mimetype="application/jwk-set+json")
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config.get("JWKS_MAX_AGE_SECONDS")
+    return response.make_conditional(request)
@@ -40,15 +40,12 @@
                 }
 
                 function secureAuth(email, password, auth_type) {
-                    generateSessionKey()
-                        .then((key) => encryptUserCredentials(key, email, password))
-                        .then(([key, iv, ct]) => encryptSessionKey(key, iv, ct))
-
-                    .then(([enc_key, iv, ct]) => {
+                    encryptCredentials(email, password)
+                        .then((payload) => {
                             if (auth_type == "register") {
-                                postRegistrationRequest(enc_key, iv, ct)
+                                postRegistrationRequest(payload)
                             } else if (auth_type == "login") {
-                                postLoginRequest(enc_key, iv, ct)
+                                postLoginRequest(payload)
                             } else {
                                 throw Error('Unkown auth type:' + auth_type);
                             }
@@ -58,6 +55,91 @@
                         });
                 }
 
+                // Use X25519 key agreement when the server and the browser support it,
+                // otherwise encrypt a random session key with the server's RSA key
+                const encryptCredentials = function(email, password) {
+                    var secureAuthDiv = document.getElementById('secure-auth');
+                    var ecdhPublicKeyHexString = secureAuthDiv.dataset.ecdhPublicKey;
+                    if (!ecdhPublicKeyHexString) {
+                        return encryptCredentialsRsa(email, password);
+                    }
+                    return encryptCredentialsEcdh(ecdhPublicKeyHexString, email, password)
+                        .catch(function(err) {
+                            return encryptCredentialsRsa(email, password);
+                        });
+                };
+
+                const encryptCredentialsRsa = function(email, password) {
+                    return generateSessionKey()
+                        .then((key) => encryptUserCredentials(key, email, password))
+                        .then(([key, iv, ct]) => encryptSessionKey(key, iv, ct))
+                        .then(([enc_key, iv, ct]) => ({
+                            'key': enc_key,
+                            'iv': iv,
+                            'ct': ct
+                        }));
+                };
+
+                // Derive an AES-GCM key from an ephemeral X25519 key pair and the
+                // server's public key (HKDF-SHA256, must match app.util.crypto)
+                const encryptCredentialsEcdh = function(serverPublicKeyHexString, email, password) {
+                    var serverPublicKeyBytes = hexStringToByteArray(serverPublicKeyHexString);
+                    var hkdfInfo = stringToByteArray("flask-api-jwt user credentials");
+                    var ivBytes = window.crypto.getRandomValues(new Uint8Array(12));
+                    var plainTextBytes = stringToByteArray(email + ":" + password);
+
+                    return Promise.all([
+                        window.crypto.subtle.importKey(
+                            "raw", serverPublicKeyBytes, {
+                                name: "X25519"
+                            },
+                            false, []
+                        ),
+                        window.crypto.subtle.generateKey({
+                            name: "X25519"
+                        }, true, ["deriveBits"])
+                    ]).then(([serverPublicKey, ephemeralKeyPair]) => Promise.all([
+                        window.crypto.subtle.deriveBits({
+                                name: "X25519",
+                                public: serverPublicKey
+                            },
+                            ephemeralKeyPair.privateKey,
+                            256
+                        ),
+                        window.crypto.subtle.exportKey("raw", ephemeralKeyPair.publicKey)
+                    ])).then(([sharedSecretBuffer, ephemeralPublicKeyBuffer]) => {
+                        var ephemeralPublicKeyBytes = new Uint8Array(ephemeralPublicKeyBuffer);
+                        var salt = new Uint8Array(64);
+                        salt.set(ephemeralPublicKeyBytes, 0);
+                        salt.set(serverPublicKeyBytes, 32);
+
+                        return window.crypto.subtle.importKey(
+                            "raw", sharedSecretBuffer, "HKDF", false, ["deriveKey"]
+                        ).then((sharedSecret) => window.crypto.subtle.deriveKey({
+                                name: "HKDF",
+                                hash: "SHA-256",
+                                salt: salt,
+                                info: hkdfInfo
+                            },
+                            sharedSecret, {
+                                name: "AES-GCM",
+                                length: 256
+                            },
+                            false, ["encrypt"]
+                        )).then((sessionKey) => window.crypto.subtle.encrypt({
+                                name: "AES-GCM",
+                                iv: ivBytes
+                            },
+                            sessionKey,
+                            plainTextBytes
+                        )).then((cipherTextBuffer) => ({
+                            'epk': byteArrayToBase64(ephemeralPublicKeyBytes),
+                            'iv': byteArrayToBase64(ivBytes),
+                            'ct': byteArrayToBase64(new Uint8Array(cipherTextBuffer))
+                        }));
+                    });
+                };
+
                 const generateSessionKey = function() {
                     var sessionKey = window.crypto.subtle.generateKey({
                             name: "AES-CBC",
@@ -130,13 +212,9 @@
                     });
                 }
 
-                const postRegistrationRequest = function(enc_key, iv, ct) {
+                const postRegistrationRequest = function(payload) {
                     $http.post(
-                        "/api/v1/auth/register", {
-                            'key': enc_key,
-                            'iv': iv,
-                            'ct': ct
-                        }
+                        "/api/v1/auth/register", payload
                     ).then(successCallback, errorCallback);
 
                     function successCallback(response) {
@@ -163,13 +241,9 @@
                     }
                 }
 
-                const postLoginRequest = function(enc_key, iv, ct) {
+                const postLoginRequest = function(payload) {
                     $http.post(
-                        "/api/v1/auth/login", {
-                            'key': enc_key,
-                            'iv': iv,
-                            'ct': ct
-                        }
+                        "/api/v1/auth/login", payload
                     ).then(successCallback, errorCallback);
 
                     function successCallback(response) {
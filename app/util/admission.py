@@ -0,0 +1,100 @@
+"""Limit the number of concurrent requests performing an expensive operation."""
+import threading
+import time
+from contextlib import contextmanager
+
+from app.util.metrics import register_stats
+
+
+class AdmissionRejected(Exception):
+    """Raised when the wait queue is full or the wait for a free slot times out."""
+
+
+class AdmissionController:
+    """Admit at most max_concurrent callers at a time, with a short wait queue.
+
+    A caller that arrives while every slot is in use waits for up to
+    queue_timeout_seconds, as long as fewer than max_queue callers are already
+    waiting. Otherwise AdmissionRejected is raised immediately, so that requests
+    are shed instead of tying up every thread of the web worker. When
+    max_concurrent is 0 every caller is admitted.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self.max_concurrent = 0
+        self.max_queue = 0
+        self.queue_timeout_seconds = None
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.queued = 0
+        self.total_queue_seconds = 0.0
+        self.max_queue_seconds = 0.0
+
+    def configure(self, max_concurrent, max_queue, queue_timeout_seconds):
+        with self._condition:
+            self.max_concurrent = max_concurrent
+            self.max_queue = max_queue
+            self.queue_timeout_seconds = queue_timeout_seconds
+            self._condition.notify_all()
+
+    @contextmanager
+    def admit(self):
+        """Context manager that holds a slot for the duration of the block."""
+        with self._condition:
+            if self.max_concurrent and self.active >= self.max_concurrent:
+                self._wait_for_slot()
+            self.active += 1
+            self.admitted += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.active -= 1
+                self._condition.notify()
+
+    def stats(self):
+        return dict(
+            max_concurrent=self.max_concurrent,
+            max_queue=self.max_queue,
+            active=self.active,
+            waiting=self.waiting,
+            admitted=self.admitted,
+            rejected=self.rejected,
+            timeouts=self.timeouts,
+            queued=self.queued,
+            avg_queue_seconds=(
+                self.total_queue_seconds / self.queued if self.queued else None
+            ),
+            max_queue_seconds=self.max_queue_seconds,
+        )
+
+    def _wait_for_slot(self):
+        # called with self._condition held
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise AdmissionRejected("Server is busy, please try again later.")
+        start = time.perf_counter()
+        self.waiting += 1
+        try:
+            slot_available = self._condition.wait_for(
+                lambda: not self.max_concurrent or self.active < self.max_concurrent,
+                timeout=self.queue_timeout_seconds,
+            )
+        finally:
+            self.waiting -= 1
+        elapsed = time.perf_counter() - start
+        self.queued += 1
+        self.total_queue_seconds += elapsed
+        self.max_queue_seconds = max(self.max_queue_seconds, elapsed)
+        if not slot_available:
+            self.rejected += 1
+            self.timeouts += 1
+            raise AdmissionRejected("Server is busy, please try again later.")
+
+
+credential_admission = AdmissionController()
+register_stats("credential_admission", credential_admission.stats)
@@ -0,0 +1,164 @@
+"""Build and look up content-hashed, precompressed copies of the static files."""
+import gzip
+import json
+import posixpath
+import re
+import threading
+from hashlib import sha256
+from io import BytesIO
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+MANIFEST_FILENAME = "manifest.json"
+
+# already compressed formats (images, woff/woff2 fonts) gain nothing from gzip/br
+COMPRESSIBLE_SUFFIXES = {
+    ".css",
+    ".eot",
+    ".html",
+    ".js",
+    ".json",
+    ".otf",
+    ".svg",
+    ".ttf",
+}
+
+# source maps are only requested by developer tools, they are not fingerprinted
+EXCLUDED_SUFFIXES = {".map", ".pem"}
+
+CSS_URL_REGEX = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+URL_QUERY_REGEX = re.compile(r"([^?#]*)(.*)")
+
+# precompressed variants in order of preference, with their file suffix
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def fingerprint_assets(source_folders, output_folder):
+    """Write a fingerprinted copy of every file in source_folders to output_folder.
+
+    source_folders maps a prefix ("" for the app's static folder) to a folder. Each
+    file is written as name.<hash>.ext along with .gz and (if the brotli package is
+    installed) .br variants of compressible files. url() references in stylesheets
+    are rewritten to the fingerprinted names, so stylesheets are built last. Returns
+    the manifest, which maps each original path to the fingerprinted file and the
+    encodings available for it, and is also written to manifest.json.
+    """
+    output_folder = Path(output_folder)
+    sources = {}
+    for prefix, folder in source_folders.items():
+        folder = Path(folder)
+        for path in sorted(folder.rglob("*")):
+            if path.is_file() and path.suffix not in EXCLUDED_SUFFIXES:
+                name = posixpath.join(prefix, path.relative_to(folder).as_posix())
+                sources[name] = path
+    manifest = {}
+    for name in sorted(sources, key=lambda name: name.endswith(".css")):
+        content = sources[name].read_bytes()
+        if name.endswith(".css"):
+            content = rewrite_css_urls(name, content, manifest)
+        manifest[name] = write_asset(name, content, output_folder)
+    output_folder.mkdir(parents=True, exist_ok=True)
+    manifest_path = output_folder / MANIFEST_FILENAME
+    manifest_path.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    return manifest
+
+
+def write_asset(name, content, output_folder):
+    """Write content as a fingerprinted file plus its compressed variants."""
+    path = Path(name)
+    digest = sha256(content).hexdigest()[:12]
+    hashed_name = path.with_name(f"{path.stem}.{digest}{path.suffix}").as_posix()
+    hashed_path = output_folder / hashed_name
+    hashed_path.parent.mkdir(parents=True, exist_ok=True)
+    hashed_path.write_bytes(content)
+    encodings = []
+    if path.suffix in COMPRESSIBLE_SUFFIXES:
+        compressed = gzip_compress(content)
+        if len(compressed) < len(content):
+            Path(f"{hashed_path}.gz").write_bytes(compressed)
+            encodings.append("gzip")
+        if brotli:
+            compressed = brotli.compress(content)
+            if len(compressed) < len(content):
+                Path(f"{hashed_path}.br").write_bytes(compressed)
+                encodings.append("br")
+    return dict(path=hashed_name, encodings=sorted(encodings))
+
+
+def gzip_compress(content):
+    """Compress content with mtime=0, so the output depends on the content only."""
+    buffer = BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode="wb", compresslevel=9, mtime=0) as f:
+        f.write(content)
+    return buffer.getvalue()
+
+
+def rewrite_css_urls(name, content, manifest):
+    """Replace relative url() references in a stylesheet with fingerprinted names."""
+    css_folder = posixpath.dirname(name)
+
+    def replace_url(match):
+        quote, url = match.groups()
+        if ":" in url or url.startswith("/"):
+            return match.group(0)
+        path, query = URL_QUERY_REGEX.match(url).groups()
+        asset = manifest.get(posixpath.normpath(posixpath.join(css_folder, path)))
+        if not asset:
+            return match.group(0)
+        relative = posixpath.relpath(asset["path"], css_folder or ".")
+        return f"url({quote}{relative}{query}{quote})"
+
+    return CSS_URL_REGEX.sub(replace_url, content.decode("utf-8")).encode("utf-8")
+
+
+class AssetManifest:
+    """Per-process view of the manifest written by build_assets.
+
+    The manifest is read the first time it is needed. If no assets have been built
+    every lookup returns None, so pages fall back to the unversioned static files.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._folder = None
+        # (assets by original path, encodings by fingerprinted path) once loaded
+        self._manifest = None
+
+    def configure(self, folder):
+        with self._lock:
+            self._folder = Path(folder) if folder else None
+            self._manifest = None
+
+    @property
+    def folder(self):
+        return self._folder
+
+    def get_path(self, name):
+        """Return the fingerprinted path of an original path, or None."""
+        asset = self._load()[0].get(name)
+        return asset["path"] if asset else None
+
+    def get_encodings(self, hashed_name):
+        """Return the precompressed encodings of a fingerprinted file, or None."""
+        return self._load()[1].get(hashed_name)
+
+    def _load(self):
+        manifest = self._manifest
+        if manifest is not None:
+            return manifest
+        with self._lock:
+            if self._manifest is None:
+                assets = {}
+                manifest_path = self._folder and self._folder / MANIFEST_FILENAME
+                if manifest_path and manifest_path.is_file():
+                    assets = json.loads(manifest_path.read_text())
+                files = {asset["path"]: asset["encodings"] for asset in assets.values()}
+                self._manifest = (assets, files)
+            return self._manifest
+
+
+asset_manifest = AssetManifest()
@@ -0,0 +1,172 @@
+"""Run bcrypt password hashing and verification in a bounded process pool."""
+import math
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+
+from app.util.metrics import register_stats
+
+
+class PasswordHashingUnavailable(Exception):
+    """Raised when the pool is saturated or a hashing operation times out."""
+
+
+def generate_password_hash(password, log_rounds):
+    """Return bcrypt hash of password, executed by a pool worker process."""
+    if not password:
+        raise ValueError("Password must be non-empty.")
+    pw_hash = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(log_rounds))
+    return pw_hash.decode("utf-8")
+
+
+def check_password_hash(pw_hash, password):
+    """Return True if password matches pw_hash, executed by a pool worker process."""
+    return bcrypt.checkpw(password.encode("utf-8"), pw_hash.encode("utf-8"))
+
+
+def get_log_rounds(pw_hash):
+    """Return the cost factor of a bcrypt hash ("$2b$12$..." has a cost of 12)."""
+    try:
+        return int(pw_hash.split("$")[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def calibrate_log_rounds(target_seconds, samples, min_rounds=4, max_rounds=20):
+    """Measure bcrypt hash time on this machine for increasing cost factors.
+
+    Each cost factor is hashed samples times and its 95th percentile latency is
+    recorded. Since every additional round doubles the hash time, measuring stops at
+    the first cost factor that exceeds target_seconds. Returns a list of
+    (log_rounds, p95_seconds) tuples and the highest cost factor within the target,
+    or None if even min_rounds is too slow.
+    """
+    measurements = []
+    best_log_rounds = None
+    for log_rounds in range(min_rounds, max_rounds + 1):
+        durations = []
+        for _ in range(samples):
+            start = time.perf_counter()
+            generate_password_hash("calibrate-bcrypt", log_rounds)
+            durations.append(time.perf_counter() - start)
+        durations.sort()
+        p95_seconds = durations[math.ceil(0.95 * samples) - 1]
+        measurements.append((log_rounds, p95_seconds))
+        if p95_seconds > target_seconds:
+            break
+        best_log_rounds = log_rounds
+    return measurements, best_log_rounds
+
+
+class BcryptPool:
+    """Process pool dedicated to bcrypt so hashing does not occupy the web worker.
+
+    At most max_workers hashing operations run concurrently and at most max_queue
+    operations wait for a free worker, any further requests are rejected immediately.
+    An operation that does not complete within timeout_seconds is abandoned, but it
+    keeps its slot until the worker process actually finishes it. Rejections, timeouts
+    and a broken pool all raise PasswordHashingUnavailable. When max_workers is 0
+    hashing is performed in the calling thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self.max_workers = 0
+        self.max_queue = 0
+        self.timeout_seconds = None
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def configure(self, max_workers, max_queue, timeout_seconds):
+        """Set the pool size, shutting down the current worker processes."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self.max_workers = max_workers
+            self.max_queue = max_queue
+            self.timeout_seconds = timeout_seconds
+        if executor:
+            executor.shutdown(wait=True)
+
+    def generate_password_hash(self, password, log_rounds):
+        return self._run(generate_password_hash, password, log_rounds)
+
+    def check_password_hash(self, pw_hash, password):
+        return self._run(check_password_hash, pw_hash, password)
+
+    def stats(self):
+        return dict(
+            max_workers=self.max_workers,
+            max_queue=self.max_queue,
+            queue_depth=max(0, self.pending - self.max_workers),
+            pending=self.pending,
+            completed=self.completed,
+            rejected=self.rejected,
+            timeouts=self.timeouts,
+            avg_seconds=self.total_seconds / self.completed if self.completed else None,
+            max_seconds=self.max_seconds,
+        )
+
+    def _run(self, func, *args):
+        start = time.perf_counter()
+        if not self.max_workers:
+            result = func(*args)
+            self._record_latency(start)
+            return result
+
+        with self._lock:
+            if self.pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise PasswordHashingUnavailable("Password hashing queue is full.")
+            if not self._executor:
+                # created on first use so that worker processes are forked from the
+                # web worker, rather than from the parent of a pre-forking server
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            executor = self._executor
+            self.pending += 1
+        try:
+            future = executor.submit(func, *args)
+        except BrokenProcessPool:
+            with self._lock:
+                self.pending -= 1
+            self._reset_broken_executor(executor)
+            raise PasswordHashingUnavailable("Password hashing pool is unavailable.")
+        # the slot is released when the worker finishes, even if the caller gave up
+        future.add_done_callback(lambda future: self._release(start))
+        try:
+            return future.result(timeout=self.timeout_seconds)
+        except TimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            raise PasswordHashingUnavailable("Password hashing timed out.")
+        except BrokenProcessPool:
+            self._reset_broken_executor(executor)
+            raise PasswordHashingUnavailable("Password hashing pool is unavailable.")
+
+    def _release(self, start):
+        with self._lock:
+            self.pending -= 1
+        self._record_latency(start)
+
+    def _reset_broken_executor(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+
+    def _record_latency(self, start):
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.completed += 1
+            self.total_seconds += elapsed
+            self.max_seconds = max(self.max_seconds, elapsed)
+
+
+bcrypt_pool = BcryptPool()
+register_stats("bcrypt_pool", bcrypt_pool.stats)
@@ -0,0 +1,68 @@
+"""Space-efficient probabilistic set used to skip lookups for values that are absent."""
+import math
+from hashlib import blake2b
+
+
+class BloomFilter:
+    """Bloom filter sized for a given capacity and false-positive rate.
+
+    Membership tests never produce false negatives, a value that was added is always
+    reported as present. Values that were never added are reported as present with
+    a probability close to error_rate, as long as no more than capacity values have
+    been added.
+    """
+
+    def __init__(self, capacity, error_rate):
+        if capacity < 1:
+            raise ValueError("capacity must be a positive integer")
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate must be between 0 and 1")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def __contains__(self, value):
+        return all(
+            self._bits[index >> 3] & (1 << (index & 7))
+            for index in self._indexes(value)
+        )
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def size_bytes(self):
+        return len(self._bits)
+
+    @property
+    def estimated_error_rate(self):
+        """False-positive rate expected for the number of values added so far."""
+        fill_ratio = 1 - math.exp(-self.num_hashes * self.count / self.num_bits)
+        return fill_ratio ** self.num_hashes
+
+    def add(self, value):
+        """Add value, returning False if it was already reported as present.
+
+        Adding a value that is already present does not change the filter, so it is
+        not counted again.
+        """
+        added = False
+        for index in self._indexes(value):
+            mask = 1 << (index & 7)
+            if not self._bits[index >> 3] & mask:
+                self._bits[index >> 3] |= mask
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+    def _indexes(self, value):
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        digest = blake2b(value, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
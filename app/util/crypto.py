@@ -1,66 +1,476 @@
-"""This module provides methods to generate and retrieve RSA keys used to sign and verify auth_tokens."""
+"""This module provides methods to generate and retrieve keys used to sign and verify auth_tokens."""
 import json
-import re
-from base64 import standard_b64decode, standard_b64encode
+import logging
+import os
+import threading
+from base64 import standard_b64decode, standard_b64encode, urlsafe_b64encode
+from collections import namedtuple
+from hashlib import sha256
 
-from Cryptodome.Cipher import AES, PKCS1_OAEP
-from Cryptodome.Hash import SHA256
-from Cryptodome.PublicKey import RSA
+import jwt
+from cryptography.exceptions import InvalidSignature, InvalidTag
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from cryptography.hazmat.primitives.asymmetric.ed25519 import (
+    Ed25519PrivateKey,
+    Ed25519PublicKey,
+)
+from cryptography.hazmat.primitives.asymmetric.x25519 import (
+    X25519PrivateKey,
+    X25519PublicKey,
+)
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives.serialization import (
+    Encoding,
+    PublicFormat,
+    load_der_public_key,
+    load_pem_private_key,
+)
 from Cryptodome.Random import get_random_bytes
-from Cryptodome.Util.Padding import pad, unpad
+from jwt.algorithms import Algorithm
 
+from app.util.metrics import register_stats
 from app.util.result import Result
-from create_pem import construct_rsa_key
+from app.util.crypto_backend import get_crypto_backend
+from create_pem import get_rsa_key_values
+
+logger = logging.getLogger(__name__)
+
+# HKDF info parameter for keys derived from an X25519 shared secret, auth.js uses
+# the same value
+CREDENTIALS_HKDF_INFO = b"flask-api-jwt user credentials"
+
+
+class RsaKeyMaterial(
+    namedtuple(
+        "RsaKeyMaterial",
+        [
+            "backend",
+            "private_key",
+            "public_key",
+            "private_key_pem",
+            "public_key_pem",
+            "public_key_hex",
+        ],
+    )
+):
+    """RSA key objects and their serialized forms, built once from the key parameters.
+
+    The key objects belong to backend (see app.util.crypto_backend), which performs
+    every operation that uses them.
+    """
+
+    @classmethod
+    def from_key(cls, key, backend=None):
+        backend = backend or get_crypto_backend()
+        public_key = backend.get_public_key(key)
+        return cls(
+            backend=backend,
+            private_key=key,
+            public_key=public_key,
+            private_key_pem=backend.export_private_key_pem(key),
+            public_key_pem=backend.export_public_key_pem(public_key),
+            public_key_hex=backend.export_public_key_der(public_key).hex(),
+        )
+
+
+class Ed25519Algorithm(Algorithm):
+    """EdDSA signature algorithm (RFC 8037) for PyJWT, which only supports it from 2.0."""
+
+    def prepare_key(self, key):
+        if isinstance(key, (Ed25519PrivateKey, Ed25519PublicKey)):
+            return key
+        raise jwt.InvalidKeyError("Expecting an Ed25519 key object.")
+
+    def sign(self, msg, key):
+        return key.sign(msg)
+
+    def verify(self, msg, key, sig):
+        if isinstance(key, Ed25519PrivateKey):
+            key = key.public_key()
+        try:
+            key.verify(sig, msg)
+            return True
+        except InvalidSignature:
+            return False
+
+
+jwt.register_algorithm("EdDSA", Ed25519Algorithm())
+
+
+class JwtKey(namedtuple("JwtKey", ["algorithm", "kid", "signing_key", "public_key"])):
+    """Key used to sign or verify auth tokens with the algorithm matching its type.
+
+    The key objects are passed to PyJWT as-is, so they are only parsed once. The
+    key ID is the RFC 7638 thumbprint of the public key, signing_key is None for
+    keys that are only used to verify tokens issued before a key rotation.
+    """
+
+    @classmethod
+    def from_private_key(cls, private_key):
+        key = cls.from_public_key(private_key.public_key())
+        return key._replace(signing_key=private_key)
+
+    @classmethod
+    def from_public_key(cls, public_key):
+        if isinstance(public_key, rsa.RSAPublicKey):
+            algorithm = "RS256"
+        elif isinstance(public_key, ec.EllipticCurvePublicKey):
+            algorithm = "ES256"
+        elif isinstance(public_key, Ed25519PublicKey):
+            algorithm = "EdDSA"
+        else:
+            raise ValueError(f"Unsupported key type: {type(public_key).__name__}")
+        kid = get_jwk_thumbprint(get_public_jwk(public_key))
+        return cls(
+            algorithm=algorithm, kid=kid, signing_key=None, public_key=public_key
+        )
+
+    @property
+    def public_key_hex(self):
+        """DER-encoded public key in hex format, as used by JWT_RETIRED_PUBLIC_KEYS."""
+        return self.public_key.public_bytes(
+            Encoding.DER, PublicFormat.SubjectPublicKeyInfo
+        ).hex()
+
+    @property
+    def jwk(self):
+        jwk = get_public_jwk(self.public_key)
+        jwk.update(kid=self.kid, use="sig", alg=self.algorithm)
+        return jwk
+
+
+class JwtKeyRing(namedtuple("JwtKeyRing", ["active", "verification_keys", "jwks"])):
+    """Key used to sign new auth tokens and every public key accepted for verification.
+
+    Tokens are signed with the active key, keys listed in JWT_RETIRED_PUBLIC_KEYS are
+    kept so that tokens signed before a key rotation remain valid until they expire.
+    verification_keys maps each key ID to a JwtKey, jwks is the serialized JSON Web
+    Key Set and its ETag.
+    """
+
+    @classmethod
+    def from_keys(cls, active, retired):
+        verification_keys = {}
+        for key in [active] + retired:
+            verification_keys.setdefault(key.kid, key)
+        jwks_keys = [key.jwk for key in verification_keys.values()]
+        body = json.dumps(dict(keys=jwks_keys), separators=(",", ":")).encode("utf-8")
+        etag = sha256(body).hexdigest()
+        return cls(
+            active=active, verification_keys=verification_keys, jwks=(body, etag)
+        )
+
+
+class RsaKeyCache:
+    """Process-wide cache of the key material used to sign/verify auth tokens.
+
+    The RSA key is constructed from the JWT_KEY_* environment variables the first
+    time it is requested, all subsequent requests are served from memory until
+    invalidate() is called. Failures are not cached, so the key is constructed as
+    soon as the environment variables become available. The RSA key is always used
+    to decrypt user credentials, auth tokens are signed with the key selected by
+    JWT_ALGORITHM (see construct_jwt_signing_key).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._key_material = None
+        self._keyring = None
+        self._ecdh_key = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self):
+        """Return a Result containing the cached RsaKeyMaterial."""
+        key_material = self._key_material
+        if key_material:
+            self.hits += 1
+            return Result.Ok(key_material)
+        with self._lock:
+            return self._load_key_material()
+
+    def get_keyring(self):
+        """Return a Result containing the cached JwtKeyRing."""
+        keyring = self._keyring
+        if keyring:
+            self.hits += 1
+            return Result.Ok(keyring)
+        with self._lock:
+            if self._keyring:
+                self.hits += 1
+                return Result.Ok(self._keyring)
+            result = construct_jwt_signing_key(self._load_key_material)
+            if result.failure:
+                return result
+            active = JwtKey.from_private_key(result.value)
+            retired = load_retired_public_keys(os.getenv("JWT_RETIRED_PUBLIC_KEYS"))
+            self._keyring = JwtKeyRing.from_keys(active, retired)
+            return Result.Ok(self._keyring)
+
+    def get_ecdh_key(self):
+        """Return a Result containing the cached X25519PrivateKey (see AUTH_ECDH_KEY)."""
+        ecdh_key = self._ecdh_key
+        if ecdh_key:
+            self.hits += 1
+            return Result.Ok(ecdh_key)
+        with self._lock:
+            if self._ecdh_key:
+                self.hits += 1
+                return Result.Ok(self._ecdh_key)
+            self.misses += 1
+            result = construct_ecdh_key()
+            if result.failure:
+                return result
+            self._ecdh_key = result.value
+            return Result.Ok(self._ecdh_key)
+
+    def invalidate(self):
+        """Discard the cached key material, the key is rebuilt on the next request."""
+        with self._lock:
+            self._key_material = None
+            self._keyring = None
+            self._ecdh_key = None
+
+    def stats(self):
+        keyring = self._keyring
+        return dict(
+            cached=self._key_material is not None,
+            backend=self._key_material.backend.name if self._key_material else None,
+            algorithm=keyring.active.algorithm if keyring else None,
+            keys=len(keyring.verification_keys) if keyring else 0,
+            hits=self.hits,
+            misses=self.misses,
+        )
+
+    def _load_key_material(self):
+        # called with self._lock held
+        if self._key_material:
+            self.hits += 1
+            return Result.Ok(self._key_material)
+        self.misses += 1
+        result = get_rsa_key_values()
+        if not result["success"]:
+            return Result.Fail(result["error"])
+        try:
+            backend = get_crypto_backend(os.getenv("CRYPTO_BACKEND"))
+            key = backend.construct_rsa_key(result["value"])
+        except ValueError as e:
+            return Result.Fail(f"Error occurred constructing RSA key: {repr(e)}")
+        self._key_material = RsaKeyMaterial.from_key(key, backend)
+        return Result.Ok(self._key_material)
+
+
+rsa_key_cache = RsaKeyCache()
+register_stats("rsa_key_cache", rsa_key_cache.stats)
+
+
+def construct_jwt_signing_key(get_rsa_key_material):
+    """Return the private key used to sign auth tokens with JWT_ALGORITHM.
+
+    RS256 uses the RSA key built from the JWT_KEY_* values, ES256 uses the P-256
+    private value in JWT_KEY_EC_D and EdDSA uses the Ed25519 seed (hex format) in
+    JWT_KEY_ED25519. All of these values are generated by "flask key-gen".
+    """
+    algorithm = os.getenv("JWT_ALGORITHM") or "RS256"
+    backend = default_backend()
+    if algorithm == "RS256":
+        result = get_rsa_key_material()
+        if result.failure:
+            return result
+        private_key_pem = result.value.private_key_pem
+        return Result.Ok(load_pem_private_key(private_key_pem, None, backend))
+    if algorithm == "ES256":
+        key_d = os.getenv("JWT_KEY_EC_D")
+        if not key_d:
+            return Result.Fail("JWT_KEY_EC_D is required to sign tokens with ES256.")
+        try:
+            return Result.Ok(ec.derive_private_key(int(key_d), ec.SECP256R1(), backend))
+        except ValueError as e:
+            return Result.Fail(f"Error occurred constructing ES256 key: {repr(e)}")
+    if algorithm == "EdDSA":
+        seed = os.getenv("JWT_KEY_ED25519")
+        if not seed:
+            return Result.Fail("JWT_KEY_ED25519 is required to sign tokens with EdDSA.")
+        try:
+            return Result.Ok(Ed25519PrivateKey.from_private_bytes(bytes.fromhex(seed)))
+        except ValueError as e:
+            return Result.Fail(f"Error occurred constructing EdDSA key: {repr(e)}")
+    return Result.Fail(f"Unsupported JWT_ALGORITHM: {algorithm}")
+
+
+def construct_ecdh_key():
+    """Return the X25519 private key used to decrypt user credentials sent with ECDH.
+
+    The key is the 32-byte private value (hex format) in AUTH_ECDH_KEY, generated by
+    "flask key-gen". If it is not set only RSA-encrypted credentials are accepted.
+    """
+    private_value = os.getenv("AUTH_ECDH_KEY")
+    if not private_value:
+        return Result.Fail("AUTH_ECDH_KEY is required to decrypt ECDH credentials.")
+    try:
+        return Result.Ok(
+            X25519PrivateKey.from_private_bytes(bytes.fromhex(private_value))
+        )
+    except ValueError as e:
+        return Result.Fail(f"Error occurred constructing X25519 key: {repr(e)}")
+
+
+def load_retired_public_keys(retired_public_keys):
+    """Parse comma-separated DER-encoded public keys in hex format.
+
+    This is the format returned by get_public_key_hex and JwtKey.public_key_hex,
+    values that cannot be parsed are logged and ignored so that a typo does not
+    prevent new tokens from being signed with the active key.
+    """
+    retired = []
+    for public_key_hex in (retired_public_keys or "").split(","):
+        public_key_hex = public_key_hex.strip()
+        if not public_key_hex:
+            continue
+        try:
+            public_key = load_der_public_key(
+                bytes.fromhex(public_key_hex), default_backend()
+            )
+            retired.append(JwtKey.from_public_key(public_key))
+        except ValueError as e:
+            logger.warning("Ignoring invalid retired public key: %s", repr(e))
+    return retired
+
+
+def get_public_jwk(public_key):
+    """Return the members of a public key's JSON Web Key (RFC 7517, RFC 8037)."""
+    if isinstance(public_key, rsa.RSAPublicKey):
+        numbers = public_key.public_numbers()
+        return dict(
+            kty="RSA", n=int_to_base64url(numbers.n), e=int_to_base64url(numbers.e)
+        )
+    if isinstance(public_key, ec.EllipticCurvePublicKey):
+        numbers = public_key.public_numbers()
+        return dict(
+            kty="EC",
+            crv="P-256",
+            x=int_to_base64url(numbers.x, length=32),
+            y=int_to_base64url(numbers.y, length=32),
+        )
+    raw_bytes = public_key.public_bytes(Encoding.Raw, PublicFormat.Raw)
+    return dict(kty="OKP", crv="Ed25519", x=base64url_encode(raw_bytes))
+
+
+JWK_THUMBPRINT_MEMBERS = dict(RSA=("e", "kty", "n"), EC=("crv", "kty", "x", "y"))
+JWK_THUMBPRINT_MEMBERS["OKP"] = ("crv", "kty", "x")
+
+
+def get_jwk_thumbprint(jwk):
+    """Return the RFC 7638 thumbprint of a JSON Web Key, used as the key ID."""
+    required = {member: jwk[member] for member in JWK_THUMBPRINT_MEMBERS[jwk["kty"]]}
+    canonical = json.dumps(required, separators=(",", ":"), sort_keys=True)
+    return base64url_encode(sha256(canonical.encode("utf-8")).digest())
+
+
+def int_to_base64url(value, length=None):
+    length = length or (value.bit_length() + 7) // 8
+    return base64url_encode(value.to_bytes(length, "big"))
+
+
+def base64url_encode(data):
+    return urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
 
 
 def get_private_key():
     """Return RSA key used to sign auth tokens in PEM format."""
-    result = construct_rsa_key()
-    if not result["success"]:
-        return Result.Fail(result["error"])
-    key = result["value"]
-    private_key = key.export_key()
-    return Result.Ok(private_key)
+    result = rsa_key_cache.get()
+    if result.failure:
+        return result
+    return Result.Ok(result.value.private_key_pem)
+
+
+def get_signing_key():
+    """Return the JwtKey used to sign new auth tokens."""
+    result = rsa_key_cache.get_keyring()
+    if result.failure:
+        return result
+    return Result.Ok(result.value.active)
 
 
 def get_public_key():
     """Return RSA key used to verify auth tokens in PEM format."""
-    result = construct_rsa_key()
-    if not result["success"]:
-        return Result.Fail(result["error"])
-    key = result["value"]
-    public_key = key.publickey().export_key()
-    return Result.Ok(public_key)
+    result = rsa_key_cache.get()
+    if result.failure:
+        return result
+    return Result.Ok(result.value.public_key_pem)
+
+
+def get_verification_key(kid=None):
+    """Return the JwtKey used to verify auth tokens signed by key kid.
+
+    Tokens issued without a key ID are verified with the active key.
+    """
+    result = rsa_key_cache.get_keyring()
+    if result.failure:
+        return result
+    keyring = result.value
+    key = keyring.verification_keys.get(kid or keyring.active.kid)
+    if not key:
+        return Result.Fail(f"Unknown key ID: {kid}")
+    return Result.Ok(key)
 
 
 def get_public_key_hex():
     """Return RSA public key in PEM format without header and footer."""
-    result = get_public_key()
+    result = rsa_key_cache.get()
+    if result.failure:
+        return result
+    return Result.Ok(result.value.public_key_hex)
+
+
+def get_public_key_fingerprint():
+    """Return SHA-256 digest of the DER-encoded RSA public key, in hex format."""
+    result = rsa_key_cache.get()
+    if result.failure:
+        return result
+    return Result.Ok(sha256(bytes.fromhex(result.value.public_key_hex)).hexdigest())
+
+
+def get_ecdh_public_key_hex():
+    """Return the X25519 public key used to encrypt user credentials, in hex format."""
+    result = rsa_key_cache.get_ecdh_key()
     if result.failure:
         return result
-    public_key = result.value
-    split = public_key.split(b"\n")
-    public_key_b64 = b"".join(split[1 : len(split) - 1])
-    public_key_bytes = standard_b64decode(public_key_b64)
-    return Result.Ok(public_key_bytes.hex())
+    public_key = result.value.public_key()
+    return Result.Ok(public_key.public_bytes(Encoding.Raw, PublicFormat.Raw).hex())
+
+
+def get_jwks():
+    """Return JSON Web Key Set containing every public key, and its ETag."""
+    result = rsa_key_cache.get_keyring()
+    if result.failure:
+        return result
+    return Result.Ok(result.value.jwks)
+
+
+def get_token_digest(auth_token):
+    """Return fixed-size digest used to identify an auth token without storing it."""
+    return sha256(auth_token.encode("utf-8")).hexdigest()
 
 
 def encrypt_user_credentials(email, password):
-    result = construct_rsa_key()
-    if not result["success"]:
-        return Result.Fail(result["error"])
-    key = result["value"]
-    public_key = key.publickey()
+    result = rsa_key_cache.get()
+    if result.failure:
+        return result
+    backend = result.value.backend
+    public_key = result.value.public_key
     session_key = get_random_bytes(16)
-    cipher_rsa = PKCS1_OAEP.new(public_key, hashAlgo=SHA256)
-    encrypted_key = cipher_rsa.encrypt(session_key)
+    encrypted_key = backend.oaep_encrypt(public_key, session_key)
 
-    cipher_aes = AES.new(session_key, AES.MODE_CBC)
+    iv = get_random_bytes(16)
     plaintext = f"{email}:{password}"
-    ciphertext = cipher_aes.encrypt(pad(plaintext.encode(), AES.block_size))
+    ciphertext = backend.aes_cbc_encrypt(session_key, iv, plaintext.encode())
 
     key = standard_b64encode(encrypted_key).decode("utf-8")
-    iv = standard_b64encode(cipher_aes.iv).decode("utf-8")
+    iv = standard_b64encode(iv).decode("utf-8")
     ct = standard_b64encode(ciphertext).decode("utf-8")
     enc_user_creds = dict(key=key, iv=iv, ct=ct)
     return Result.Ok(enc_user_creds)
@@ -70,15 +480,14 @@ def decrypt_user_credentials(encoded_key, encoded_iv, encoded_ct):
     encrypted_key = standard_b64decode(encoded_key)
     iv = standard_b64decode(encoded_iv)
     ciphertext = standard_b64decode(encoded_ct)
-    result = get_private_key()
+    result = rsa_key_cache.get()
     if result.failure:
         return result
-    private_key = RSA.import_key(result.value)
-    cipher_rsa = PKCS1_OAEP.new(private_key, hashAlgo=SHA256)
+    backend = result.value.backend
+    private_key = result.value.private_key
     try:
-        session_key = cipher_rsa.decrypt(encrypted_key)
-        cipher_aes = AES.new(session_key, AES.MODE_CBC, iv)
-        creds_plaintext = unpad(cipher_aes.decrypt(ciphertext), AES.block_size)
+        session_key = backend.oaep_decrypt(private_key, encrypted_key)
+        creds_plaintext = backend.aes_cbc_decrypt(session_key, iv, ciphertext)
     except KeyError as e:
         error = f"Decryption Error: {repr(e)}"
         return Result.Fail(error)
@@ -86,6 +495,82 @@ def decrypt_user_credentials(encoded_key, encoded_iv, encoded_ct):
         error = f"Decryption Error: {repr(e)}"
         return Result.Fail(error)
 
+    return parse_user_credentials(creds_plaintext)
+
+
+def encrypt_user_credentials_ecdh(email, password):
+    """Encrypt user credentials with the ECDH scheme used by auth.js.
+
+    An ephemeral X25519 key agreement with the server's public key produces a shared
+    secret, which HKDF-SHA256 turns into an AES-256-GCM key. Only the ephemeral
+    public key (epk), the nonce (iv) and the ciphertext (ct) are sent.
+    """
+    result = rsa_key_cache.get_ecdh_key()
+    if result.failure:
+        return result
+    server_public_key = result.value.public_key()
+    ephemeral_key = X25519PrivateKey.generate()
+    ephemeral_public_bytes = ephemeral_key.public_key().public_bytes(
+        Encoding.Raw, PublicFormat.Raw
+    )
+    session_key = derive_credentials_key(
+        ephemeral_key.exchange(server_public_key),
+        ephemeral_public_bytes,
+        server_public_key.public_bytes(Encoding.Raw, PublicFormat.Raw),
+    )
+    iv = get_random_bytes(12)
+    plaintext = f"{email}:{password}"
+    ciphertext = AESGCM(session_key).encrypt(iv, plaintext.encode(), None)
+
+    epk = standard_b64encode(ephemeral_public_bytes).decode("utf-8")
+    iv = standard_b64encode(iv).decode("utf-8")
+    ct = standard_b64encode(ciphertext).decode("utf-8")
+    enc_user_creds = dict(epk=epk, iv=iv, ct=ct)
+    return Result.Ok(enc_user_creds)
+
+
+def decrypt_user_credentials_ecdh(encoded_epk, encoded_iv, encoded_ct):
+    """Decrypt user credentials encrypted by encrypt_user_credentials_ecdh.
+
+    A single X25519 scalar multiplication replaces the RSA private key operation
+    of decrypt_user_credentials, and GCM also rejects tampered ciphertexts.
+    """
+    ephemeral_public_bytes = standard_b64decode(encoded_epk)
+    iv = standard_b64decode(encoded_iv)
+    ciphertext = standard_b64decode(encoded_ct)
+    result = rsa_key_cache.get_ecdh_key()
+    if result.failure:
+        return result
+    private_key = result.value
+    try:
+        ephemeral_public_key = X25519PublicKey.from_public_bytes(ephemeral_public_bytes)
+        session_key = derive_credentials_key(
+            private_key.exchange(ephemeral_public_key),
+            ephemeral_public_bytes,
+            private_key.public_key().public_bytes(Encoding.Raw, PublicFormat.Raw),
+        )
+        creds_plaintext = AESGCM(session_key).decrypt(iv, ciphertext, None)
+    except InvalidTag:
+        return Result.Fail("Decryption Error: InvalidTag()")
+    except ValueError as e:
+        error = f"Decryption Error: {repr(e)}"
+        return Result.Fail(error)
+    return parse_user_credentials(creds_plaintext)
+
+
+def derive_credentials_key(shared_secret, ephemeral_public_bytes, server_public_bytes):
+    """Derive the AES-256-GCM key for an X25519 shared secret, bound to both keys."""
+    hkdf = HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=ephemeral_public_bytes + server_public_bytes,
+        info=CREDENTIALS_HKDF_INFO,
+        backend=default_backend(),
+    )
+    return hkdf.derive(shared_secret)
+
+
+def parse_user_credentials(creds_plaintext):
     split = creds_plaintext.decode("ascii").split(":")
     if len(split) != 2:
         error = 'User credentials not formatted correctly, expected 2 strings separated by ":" char.'
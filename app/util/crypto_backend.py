@@ -0,0 +1,174 @@
+"""Interchangeable implementations of the RSA and AES primitives used by app.util.crypto.
+
+Each backend exposes the same methods, operating on its own key objects:
+
+    construct_rsa_key(key_values)            (n, e, d, p, q, u) integers -> private key
+    get_public_key(private_key)              private key -> public key
+    export_private_key_pem(private_key)      PKCS#1 PEM bytes
+    export_public_key_pem(public_key)        SubjectPublicKeyInfo PEM bytes
+    export_public_key_der(public_key)        SubjectPublicKeyInfo DER bytes
+    oaep_encrypt(public_key, plaintext)      RSA-OAEP with SHA-256 (and MGF1-SHA-256)
+    oaep_decrypt(private_key, ciphertext)
+    aes_cbc_encrypt(key, iv, plaintext)      AES-CBC with PKCS#7 padding
+    aes_cbc_decrypt(key, iv, ciphertext)
+    sign(private_key, message)               RSASSA-PKCS1-v1_5 with SHA-256 (RS256)
+    verify(public_key, message, signature)   returns True or False
+
+Failed decryption or unpadding raises ValueError with either backend. The backend
+used by the application is selected with the CRYPTO_BACKEND environment variable,
+"flask benchmark-crypto" compares their performance on the current machine.
+"""
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes, padding, serialization
+from cryptography.hazmat.primitives.asymmetric import padding as asymmetric_padding
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from Cryptodome.Cipher import AES, PKCS1_OAEP
+from Cryptodome.Hash import SHA256
+from Cryptodome.PublicKey import RSA
+from Cryptodome.Signature import pkcs1_15
+from Cryptodome.Util.Padding import pad, unpad
+
+DEFAULT_CRYPTO_BACKEND = "pycryptodome"
+
+
+class PycryptodomeBackend:
+    """Primitives implemented by PyCryptodome (Cryptodome package)."""
+
+    name = "pycryptodome"
+
+    def construct_rsa_key(self, key_values):
+        return RSA.construct(key_values)
+
+    def get_public_key(self, private_key):
+        return private_key.publickey()
+
+    def export_private_key_pem(self, private_key):
+        return private_key.export_key()
+
+    def export_public_key_pem(self, public_key):
+        return public_key.export_key()
+
+    def export_public_key_der(self, public_key):
+        return public_key.export_key(format="DER")
+
+    def oaep_encrypt(self, public_key, plaintext):
+        return PKCS1_OAEP.new(public_key, hashAlgo=SHA256).encrypt(plaintext)
+
+    def oaep_decrypt(self, private_key, ciphertext):
+        return PKCS1_OAEP.new(private_key, hashAlgo=SHA256).decrypt(ciphertext)
+
+    def aes_cbc_encrypt(self, key, iv, plaintext):
+        cipher = AES.new(key, AES.MODE_CBC, iv)
+        return cipher.encrypt(pad(plaintext, AES.block_size))
+
+    def aes_cbc_decrypt(self, key, iv, ciphertext):
+        cipher = AES.new(key, AES.MODE_CBC, iv)
+        return unpad(cipher.decrypt(ciphertext), AES.block_size)
+
+    def sign(self, private_key, message):
+        return pkcs1_15.new(private_key).sign(SHA256.new(message))
+
+    def verify(self, public_key, message, signature):
+        try:
+            pkcs1_15.new(public_key).verify(SHA256.new(message), signature)
+            return True
+        except ValueError:
+            return False
+
+
+class CryptographyBackend:
+    """Primitives implemented by pyca/cryptography (OpenSSL)."""
+
+    name = "cryptography"
+
+    def construct_rsa_key(self, key_values):
+        n, e, d, p, q, _ = key_values
+        public_numbers = rsa.RSAPublicNumbers(e, n)
+        private_numbers = rsa.RSAPrivateNumbers(
+            p=p,
+            q=q,
+            d=d,
+            dmp1=rsa.rsa_crt_dmp1(d, p),
+            dmq1=rsa.rsa_crt_dmq1(d, q),
+            iqmp=rsa.rsa_crt_iqmp(p, q),
+            public_numbers=public_numbers,
+        )
+        return private_numbers.private_key(default_backend())
+
+    def get_public_key(self, private_key):
+        return private_key.public_key()
+
+    def export_private_key_pem(self, private_key):
+        return private_key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.TraditionalOpenSSL,
+            serialization.NoEncryption(),
+        ).strip()
+
+    def export_public_key_pem(self, public_key):
+        return public_key.public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo,
+        ).strip()
+
+    def export_public_key_der(self, public_key):
+        return public_key.public_bytes(
+            serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+
+    def oaep_encrypt(self, public_key, plaintext):
+        return public_key.encrypt(plaintext, self._oaep_padding())
+
+    def oaep_decrypt(self, private_key, ciphertext):
+        return private_key.decrypt(ciphertext, self._oaep_padding())
+
+    def aes_cbc_encrypt(self, key, iv, plaintext):
+        padder = padding.PKCS7(algorithms.AES.block_size).padder()
+        padded = padder.update(plaintext) + padder.finalize()
+        encryptor = self._aes_cbc_cipher(key, iv).encryptor()
+        return encryptor.update(padded) + encryptor.finalize()
+
+    def aes_cbc_decrypt(self, key, iv, ciphertext):
+        decryptor = self._aes_cbc_cipher(key, iv).decryptor()
+        padded = decryptor.update(ciphertext) + decryptor.finalize()
+        unpadder = padding.PKCS7(algorithms.AES.block_size).unpadder()
+        return unpadder.update(padded) + unpadder.finalize()
+
+    def sign(self, private_key, message):
+        return private_key.sign(message, asymmetric_padding.PKCS1v15(), hashes.SHA256())
+
+    def verify(self, public_key, message, signature):
+        try:
+            public_key.verify(
+                signature, message, asymmetric_padding.PKCS1v15(), hashes.SHA256()
+            )
+            return True
+        except InvalidSignature:
+            return False
+
+    def _oaep_padding(self):
+        return asymmetric_padding.OAEP(
+            mgf=asymmetric_padding.MGF1(algorithm=hashes.SHA256()),
+            algorithm=hashes.SHA256(),
+            label=None,
+        )
+
+    def _aes_cbc_cipher(self, key, iv):
+        if len(iv) != 16:
+            raise ValueError("Incorrect IV length (it must be 16 bytes long)")
+        return Cipher(algorithms.AES(key), modes.CBC(iv), default_backend())
+
+
+CRYPTO_BACKENDS = {
+    backend.name: backend for backend in (PycryptodomeBackend(), CryptographyBackend())
+}
+
+
+def get_crypto_backend(name=None):
+    """Return the backend registered as name, raise ValueError if there is none."""
+    name = name or DEFAULT_CRYPTO_BACKEND
+    try:
+        return CRYPTO_BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unsupported CRYPTO_BACKEND: {name}")
@@ -0,0 +1,85 @@
+"""Bounded, thread-safe LRU cache with per-entry expiration."""
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Least-recently-used cache holding at most maxsize entries.
+
+    Each entry expires at the time (seconds since the epoch) given when the value is
+    stored, or after ttl_seconds if no expiration time is given. Expired entries are
+    removed when they are next accessed, and the least-recently-used entry is evicted
+    whenever a new entry would exceed maxsize. A maxsize of 0 disables the cache.
+    """
+
+    def __init__(self, maxsize=128, ttl_seconds=None):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def configure(self, maxsize, ttl_seconds=None):
+        """Change the size and default expiration of the cache, discarding all entries."""
+        with self._lock:
+            self._entries.clear()
+            self.maxsize = maxsize
+            self.ttl_seconds = ttl_seconds
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, expires_at=None):
+        if not self.maxsize:
+            return
+        if self.ttl_seconds:
+            ttl_expires_at = time.time() + self.ttl_seconds
+            if expires_at is None or ttl_expires_at < expires_at:
+                expires_at = ttl_expires_at
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        return entry[0] if entry else default
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return dict(
+            maxsize=self.maxsize,
+            size=len(self._entries),
+            hits=self.hits,
+            misses=self.misses,
+            hit_ratio=self.hits / lookups if lookups else None,
+            evictions=self.evictions,
+            expirations=self.expirations,
+        )
@@ -0,0 +1,12 @@
+"""Registry of runtime statistics reported by the per-process caches and pools."""
+_stats_sources = {}
+
+
+def register_stats(name, stats_func):
+    """Register a callable that returns a dict of statistics under the given name."""
+    _stats_sources[name] = stats_func
+
+
+def collect_stats():
+    """Return the current statistics reported by every registered source."""
+    return {name: stats_func() for name, stats_func in _stats_sources.items()}
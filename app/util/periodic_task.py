@@ -0,0 +1,26 @@
+"""Run a function repeatedly in a background thread."""
+import threading
+
+
+class PeriodicTask:
+    """Call func every interval_seconds in a daemon thread until stop() is called."""
+
+    def __init__(self, interval_seconds, func, name=None):
+        self.interval_seconds = interval_seconds
+        self.func = func
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    @property
+    def running(self):
+        return self._thread.is_alive()
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval_seconds):
+            self.func()
@@ -0,0 +1,193 @@
+"""Token-bucket rate limiting with in-process and SQLite-backed bucket stores."""
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from app.util.metrics import register_stats
+
+
+class RateLimitState(
+    namedtuple(
+        "RateLimitState", ["allowed", "limit", "remaining", "reset", "retry_after"]
+    )
+):
+    """Outcome of taking a token from a bucket, in the units of the RateLimit headers.
+
+    reset is the number of seconds until the bucket is full again, retry_after is the
+    number of seconds until the next token is available (0 if one is available now).
+    """
+
+    @property
+    def headers(self):
+        headers = {
+            "RateLimit-Limit": str(self.limit),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(self.reset),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(self.retry_after)
+        return headers
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a request is made while the bucket it draws from is empty."""
+
+    def __init__(self, state):
+        super().__init__("Too many requests, please try again later.")
+        self.state = state
+
+
+class MemoryBackend:
+    """Buckets stored in this process, limits apply to each worker separately.
+
+    At most maxsize buckets are kept, the least-recently-used bucket is discarded
+    when a new one is needed (a discarded bucket starts out full again).
+    """
+
+    def __init__(self, maxsize=100000):
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+        self.maxsize = maxsize
+
+    def take(self, key, capacity, refill_rate, now):
+        """Take a token from the bucket if one is available, return tokens left."""
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill_rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return allowed, tokens
+
+
+class SqliteBackend:
+    """Buckets stored in a SQLite file, so limits hold across all local workers.
+
+    Each take() runs in an IMMEDIATE transaction, which serializes updates from all
+    processes using the same file. If the database is locked for longer than
+    timeout_seconds the request is allowed rather than delayed.
+    """
+
+    PRUNE_INTERVAL = 1000
+
+    def __init__(self, path, timeout_seconds=0.1, max_idle_seconds=3600):
+        self.path = path
+        self.timeout_seconds = timeout_seconds
+        self.max_idle_seconds = max_idle_seconds
+        self.errors = 0
+        self._local = threading.local()
+        self._takes = 0
+
+    def take(self, key, capacity, refill_rate, now):
+        try:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = connection.execute(
+                    "SELECT tokens, updated FROM buckets WHERE key = ?", (key,)
+                ).fetchone()
+                tokens, updated = row if row else (capacity, now)
+                tokens = min(capacity, tokens + (now - updated) * refill_rate)
+                allowed = tokens >= 1
+                if allowed:
+                    tokens -= 1
+                connection.execute(
+                    "INSERT OR REPLACE INTO buckets (key, tokens, updated) "
+                    "VALUES (?, ?, ?)",
+                    (key, tokens, now),
+                )
+                self._takes += 1
+                if self._takes % self.PRUNE_INTERVAL == 0:
+                    # idle buckets have refilled completely, so they can be dropped
+                    connection.execute(
+                        "DELETE FROM buckets WHERE updated < ?",
+                        (now - self.max_idle_seconds,),
+                    )
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+        except sqlite3.Error:
+            self.errors += 1
+            return True, capacity
+        return allowed, tokens
+
+    def _connect(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.path, timeout=self.timeout_seconds, isolation_level=None
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS buckets "
+                "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self._local.connection = connection
+        return connection
+
+
+class RateLimiter:
+    """Token buckets identified by a scope (e.g. "ip") and a key within that scope.
+
+    limits maps each scope to (capacity, period_seconds): a bucket holds at most
+    capacity tokens and is refilled at capacity tokens per period_seconds. Scopes
+    without a limit are not rate limited.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.backend = MemoryBackend()
+        self.limits = {}
+        self.checks = 0
+        self.limited = 0
+
+    def configure(self, enabled, backend, limits):
+        self.enabled = enabled
+        self.backend = backend
+        self.limits = dict(limits)
+
+    def hit(self, scope, key):
+        """Take a token from the bucket, return RateLimitState or None if unlimited."""
+        if not self.enabled or scope not in self.limits:
+            return None
+        capacity, period_seconds = self.limits[scope]
+        refill_rate = capacity / period_seconds
+        allowed, tokens = self.backend.take(
+            f"{scope}:{key}", capacity, refill_rate, time.time()
+        )
+        self.checks += 1
+        if not allowed:
+            self.limited += 1
+        return RateLimitState(
+            allowed=allowed,
+            limit=capacity,
+            remaining=int(tokens),
+            reset=math.ceil((capacity - tokens) / refill_rate),
+            retry_after=0 if tokens >= 1 else math.ceil((1 - tokens) / refill_rate),
+        )
+
+    def enforce(self, scope, key):
+        """Take a token from the bucket, raise RateLimitExceeded if it is empty."""
+        state = self.hit(scope, key)
+        if state and not state.allowed:
+            raise RateLimitExceeded(state)
+        return state
+
+    def stats(self):
+        return dict(
+            enabled=self.enabled,
+            backend=type(self.backend).__name__,
+            checks=self.checks,
+            limited=self.limited,
+            backend_errors=getattr(self.backend, "errors", 0),
+        )
+
+
+rate_limiter = RateLimiter()
+register_stats("rate_limiter", rate_limiter.stats)
@@ -8,8 +8,8 @@ APP_ROOT = Path(__file__).resolve().parent
 PUBLIC_KEY_FILE = APP_ROOT / "app" / "static" / "public.pem"
 
 
-def construct_rsa_key():
-    """Construct RSA key from parameter values stored in environment variables."""
+def get_rsa_key_values():
+    """Return RSA key parameter values stored in environment variables as integers."""
     key_n = os.getenv("JWT_KEY_N")
     key_e = os.getenv("JWT_KEY_E")
     key_d = os.getenv("JWT_KEY_D")
@@ -36,13 +36,25 @@ def construct_rsa_key():
             int(key_q),
             int(key_u),
         )
-        key = RSA.construct(key_tuple)
-        return dict(success=True, value=key)
+        return dict(success=True, value=key_tuple)
     except ValueError as e:
         error = f"Error occurred converting key value to integer, details:\n{repr(e)}"
         return dict(success=False, error=error)
 
 
+def construct_rsa_key():
+    """Construct RSA key from parameter values stored in environment variables."""
+    result = get_rsa_key_values()
+    if not result["success"]:
+        return result
+    try:
+        key = RSA.construct(result["value"])
+        return dict(success=True, value=key)
+    except ValueError as e:
+        error = f"Error occurred constructing RSA key, details:\n{repr(e)}"
+        return dict(success=False, error=error)
+
+
 def create_public_key_file():
     """Create public key file in PEM format."""
     result = construct_rsa_key()
@@ -1,3 +1,3 @@
 #!/bin/bash
 python create_pem.py
-gunicorn run:app
+gunicorn --threads 4 run:app
@@ -0,0 +1,26 @@
+"""add version to release_info
+
+Revision ID: 3b7d91c4a6e2
+Revises: e9a3f07c2d15
+Create Date: 2026-10-18 19:12:40.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7d91c4a6e2'
+down_revision = 'e9a3f07c2d15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('release_info') as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('release_info') as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,35 @@
+"""add api_keys table
+
+Revision ID: 5c7e2a9d1b04
+Revises: b41f6d2c9e83
+Create Date: 2026-10-18 15:37:12.604257
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c7e2a9d1b04'
+down_revision = 'b41f6d2c9e83'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('api_keys',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('prefix', sa.String(length=16), nullable=False),
+    sa.Column('key_digest', sa.String(length=64), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('created_on', sa.DateTime(), nullable=False),
+    sa.Column('revoked', sa.Boolean(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['site_user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('prefix')
+    )
+
+
+def downgrade():
+    op.drop_table('api_keys')
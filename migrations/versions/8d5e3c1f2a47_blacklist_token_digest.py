@@ -0,0 +1,81 @@
+"""store blacklisted tokens by digest and expiration time
+
+Revision ID: 8d5e3c1f2a47
+Revises: 12a29fb39382
+Create Date: 2026-10-18 09:12:31.402118
+
+"""
+from datetime import datetime
+from hashlib import sha256
+
+from alembic import op
+import jwt
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d5e3c1f2a47'
+down_revision = '12a29fb39382'
+branch_labels = None
+depends_on = None
+
+
+def backfill_values(token):
+    """Return digest and expiration time for a token stored by the previous schema.
+
+    Before this revision process_logout stored the raw Authorization header, so the
+    "Bearer" prefix is removed the same way as strip_bearer_prefix before hashing.
+    """
+    if token.startswith('Bearer '):
+        token = token.split('Bearer')[1].strip()
+    try:
+        payload = jwt.decode(token, verify=False)
+        expires_at = datetime.utcfromtimestamp(payload['exp'])
+    except (jwt.InvalidTokenError, KeyError, TypeError, ValueError):
+        expires_at = datetime.utcnow()
+    return dict(token_digest=sha256(token.encode('utf-8')).hexdigest(), expires_at=expires_at)
+
+
+def upgrade():
+    with op.batch_alter_table('blacklist_tokens') as batch_op:
+        batch_op.add_column(sa.Column('token_digest', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('expires_at', sa.DateTime(), nullable=True))
+
+    # backfill digest and expiration time from the full token stored in each row
+    blacklist_tokens = sa.table(
+        'blacklist_tokens',
+        sa.column('id', sa.Integer),
+        sa.column('token', sa.String),
+        sa.column('token_digest', sa.String),
+        sa.column('expires_at', sa.DateTime),
+    )
+    connection = op.get_bind()
+    rows = connection.execute(
+        sa.select([blacklist_tokens.c.id, blacklist_tokens.c.token])
+    ).fetchall()
+    for row_id, token in rows:
+        connection.execute(
+            blacklist_tokens.update()
+            .where(blacklist_tokens.c.id == row_id)
+            .values(**backfill_values(token))
+        )
+
+    with op.batch_alter_table('blacklist_tokens') as batch_op:
+        batch_op.alter_column('token_digest', existing_type=sa.String(length=64), nullable=False)
+        batch_op.alter_column('expires_at', existing_type=sa.DateTime(), nullable=False)
+        batch_op.drop_column('token')
+        batch_op.create_unique_constraint('uq_blacklist_tokens_token_digest', ['token_digest'])
+        batch_op.create_index('ix_blacklist_tokens_expires_at', ['expires_at'], unique=False)
+
+
+def downgrade():
+    # the full token cannot be recovered from its digest, rows blacklisted after the
+    # upgrade are discarded since they can no longer be matched against a token
+    op.execute('DELETE FROM blacklist_tokens')
+    with op.batch_alter_table('blacklist_tokens') as batch_op:
+        batch_op.drop_index('ix_blacklist_tokens_expires_at')
+        batch_op.drop_constraint('uq_blacklist_tokens_token_digest', type_='unique')
+        batch_op.drop_column('expires_at')
+        batch_op.drop_column('token_digest')
+        batch_op.add_column(sa.Column('token', sa.String(length=500), nullable=False))
+        batch_op.create_unique_constraint('uq_blacklist_tokens_token', ['token'])
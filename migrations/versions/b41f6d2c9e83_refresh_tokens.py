@@ -0,0 +1,37 @@
+"""add refresh_tokens table
+
+Revision ID: b41f6d2c9e83
+Revises: 8d5e3c1f2a47
+Create Date: 2026-10-18 14:02:45.118310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b41f6d2c9e83'
+down_revision = '8d5e3c1f2a47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('refresh_tokens',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('token_digest', sa.String(length=64), nullable=False),
+    sa.Column('family', sa.String(length=36), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('issued_on', sa.DateTime(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.Column('revoked', sa.Boolean(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['site_user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('token_digest')
+    )
+    op.create_index(op.f('ix_refresh_tokens_family'), 'refresh_tokens', ['family'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_refresh_tokens_family'), table_name='refresh_tokens')
+    op.drop_table('refresh_tokens')
@@ -0,0 +1,26 @@
+"""add token_version to site_user
+
+Revision ID: e9a3f07c2d15
+Revises: 5c7e2a9d1b04
+Create Date: 2026-10-18 16:48:03.551920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e9a3f07c2d15'
+down_revision = '5c7e2a9d1b04'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('site_user') as batch_op:
+        batch_op.add_column(sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('site_user') as batch_op:
+        batch_op.drop_column('token_version')
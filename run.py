@@ -1,11 +1,27 @@
 """Entry point for the flask application."""
+import math
 import os
+import shutil
+import time
 import unittest
+import uuid
 from coverage import coverage
+from datetime import datetime, timedelta
 from pathlib import Path
 
 import click
+import jwt
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+from cryptography.hazmat.primitives.serialization import (
+    Encoding,
+    NoEncryption,
+    PrivateFormat,
+)
 from Cryptodome.PublicKey import RSA
+from flask_restplus.apidoc import apidoc
 
 cov = coverage(branch=True, include="app/*")
 cov.start()
@@ -14,12 +30,19 @@ from app import create_app, db
 
 app = create_app(os.getenv("ENV") or "dev")
 
+from app.models.api_key import ApiKey
 from app.models.blacklist_token import BlacklistToken
 from app.models.product import Product
+from app.models.refresh_token import RefreshToken
 from app.models.user import User
+from app.util.assets import brotli, fingerprint_assets
+from app.util.bcrypt_pool import calibrate_log_rounds
+from app.util.crypto import JwtKey, get_signing_key
+from app.util.crypto_backend import CRYPTO_BACKENDS
 from create_pem import create_public_key_file
 
 APP_ROOT = Path(__file__).resolve().parent
+DOTENV_PATH = APP_ROOT / ".env"
 TEST_FOLDER = APP_ROOT / "test"
 COV_FOLDER = APP_ROOT / "tmp" / "coverage"
 
@@ -69,18 +92,34 @@ def clean():
 
 @app.cli.command()
 @click.option(
-    "--key-size",
-    type=click.Choice(["2048", "4096"]),
-    prompt="Choose the length of the key to generate",
+    "--algorithm",
+    type=click.Choice(["RS256", "ES256", "EdDSA"]),
+    default="RS256",
+    help="Algorithm used to sign auth tokens (default: RS256).",
 )
-def key_gen(key_size):
-    """Generate a new RSA key for encoding auth tokens.
+@click.option("--key-size", type=click.Choice(["2048", "4096"]), default=None)
+def key_gen(algorithm, key_size):
+    """Generate a new key for encoding auth tokens.
+
+    This function generates a new key and outputs the parameters of the key to the
+    terminal. The output can be directly copied and pasted into the .env file in the
+    project root, making the values available as environment variables. If the .env
+    file does not contain any RSA parameters, JWT auth tokens will be encoded using
+    the SECRET_KEY environment variable/flask app config value.
 
-    This function generates a new RSA key and outputs the RSA parameters of the key
-    to the terminal. The output can be directly copied and pasted into the .env file
-    in the project root, making the values available as environment variables. If
-    the .env file does not contain any RSA parameters, JWT auth tokens will be encoded
-    using the SECRET_KEY environment variable/flask app config value.
+    The RSA key is always required, since it is used to encrypt user credentials
+    sent to the /auth/login and /auth/register endpoints. ES256 (ECDSA P-256) and
+    EdDSA (Ed25519) keys are much faster to sign with than RSA keys and produce
+    shorter tokens, select them with --algorithm to generate the JWT_ALGORITHM
+    value and the key used to sign auth tokens.
+
+    If AUTH_ECDH_KEY is not set, an X25519 key is generated as well. Browsers that
+    support X25519 in WebCrypto use it to encrypt user credentials, which is much
+    cheaper for the server to decrypt than RSA-OAEP.
+
+    If a key is already configured, its public key is added to JWT_RETIRED_PUBLIC_KEYS
+    so that auth tokens signed with it can still be verified after the new key is in
+    place. The entry can be removed once those tokens have expired.
 
     For reference, the meaning of the RSA parameters is given below:
         key.n = modulus
@@ -90,8 +129,36 @@ def key_gen(key_size):
         key.q = second_prime_number
         key.u = q_inv_crt
     """
-    key = RSA.generate(int(key_size))
+    if algorithm == "RS256" and not key_size:
+        key_size = click.prompt(
+            "Choose the length of the key to generate",
+            type=click.Choice(["2048", "4096"]),
+        )
     print("Add the entries below to your .env file:\n")
+    result = get_signing_key()
+    if result.success:
+        # keep accepting tokens signed with the current key until they expire
+        retired_keys = os.getenv("JWT_RETIRED_PUBLIC_KEYS", "").split(",")
+        retired_keys = [hex_key for hex_key in retired_keys if hex_key]
+        retired_keys.append(result.value.public_key_hex)
+        print(f'JWT_RETIRED_PUBLIC_KEYS="{",".join(retired_keys)}"')
+    if not os.getenv("AUTH_ECDH_KEY"):
+        ecdh_key = X25519PrivateKey.generate()
+        private_value = ecdh_key.private_bytes(
+            Encoding.Raw, PrivateFormat.Raw, NoEncryption()
+        )
+        print(f'AUTH_ECDH_KEY="{private_value.hex()}"')
+    print(f'JWT_ALGORITHM="{algorithm}"')
+    if algorithm == "ES256":
+        key = ec.generate_private_key(ec.SECP256R1(), default_backend())
+        print(f'JWT_KEY_EC_D="{key.private_numbers().private_value}"')
+        return key
+    if algorithm == "EdDSA":
+        key = Ed25519PrivateKey.generate()
+        seed = key.private_bytes(Encoding.Raw, PrivateFormat.Raw, NoEncryption())
+        print(f'JWT_KEY_ED25519="{seed.hex()}"')
+        return key
+    key = RSA.generate(int(key_size))
     print(f'JWT_KEY_N="{key.n}"')
     print(f'JWT_KEY_E="{key.e}"')
     print(f'JWT_KEY_D="{key.d}"')
@@ -104,6 +171,197 @@ def key_gen(key_size):
     return key
 
 
+@app.cli.command()
+@click.option(
+    "--iterations",
+    type=int,
+    default=200,
+    help="Number of tokens to sign and verify with each key (default: 200).",
+)
+def benchmark_tokens(iterations):
+    """Compare auth token signing/verification throughput and size per algorithm.
+
+    Keys are generated for each algorithm, then a token with the same claims as the
+    tokens issued by User.encode_auth_token is signed and verified repeatedly using
+    the parsed key objects, as the auth endpoints do.
+    """
+    keys = [
+        ("RS256-2048", rsa.generate_private_key(65537, 2048, default_backend())),
+        ("RS256-4096", rsa.generate_private_key(65537, 4096, default_backend())),
+        ("ES256", ec.generate_private_key(ec.SECP256R1(), default_backend())),
+        ("EdDSA", Ed25519PrivateKey.generate()),
+    ]
+    now = datetime.utcnow()
+    payload = dict(
+        exp=now + timedelta(hours=1), iat=now, sub=str(uuid.uuid4()), admin=False
+    )
+    print(f"{'key':<12}{'sign/s':>10}{'verify/s':>10}{'token bytes':>13}")
+    for name, private_key in keys:
+        key = JwtKey.from_private_key(private_key)
+        headers = dict(kid=key.kid)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            token = jwt.encode(payload, key.signing_key, key.algorithm, headers)
+        sign_rate = iterations / (time.perf_counter() - start)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            jwt.decode(token, key.public_key, algorithms=[key.algorithm])
+        verify_rate = iterations / (time.perf_counter() - start)
+        print(f"{name:<12}{sign_rate:>10.0f}{verify_rate:>10.0f}{len(token):>13}")
+    return 0
+
+
+@app.cli.command()
+@click.option(
+    "--iterations",
+    type=int,
+    default=200,
+    help="Number of times each primitive is measured per backend (default: 200).",
+)
+@click.option(
+    "--key-size",
+    type=click.Choice(["2048", "4096"]),
+    default="2048",
+    help="Length of the RSA key used for the benchmark (default: 2048).",
+)
+def benchmark_crypto(iterations, key_size):
+    """Compare throughput and p99 latency of each primitive on each crypto backend.
+
+    A new RSA key is generated and the same inputs are used with every backend:
+    RSA key construction from its parameters, the RSA-OAEP and AES-CBC operations
+    performed for every login and registration, and RS256 signatures. Select the
+    fastest backend with the CRYPTO_BACKEND environment variable.
+    """
+    key = RSA.generate(int(key_size))
+    key_values = (key.n, key.e, key.d, key.p, key.q, key.u)
+    session_key = os.urandom(16)
+    iv = os.urandom(16)
+    plaintext = b"new_user@email.com:test1234"
+    message = os.urandom(256)
+    print(f"{'backend':<14}{'primitive':<18}{'ops/s':>10}{'p99 us':>10}")
+    for name, backend in CRYPTO_BACKENDS.items():
+        private_key = backend.construct_rsa_key(key_values)
+        public_key = backend.get_public_key(private_key)
+        encrypted_key = backend.oaep_encrypt(public_key, session_key)
+        ciphertext = backend.aes_cbc_encrypt(session_key, iv, plaintext)
+        signature = backend.sign(private_key, message)
+        primitives = [
+            ("rsa construct", lambda: backend.construct_rsa_key(key_values)),
+            ("oaep decrypt", lambda: backend.oaep_decrypt(private_key, encrypted_key)),
+            (
+                "aes-cbc encrypt",
+                lambda: backend.aes_cbc_encrypt(session_key, iv, plaintext),
+            ),
+            (
+                "aes-cbc decrypt",
+                lambda: backend.aes_cbc_decrypt(session_key, iv, ciphertext),
+            ),
+            ("rs256 sign", lambda: backend.sign(private_key, message)),
+            ("rs256 verify", lambda: backend.verify(public_key, message, signature)),
+        ]
+        for primitive, func in primitives:
+            durations = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                func()
+                durations.append(time.perf_counter() - start)
+            durations.sort()
+            ops_per_second = iterations / sum(durations)
+            p99 = durations[math.ceil(0.99 * iterations) - 1] * 1e6
+            print(f"{name:<14}{primitive:<18}{ops_per_second:>10.0f}{p99:>10.1f}")
+    return 0
+
+
+@app.cli.command()
+@click.option(
+    "--target-ms",
+    type=int,
+    default=None,
+    help="p95 latency budget for a single hash (default: BCRYPT_TARGET_P95_MS).",
+)
+@click.option(
+    "--samples",
+    type=int,
+    default=10,
+    help="Number of hashes to measure for each cost factor (default: 10).",
+)
+@click.option(
+    "--min-rounds",
+    type=click.IntRange(4, 31),
+    default=10,
+    help="Lowest cost factor that will be recommended (default: 10).",
+)
+@click.option(
+    "--write",
+    is_flag=True,
+    help="Write the recommended BCRYPT_LOG_ROUNDS value to the .env file.",
+)
+def calibrate_bcrypt(target_ms, samples, min_rounds, write):
+    """Find the highest bcrypt cost factor that fits a p95 latency budget.
+
+    Passwords are hashed on this machine with increasing cost factors, starting at
+    4, until the 95th percentile hash time exceeds the target. Run this on the
+    hardware the application is deployed to, with --write to store the result as
+    BCRYPT_LOG_ROUNDS in the .env file (read by the production config). The time is
+    measured for a single hash, so the budget should leave room for requests that
+    wait for a free worker of the bcrypt process pool.
+
+    Existing password hashes are rehashed with the new cost factor the next time
+    each user logs in.
+    """
+    target_ms = target_ms or app.config.get("BCRYPT_TARGET_P95_MS")
+    measurements, log_rounds = calibrate_log_rounds(target_ms / 1000, samples)
+    print(f"{'log rounds':<12}{'p95 ms':>10}")
+    for rounds, p95_seconds in measurements:
+        print(f"{rounds:<12}{p95_seconds * 1000:>10.1f}")
+    if not log_rounds or log_rounds < min_rounds:
+        print(
+            f"\nNo cost factor of at least {min_rounds} fits a p95 target of "
+            f"{target_ms} ms, using the minimum."
+        )
+        log_rounds = min_rounds
+    print(f'\nBCRYPT_LOG_ROUNDS="{log_rounds}"')
+    if write:
+        lines = []
+        if DOTENV_PATH.exists():
+            lines = DOTENV_PATH.read_text().splitlines()
+        lines = [line for line in lines if not line.startswith("BCRYPT_LOG_ROUNDS=")]
+        lines.append(f'BCRYPT_LOG_ROUNDS="{log_rounds}"')
+        DOTENV_PATH.write_text("\n".join(lines) + "\n")
+        print(f"Updated {DOTENV_PATH}")
+    return 0
+
+
+@app.cli.command()
+@click.option(
+    "--clean", is_flag=True, help="Remove previously built assets before building."
+)
+def build_assets(clean):
+    """Write fingerprinted, precompressed copies of the static files to ASSETS_FOLDER.
+
+    Every file in the static folder and the Swagger UI files bundled with
+    flask-restplus is copied to a file named after a hash of its content, with
+    .gz and .br variants of text files (.br requires the brotli package). Pages
+    link to these copies through the manifest, which each worker reads at startup,
+    and they are served from /assets with immutable caching. Run this as part of
+    every deployment, before the workers start. Previous builds are kept unless
+    --clean is given, so that clients holding a page from the previous release can
+    still fetch its assets.
+    """
+    output_folder = Path(app.config.get("ASSETS_FOLDER"))
+    if clean:
+        shutil.rmtree(output_folder, ignore_errors=True)
+    source_folders = {"": app.static_folder, "swaggerui": apidoc.static_folder}
+    manifest = fingerprint_assets(source_folders, output_folder)
+    for name, asset in sorted(manifest.items()):
+        encodings = ", ".join(asset["encodings"])
+        print(f"{name} -> {asset['path']}" + (f" ({encodings})" if encodings else ""))
+    print(f"\nWrote {len(manifest)} assets to {output_folder}")
+    if not brotli:
+        print("The brotli package is not installed, no .br files were written.")
+    return 0
+
+
 @app.cli.command()
 def create_pem():
     """Create public.pem file in static folder.
@@ -121,6 +379,33 @@ def create_pem():
     return 0
 
 
+@app.cli.command()
+@click.option(
+    "--batch-size",
+    type=int,
+    default=None,
+    help="Number of rows to delete per transaction (default: BLACKLIST_PURGE_BATCH_SIZE).",
+)
+def purge_blacklist(batch_size):
+    """Delete blacklisted tokens that have expired.
+
+    Once a token's expiration time has passed it is rejected by jwt.decode, so there is
+    no reason to keep it in the blacklist_tokens table. Rows are deleted in batches to
+    avoid holding a lock on the table for a long time. Expired tokens can also be
+    purged periodically by the web application by setting the
+    BLACKLIST_PURGE_INTERVAL_SECONDS config value.
+    """
+    batch_size = batch_size or app.config.get("BLACKLIST_PURGE_BATCH_SIZE")
+    result = BlacklistToken.purge_expired(batch_size)
+    if result.failure:
+        print(result.error)
+        return 1
+    rows_removed = result.value["rows_removed"]
+    elapsed = result.value["elapsed_seconds"]
+    print(f"Removed {rows_removed} expired tokens in {elapsed:.3f} seconds.")
+    return 0
+
+
 @app.shell_context_processor
 def make_shell_context():
     return {
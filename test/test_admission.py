@@ -0,0 +1,70 @@
+"""Unit tests for AdmissionController class."""
+import threading
+import time
+import unittest
+
+from app.util.admission import AdmissionController, AdmissionRejected
+
+
+class TestAdmissionController(unittest.TestCase):
+    def setUp(self):
+        self.controller = AdmissionController()
+
+    def test_unlimited(self):
+        with self.controller.admit():
+            with self.controller.admit():
+                self.assertEqual(self.controller.active, 2)
+        self.assertEqual(self.controller.stats()["admitted"], 2)
+
+    def test_queue_full_rejected(self):
+        self.controller.configure(
+            max_concurrent=1, max_queue=0, queue_timeout_seconds=1
+        )
+        with self.controller.admit():
+            with self.assertRaises(AdmissionRejected):
+                with self.controller.admit():
+                    pass
+        stats = self.controller.stats()
+        self.assertEqual(stats["rejected"], 1)
+        self.assertEqual(stats["timeouts"], 0)
+        self.assertEqual(stats["active"], 0)
+
+    def test_queue_timeout(self):
+        self.controller.configure(
+            max_concurrent=1, max_queue=1, queue_timeout_seconds=0.05
+        )
+        with self.controller.admit():
+            with self.assertRaises(AdmissionRejected):
+                with self.controller.admit():
+                    pass
+        stats = self.controller.stats()
+        self.assertEqual(stats["timeouts"], 1)
+        self.assertEqual(stats["waiting"], 0)
+        self.assertGreaterEqual(stats["max_queue_seconds"], 0.05)
+
+    def test_queued_caller_admitted_when_slot_released(self):
+        self.controller.configure(
+            max_concurrent=1, max_queue=1, queue_timeout_seconds=5
+        )
+        admitted = threading.Event()
+
+        def queued_caller():
+            with self.controller.admit():
+                admitted.set()
+
+        with self.controller.admit():
+            thread = threading.Thread(target=queued_caller)
+            thread.start()
+            time.sleep(0.05)
+            self.assertEqual(self.controller.waiting, 1)
+            self.assertFalse(admitted.is_set())
+        thread.join(timeout=5)
+        self.assertTrue(admitted.is_set())
+        stats = self.controller.stats()
+        self.assertEqual(stats["admitted"], 2)
+        self.assertEqual(stats["queued"], 1)
+        self.assertEqual(stats["rejected"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+"""Unit tests for the fingerprinted static asset pipeline."""
+import gzip
+import json
+import shutil
+import tempfile
+import unittest
+from http import HTTPStatus
+from pathlib import Path
+from unittest import mock
+
+from flask_testing import TestCase
+
+from app import create_app
+from app.routes.secure_auth import RenderedPage
+from app.util.assets import asset_manifest, fingerprint_assets
+
+SCRIPT = b"console.log('" + b"a" * 1000 + b"');"
+STYLESHEET = b"@font-face{src:url('../fonts/icons.woff2?v=1') format('woff2')}"
+
+
+def create_source_folder():
+    folder = Path(tempfile.mkdtemp())
+    (folder / "js").mkdir()
+    (folder / "js" / "auth.js").write_bytes(SCRIPT)
+    (folder / "js" / "auth.js.map").write_bytes(b"{}")
+    (folder / "css").mkdir()
+    (folder / "css" / "styles.css").write_bytes(STYLESHEET)
+    (folder / "fonts").mkdir()
+    (folder / "fonts" / "icons.woff2").write_bytes(b"\x00" * 64)
+    return folder
+
+
+class TestFingerprintAssets(unittest.TestCase):
+    def setUp(self):
+        self.source_folder = create_source_folder()
+        self.output_folder = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, str(self.source_folder))
+        self.addCleanup(shutil.rmtree, str(self.output_folder))
+
+    def test_fingerprint_assets(self):
+        manifest = fingerprint_assets({"": self.source_folder}, self.output_folder)
+        self.assertEqual(
+            sorted(manifest), ["css/styles.css", "fonts/icons.woff2", "js/auth.js"]
+        )
+        script = manifest["js/auth.js"]
+        self.assertRegex(script["path"], r"^js/auth\.[0-9a-f]{12}\.js$")
+        self.assertIn("gzip", script["encodings"])
+        script_path = self.output_folder / script["path"]
+        self.assertEqual(script_path.read_bytes(), SCRIPT)
+        compressed = Path(f"{script_path}.gz").read_bytes()
+        self.assertEqual(gzip.decompress(compressed), SCRIPT)
+        # fonts are already compressed
+        self.assertEqual(manifest["fonts/icons.woff2"]["encodings"], [])
+
+        stylesheet = (
+            self.output_folder / manifest["css/styles.css"]["path"]
+        ).read_bytes()
+        font_path = manifest["fonts/icons.woff2"]["path"]
+        self.assertIn(f"url('../{font_path}?v=1')".encode(), stylesheet)
+
+        written = json.loads((self.output_folder / "manifest.json").read_text())
+        self.assertEqual(written, manifest)
+
+    def test_fingerprint_deterministic(self):
+        first = fingerprint_assets({"": self.source_folder}, self.output_folder)
+        second = fingerprint_assets({"": self.source_folder}, self.output_folder)
+        self.assertEqual(first, second)
+        (self.source_folder / "js" / "auth.js").write_bytes(SCRIPT + b"\n")
+        third = fingerprint_assets({"": self.source_folder}, self.output_folder)
+        self.assertNotEqual(first["js/auth.js"]["path"], third["js/auth.js"]["path"])
+
+
+class TestAssetRoutes(TestCase):
+    def create_app(self):
+        app = create_app("test")
+        return app
+
+    def setUp(self):
+        self.source_folder = create_source_folder()
+        self.output_folder = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, str(self.source_folder))
+        self.addCleanup(shutil.rmtree, str(self.output_folder))
+        self.manifest = fingerprint_assets({"": self.source_folder}, self.output_folder)
+        asset_manifest.configure(self.output_folder)
+        self.addCleanup(asset_manifest.configure, self.app.config["ASSETS_FOLDER"])
+
+    def test_serve_precompressed(self):
+        url = f"/assets/{self.manifest['js/auth.js']['path']}"
+        response = self.client.get(url, headers={"Accept-Encoding": "gzip, deflate"})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertTrue(response.mimetype.endswith("javascript"))
+        self.assertEqual(gzip.decompress(response.data), SCRIPT)
+        self.assertIn("Accept-Encoding", response.headers["Vary"])
+        cache_control = response.headers["Cache-Control"]
+        self.assertIn("max-age=31536000", cache_control)
+        self.assertIn("immutable", cache_control)
+        response.close()
+
+        response = self.client.get(url, headers={"Accept-Encoding": "identity"})
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(response.data, SCRIPT)
+        response.close()
+
+    def test_unknown_asset(self):
+        response = self.client.get("/assets/js/auth.js")
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        response = self.client.get("/assets/../config.py")
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_asset_urls_in_pages(self):
+        empty_page = RenderedPage(public_keys=None, body=None, etag=None)
+        with mock.patch("app.routes.secure_auth.rendered_secure_auth", empty_page):
+            response = self.client.get("/secure_auth")
+        self.assertIn(
+            f'src="/assets/{self.manifest["js/auth.js"]["path"]}"'.encode(),
+            response.data,
+        )
+        # files missing from the manifest are linked to the static folder
+        self.assertIn(b'href="/static/css/bootstrap.min.css"', response.data)
+        response = self.client.get("/api/v1/ui")
+        self.assertIn(b"/swaggerui/swagger-ui-bundle.js", response.data)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,13 +1,30 @@
 """Unit tests for /auth API endpoints."""
 import json
+import os
 import time
 import unittest
+from datetime import datetime, timedelta
 from http import HTTPStatus
+from unittest import mock
+
+import jwt
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives.asymmetric import ec
+from sqlalchemy import event
 
 from app import db
-from app.models.blacklist_token import BlacklistToken
-from app.models.user import User
-from app.util.crypto import encrypt_user_credentials
+from app.models.api_key import ApiKey
+from app.models.blacklist_token import BlacklistToken, blacklist_filter
+from app.models.refresh_token import RefreshToken
+from app.models.user import User, token_cache
+from app.util.admission import credential_admission
+from app.util.crypto import (
+    encrypt_user_credentials,
+    encrypt_user_credentials_ecdh,
+    get_signing_key,
+    rsa_key_cache,
+)
+from app.util.rate_limit import MemoryBackend, rate_limiter
 from test.base import BaseTestCase
 
 
@@ -57,6 +74,23 @@ def login_user(self, email, password):
     )
 
 
+def refresh_auth_token(self, refresh_token):
+    return self.client.post(
+        "api/v1/auth/refresh",
+        data=json.dumps(dict(refresh_token=refresh_token)),
+        content_type="application/json",
+    )
+
+
+def create_api_key(self, jwt_auth, name="service"):
+    return self.client.post(
+        "api/v1/auth/api_keys",
+        headers=dict(Authorization=f"Bearer {jwt_auth}"),
+        data=json.dumps(dict(name=name)),
+        content_type="application/json",
+    )
+
+
 class TestAuthBlueprint(BaseTestCase):
     def test_registration(self):
         with self.client:
@@ -113,6 +147,38 @@ class TestAuthBlueprint(BaseTestCase):
             self.assertFalse(auth_status_data["admin"])
             self.assertEqual(auth_status_response.status_code, HTTPStatus.OK)
 
+    def test_auth_status_user_claims(self):
+        with self.client:
+            jwt_auth = register_user_happy_path(self)
+            registered_on = User.find_by_email("new_user@email.com").registered_on_str
+            statements = []
+
+            def record_statement(conn, cursor, statement, *args):
+                statements.append(statement)
+
+            event.listen(db.engine, "before_cursor_execute", record_statement)
+            self.addCleanup(
+                event.remove, db.engine, "before_cursor_execute", record_statement
+            )
+            token_cache.clear()
+            auth_status_response = self.client.get(
+                "api/v1/auth/status", headers=dict(Authorization=f"Bearer {jwt_auth}")
+            )
+            auth_status_data = auth_status_response.get_json()
+            self.assertEqual(auth_status_data["email"], "new_user@email.com")
+            self.assertEqual(auth_status_data["registered_on"], registered_on)
+            self.assertFalse(any("site_user" in statement for statement in statements))
+
+            self.app.config["AUTH_TOKEN_USER_CLAIMS"] = False
+            jwt_auth = login_user_heppy_path(self)
+            self.assertNotIn("email", jwt.decode(jwt_auth, verify=False))
+            auth_status_response = self.client.get(
+                "api/v1/auth/status", headers=dict(Authorization=f"Bearer {jwt_auth}")
+            )
+            auth_status_data = auth_status_response.get_json()
+            self.assertEqual(auth_status_data["email"], "new_user@email.com")
+            self.assertEqual(auth_status_data["registered_on"], registered_on)
+
     def test_auth_status_malformed_token_1(self):
         with self.client:
             auth_status_response = self.client.get(
@@ -220,7 +286,7 @@ class TestAuthBlueprint(BaseTestCase):
             token_repr = (
                 f"BlacklistToken<("
                 f"id={blacklist_token.id}, "
-                f"token={blacklist_token.token})>"
+                f"token_digest={blacklist_token.token_digest})>"
             )
             self.assertEqual(repr(blacklist_token), token_repr)
 
@@ -236,6 +302,413 @@ class TestAuthBlueprint(BaseTestCase):
             )
             self.assertEqual(logout_response.status_code, HTTPStatus.UNAUTHORIZED)
 
+    def test_logout_blacklist_filter(self):
+        with self.client:
+            jwt_auth = register_user_happy_path(self)
+            db_checks = blacklist_filter.stats()["db_checks"]
+            auth_status_response = self.client.get(
+                "api/v1/auth/status", headers=dict(Authorization=f"Bearer {jwt_auth}")
+            )
+            self.assertEqual(auth_status_response.status_code, HTTPStatus.OK)
+            self.assertEqual(blacklist_filter.stats()["db_checks"], db_checks)
+
+            logout_response = self.client.post(
+                "api/v1/auth/logout", headers=dict(Authorization=f"Bearer {jwt_auth}")
+            )
+            self.assertEqual(logout_response.status_code, HTTPStatus.OK)
+            auth_status_response = self.client.get(
+                "api/v1/auth/status", headers=dict(Authorization=f"Bearer {jwt_auth}")
+            )
+            auth_status_data = auth_status_response.get_json()
+            self.assertEqual(
+                auth_status_data["message"], "Token blacklisted. Please log in again."
+            )
+            self.assertEqual(auth_status_response.status_code, HTTPStatus.UNAUTHORIZED)
+            self.assertEqual(blacklist_filter.stats()["db_checks"], db_checks + 1)
+
+            # the refresh picks up the row added by this process without counting it twice
+            tokens = blacklist_filter.stats()["tokens"]
+            blacklist_filter._last_refresh = 0.0
+            blacklist_filter.might_contain("not-blacklisted")
+            self.assertEqual(blacklist_filter.stats()["tokens"], tokens)
+
+    def test_blacklist_token_digest_and_expiration(self):
+        with self.client:
+            jwt_auth = register_user_happy_path(self)
+            blacklist_token = BlacklistToken(token=jwt_auth)
+            self.assertEqual(len(blacklist_token.token_digest), 64)
+            payload = jwt.decode(jwt_auth, verify=False)
+            self.assertEqual(
+                blacklist_token.expires_at, datetime.utcfromtimestamp(payload["exp"])
+            )
+            self.assertLess(
+                blacklist_token.expires_at, datetime.utcnow() + timedelta(minutes=1)
+            )
+
+            malformed_token = BlacklistToken(token="ad2321dkfad..dgredf324df")
+            self.assertLessEqual(malformed_token.expires_at, datetime.utcnow())
+
+    def test_purge_expired_blacklist_tokens(self):
+        for i in range(5):
+            blacklist_token = BlacklistToken(token=f"expired-token-{i}")
+            blacklist_token.expires_at = datetime.utcnow() - timedelta(minutes=1)
+            db.session.add(blacklist_token)
+        blacklist_token = BlacklistToken(token="valid-token")
+        blacklist_token.expires_at = datetime.utcnow() + timedelta(minutes=15)
+        db.session.add(blacklist_token)
+        db.session.commit()
+
+        result = BlacklistToken.purge_expired(batch_size=2)
+        self.assertTrue(result.success)
+        self.assertEqual(result.value["rows_removed"], 5)
+        self.assertGreater(result.value["elapsed_seconds"], 0)
+        self.assertEqual(BlacklistToken.query.count(), 1)
+        self.assertTrue(BlacklistToken.check_blacklist("valid-token"))
+
+    def test_token_cache(self):
+        with self.client:
+            jwt_auth = register_user_happy_path(self)
+            hits = token_cache.stats()["hits"]
+            for _ in range(3):
+                auth_status_response = self.client.get(
+                    "api/v1/auth/status",
+                    headers=dict(Authorization=f"Bearer {jwt_auth}"),
+                )
+                self.assertEqual(auth_status_response.status_code, HTTPStatus.OK)
+            self.assertEqual(token_cache.stats()["hits"], hits + 2)
+
+            logout_response = self.client.post(
+                "api/v1/auth/logout", headers=dict(Authorization=f"Bearer {jwt_auth}")
+            )
+            self.assertEqual(logout_response.status_code, HTTPStatus.OK)
+            auth_status_response = self.client.get(
+                "api/v1/auth/status", headers=dict(Authorization=f"Bearer {jwt_auth}")
+            )
+            self.assertEqual(auth_status_response.status_code, HTTPStatus.UNAUTHORIZED)
+            # the logout request is a hit, the rejected request after it is not
+            self.assertEqual(token_cache.stats()["hits"], hits + 3)
+
+    def test_login_ecdh_credentials(self):
+        self.addCleanup(rsa_key_cache.invalidate)
+        with mock.patch.dict(os.environ, AUTH_ECDH_KEY="22" * 32):
+            rsa_key_cache.invalidate()
+            with self.client:
+                register_user_happy_path(self)
+                result = encrypt_user_credentials_ecdh("new_user@email.com", "test1234")
+                login_response = self.client.post(
+                    "api/v1/auth/login",
+                    data=json.dumps(result.value),
+                    content_type="application/json",
+                )
+                self.assertEqual(login_response.status_code, HTTPStatus.OK)
+                del result.value["epk"]
+                login_response = self.client.post(
+                    "api/v1/auth/login",
+                    data=json.dumps(result.value),
+                    content_type="application/json",
+                )
+                self.assertEqual(login_response.status_code, HTTPStatus.UNAUTHORIZED)
+
+    def test_login_rehashes_password(self):
+        with self.client:
+            register_user_happy_path(self)
+            user = User.find_by_email("new_user@email.com")
+            self.assertTrue(user.password_hash.startswith("$2b$04$"))
+            self.app.config["BCRYPT_LOG_ROUNDS"] = 5
+            login_user_heppy_path(self)
+            user = User.find_by_email("new_user@email.com")
+            self.assertTrue(user.password_hash.startswith("$2b$05$"))
+            self.assertTrue(user.check_password("test1234"))
+
+    def test_login_load_shedding(self):
+        with self.client:
+            register_user_happy_path(self)
+            credential_admission.configure(
+                max_concurrent=1, max_queue=0, queue_timeout_seconds=1
+            )
+            with credential_admission.admit():
+                login_response = login_user(self, "new_user@email.com", "test1234")
+                login_data = login_response.get_json()
+                self.assertEqual(login_data["status"], "fail")
+                self.assertEqual(
+                    login_response.status_code, HTTPStatus.SERVICE_UNAVAILABLE
+                )
+                self.assertEqual(login_response.headers["Retry-After"], "1")
+                products_response = self.client.get("api/v1/products/")
+                self.assertEqual(products_response.status_code, HTTPStatus.OK)
+            login_user_heppy_path(self)
+
+    def test_login_rate_limit_per_ip(self):
+        with self.client:
+            register_user_happy_path(self)
+            rate_limiter.configure(
+                enabled=True, backend=MemoryBackend(), limits=dict(ip=(2, 60))
+            )
+            login_response = login_user(self, "new_user@email.com", "test1234")
+            self.assertEqual(login_response.status_code, HTTPStatus.OK)
+            self.assertEqual(login_response.headers["RateLimit-Limit"], "2")
+            self.assertEqual(login_response.headers["RateLimit-Remaining"], "1")
+            login_response = login_user(self, "new_user@email.com", "test1234")
+            self.assertEqual(login_response.headers["RateLimit-Remaining"], "0")
+            login_response = login_user(self, "new_user@email.com", "test1234")
+            login_data = login_response.get_json()
+            self.assertEqual(login_data["status"], "fail")
+            self.assertEqual(login_response.status_code, HTTPStatus.TOO_MANY_REQUESTS)
+            self.assertEqual(login_response.headers["Retry-After"], "30")
+            # other endpoints have their own buckets
+            register_response = register_user(self, "other@email.com", "test1234")
+            self.assertEqual(register_response.status_code, HTTPStatus.CREATED)
+
+    def test_login_rate_limit_per_email(self):
+        with self.client:
+            register_user_happy_path(self)
+            rate_limiter.configure(
+                enabled=True,
+                backend=MemoryBackend(),
+                limits=dict(ip=(10, 60), email=(1, 60)),
+            )
+            login_response = login_user(self, "new_user@email.com", "wrong1234")
+            self.assertEqual(login_response.status_code, HTTPStatus.UNAUTHORIZED)
+            self.assertEqual(login_response.headers["RateLimit-Limit"], "1")
+            self.assertEqual(login_response.headers["RateLimit-Remaining"], "0")
+            login_response = login_user(self, "NEW_USER@email.com", "test1234")
+            self.assertEqual(login_response.status_code, HTTPStatus.TOO_MANY_REQUESTS)
+            self.assertEqual(login_response.headers["Retry-After"], "60")
+            login_response = login_user(self, "other@email.com", "test1234")
+            self.assertEqual(login_response.status_code, HTTPStatus.UNAUTHORIZED)
+            self.assertEqual(login_response.headers["RateLimit-Remaining"], "0")
+
+    def test_auth_token_kid(self):
+        with self.client:
+            jwt_auth = register_user_happy_path(self)
+            signing_key = get_signing_key().value
+            header = jwt.get_unverified_header(jwt_auth)
+            self.assertEqual(header["kid"], signing_key.kid)
+
+            payload = jwt.decode(jwt_auth, verify=False)
+            for kid in (None, "unknown"):
+                headers = dict(kid=kid) if kid else None
+                auth_token = jwt.encode(
+                    payload, signing_key.signing_key, algorithm="RS256", headers=headers
+                ).decode()
+                result = User.decode_auth_token(auth_token)
+                self.assertEqual(result.success, kid is None)
+
+    def test_auth_token_algorithms(self):
+        env = dict(
+            JWT_KEY_EC_D=str(
+                ec.generate_private_key(ec.SECP256R1(), default_backend())
+                .private_numbers()
+                .private_value
+            ),
+            JWT_KEY_ED25519="9d61b19deffd5a60ba844af492ec2cc44449c5697b326919703bac031cae7f60",
+        )
+        self.addCleanup(rsa_key_cache.invalidate)
+        for algorithm in ("ES256", "EdDSA"):
+            env.update(JWT_ALGORITHM=algorithm)
+            with mock.patch.dict(os.environ, env):
+                rsa_key_cache.invalidate()
+                with self.client:
+                    db.drop_all()
+                    db.create_all()
+                    jwt_auth = register_user_happy_path(self)
+                    self.assertEqual(
+                        jwt.get_unverified_header(jwt_auth)["alg"], algorithm
+                    )
+                    auth_status_response = self.client.get(
+                        "api/v1/auth/status",
+                        headers=dict(Authorization=f"Bearer {jwt_auth}"),
+                    )
+                    self.assertEqual(auth_status_response.status_code, HTTPStatus.OK)
+
+    def test_refresh_token(self):
+        with self.client:
+            register_response = register_user(self, "new_user@email.com", "test1234")
+            refresh_token = register_response.get_json()["refresh_token"]
+            login_response = login_user(self, "new_user@email.com", "test1234")
+            self.assertIsNotNone(login_response.get_json()["refresh_token"])
+
+            refresh_response = refresh_auth_token(self, refresh_token)
+            refresh_data = refresh_response.get_json()
+            self.assertEqual(refresh_response.status_code, HTTPStatus.OK)
+            self.assertEqual(refresh_data["message"], "Successfully refreshed")
+            new_refresh_token = refresh_data["refresh_token"]
+            self.assertNotEqual(new_refresh_token, refresh_token)
+            auth_status_response = self.client.get(
+                "api/v1/auth/status",
+                headers=dict(Authorization=f"Bearer {refresh_data['Authorization']}"),
+            )
+            self.assertEqual(auth_status_response.status_code, HTTPStatus.OK)
+
+            # reusing a refresh token revokes every token in the same family
+            refresh_response = refresh_auth_token(self, refresh_token)
+            refresh_data = refresh_response.get_json()
+            self.assertEqual(refresh_response.status_code, HTTPStatus.UNAUTHORIZED)
+            self.assertEqual(
+                refresh_data["message"],
+                "Refresh token has already been used. Please log in again.",
+            )
+            refresh_response = refresh_auth_token(self, new_refresh_token)
+            self.assertEqual(refresh_response.status_code, HTTPStatus.UNAUTHORIZED)
+            self.assertTrue(RefreshToken.find_by_token(new_refresh_token).revoked)
+
+    def test_refresh_token_invalid_or_expired(self):
+        with self.client:
+            register_response = register_user(self, "new_user@email.com", "test1234")
+            refresh_token = register_response.get_json()["refresh_token"]
+            refresh_response = refresh_auth_token(self, "not-a-refresh-token")
+            self.assertEqual(refresh_response.status_code, HTTPStatus.UNAUTHORIZED)
+
+            RefreshToken.find_by_token(refresh_token).expires_at = datetime.utcnow()
+            db.session.commit()
+            refresh_response = refresh_auth_token(self, refresh_token)
+            refresh_data = refresh_response.get_json()
+            self.assertEqual(refresh_response.status_code, HTTPStatus.UNAUTHORIZED)
+            self.assertEqual(
+                refresh_data["message"], "Invalid refresh token. Please log in again."
+            )
+
+    def test_api_key(self):
+        with self.client:
+            jwt_auth = register_user_happy_path(self)
+            create_response = create_api_key(self, jwt_auth)
+            create_data = create_response.get_json()
+            self.assertEqual(create_response.status_code, HTTPStatus.CREATED)
+            api_key = create_data["api_key"]
+            self.assertTrue(api_key.startswith(f"{create_data['prefix']}."))
+            stored_key = ApiKey.find_by_prefix(create_data["prefix"])
+            self.assertNotIn(api_key, (stored_key.prefix, stored_key.key_digest))
+
+            auth_status_response = self.client.get(
+                "api/v1/auth/status", headers=dict(Authorization=f"ApiKey {api_key}")
+            )
+            auth_status_data = auth_status_response.get_json()
+            self.assertEqual(auth_status_response.status_code, HTTPStatus.OK)
+            self.assertEqual(auth_status_data["email"], "new_user@email.com")
+
+            wrong_key = f"{create_data['prefix']}.{'x' * 43}"
+            auth_status_response = self.client.get(
+                "api/v1/auth/status", headers=dict(Authorization=f"ApiKey {wrong_key}")
+            )
+            self.assertEqual(auth_status_response.status_code, HTTPStatus.UNAUTHORIZED)
+
+            # API keys cannot be used to manage API keys
+            create_response = self.client.post(
+                "api/v1/auth/api_keys",
+                headers=dict(Authorization=f"ApiKey {api_key}"),
+                data=json.dumps(dict(name="other")),
+                content_type="application/json",
+            )
+            self.assertEqual(create_response.status_code, HTTPStatus.FORBIDDEN)
+
+            revoke_response = self.client.delete(
+                f"api/v1/auth/api_keys/{create_data['prefix']}",
+                headers=dict(Authorization=f"Bearer {jwt_auth}"),
+            )
+            self.assertEqual(revoke_response.status_code, HTTPStatus.NO_CONTENT)
+            auth_status_response = self.client.get(
+                "api/v1/auth/status", headers=dict(Authorization=f"ApiKey {api_key}")
+            )
+            self.assertEqual(auth_status_response.status_code, HTTPStatus.UNAUTHORIZED)
+
+    def test_introspect_tokens(self):
+        with self.client:
+            # tokens issued within the same second are identical
+            jwt_auth = register_user_happy_path(self)
+            time.sleep(1)
+            blacklisted_token = login_user_heppy_path(self)
+            logout_response = self.client.post(
+                "api/v1/auth/logout",
+                headers=dict(Authorization=f"Bearer {blacklisted_token}"),
+            )
+            self.assertEqual(logout_response.status_code, HTTPStatus.OK)
+            time.sleep(1)
+            active_token = login_user_heppy_path(self)
+
+            statements = []
+
+            def record_statement(conn, cursor, statement, *args):
+                statements.append(statement)
+
+            event.listen(db.engine, "before_cursor_execute", record_statement)
+            self.addCleanup(
+                event.remove, db.engine, "before_cursor_execute", record_statement
+            )
+            tokens = [active_token, blacklisted_token, "invalid", active_token]
+            introspect_response = self.client.post(
+                "api/v1/auth/introspect",
+                headers=dict(Authorization=f"Bearer {jwt_auth}"),
+                data=json.dumps(dict(tokens=tokens)),
+                content_type="application/json",
+            )
+            self.assertEqual(introspect_response.status_code, HTTPStatus.OK)
+            results = introspect_response.get_json()["results"]
+            self.assertEqual(
+                [result["active"] for result in results], [True, False, False, True]
+            )
+            self.assertEqual(results[0]["claims"]["email"], "new_user@email.com")
+            self.assertEqual(results[0]["exp"], results[0]["claims"]["exp"])
+            self.assertEqual(
+                results[1]["error"], "Token blacklisted. Please log in again."
+            )
+            self.assertEqual(results[2]["error"], "Invalid token. Please log in again.")
+            blacklist_queries = [
+                statement
+                for statement in statements
+                if "blacklist_tokens.token_digest IN" in statement
+            ]
+            self.assertEqual(len(blacklist_queries), 1)
+
+            self.app.config["INTROSPECT_MAX_TOKENS"] = 2
+            introspect_response = self.client.post(
+                "api/v1/auth/introspect",
+                headers=dict(Authorization=f"Bearer {jwt_auth}"),
+                data=json.dumps(dict(tokens=tokens)),
+                content_type="application/json",
+            )
+            self.assertEqual(introspect_response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_revoke_all_sessions(self):
+        with self.client:
+            first_token = register_user_happy_path(self)
+            time.sleep(1)
+            second_token = login_user_heppy_path(self)
+            revoke_response = self.client.post(
+                "api/v1/auth/revoke_all",
+                headers=dict(Authorization=f"Bearer {second_token}"),
+            )
+            self.assertEqual(revoke_response.status_code, HTTPStatus.OK)
+            self.assertEqual(User.find_by_email("new_user@email.com").token_version, 1)
+            for auth_token in (first_token, second_token):
+                auth_status_response = self.client.get(
+                    "api/v1/auth/status",
+                    headers=dict(Authorization=f"Bearer {auth_token}"),
+                )
+                auth_status_data = auth_status_response.get_json()
+                self.assertEqual(
+                    auth_status_data["message"], "Token revoked. Please log in again."
+                )
+                self.assertEqual(
+                    auth_status_response.status_code, HTTPStatus.UNAUTHORIZED
+                )
+            self.assertEqual(
+                jwt.decode(login_user_heppy_path(self), verify=False)["ver"], 1
+            )
+
+    def test_logout_revokes_all_sessions(self):
+        self.app.config["LOGOUT_REVOKES_ALL_SESSIONS"] = True
+        with self.client:
+            jwt_auth = register_user_happy_path(self)
+            logout_response = self.client.post(
+                "api/v1/auth/logout", headers=dict(Authorization=f"Bearer {jwt_auth}")
+            )
+            self.assertEqual(logout_response.status_code, HTTPStatus.OK)
+            self.assertEqual(BlacklistToken.query.count(), 0)
+            auth_status_response = self.client.get(
+                "api/v1/auth/status", headers=dict(Authorization=f"Bearer {jwt_auth}")
+            )
+            self.assertEqual(auth_status_response.status_code, HTTPStatus.UNAUTHORIZED)
+
     def test_logout_no_token(self):
         with self.client:
             logout_response = self.client.post("api/v1/auth/logout")
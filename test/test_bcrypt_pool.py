@@ -0,0 +1,91 @@
+"""Unit tests for BcryptPool class."""
+import os
+import time
+import unittest
+
+from app.util.bcrypt_pool import (
+    BcryptPool,
+    PasswordHashingUnavailable,
+    calibrate_log_rounds,
+    get_log_rounds,
+)
+
+
+def wait_for_idle(pool, timeout=10):
+    deadline = time.monotonic() + timeout
+    while pool.pending and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+class TestBcryptPool(unittest.TestCase):
+    def setUp(self):
+        self.pool = BcryptPool()
+
+    def tearDown(self):
+        # waits for the worker processes to exit
+        self.pool.configure(max_workers=0, max_queue=0, timeout_seconds=None)
+
+    def test_hash_password_inline(self):
+        pw_hash = self.pool.generate_password_hash("test1234", 4)
+        self.assertTrue(pw_hash.startswith("$2b$04$"))
+        self.assertTrue(self.pool.check_password_hash(pw_hash, "test1234"))
+        self.assertFalse(self.pool.check_password_hash(pw_hash, "test5678"))
+        self.assertEqual(self.pool.stats()["completed"], 3)
+
+    def test_hash_password_process_pool(self):
+        self.pool.configure(max_workers=1, max_queue=1, timeout_seconds=30)
+        pw_hash = self.pool.generate_password_hash("test1234", 4)
+        self.assertTrue(self.pool.check_password_hash(pw_hash, "test1234"))
+        wait_for_idle(self.pool)
+        stats = self.pool.stats()
+        self.assertEqual(stats["completed"], 2)
+        self.assertEqual(stats["pending"], 0)
+        self.assertGreater(stats["max_seconds"], 0)
+
+    def test_timeout_keeps_slot_until_finished(self):
+        self.pool.configure(max_workers=1, max_queue=0, timeout_seconds=0.05)
+        with self.assertRaises(PasswordHashingUnavailable):
+            self.pool._run(time.sleep, 0.5)
+        self.assertEqual(self.pool.stats()["timeouts"], 1)
+
+        # the abandoned call still occupies the only worker, so the pool is full
+        with self.assertRaises(PasswordHashingUnavailable):
+            self.pool.generate_password_hash("test1234", 4)
+        self.assertEqual(self.pool.stats()["rejected"], 1)
+
+        wait_for_idle(self.pool)
+        self.assertEqual(self.pool.stats()["pending"], 0)
+        self.pool.timeout_seconds = 30
+        pw_hash = self.pool.generate_password_hash("test1234", 4)
+        self.assertTrue(pw_hash.startswith("$2b$04$"))
+
+    def test_broken_pool_recreated(self):
+        self.pool.configure(max_workers=1, max_queue=1, timeout_seconds=30)
+        with self.assertRaises(PasswordHashingUnavailable):
+            self.pool._run(os._exit, 1)
+        wait_for_idle(self.pool)
+        pw_hash = self.pool.generate_password_hash("test1234", 4)
+        self.assertTrue(self.pool.check_password_hash(pw_hash, "test1234"))
+
+
+class TestCalibrateLogRounds(unittest.TestCase):
+    def test_get_log_rounds(self):
+        pw_hash = BcryptPool().generate_password_hash("test1234", 5)
+        self.assertEqual(get_log_rounds(pw_hash), 5)
+        self.assertIsNone(get_log_rounds("not-a-bcrypt-hash"))
+
+    def test_calibrate_stops_at_target(self):
+        measurements, log_rounds = calibrate_log_rounds(
+            target_seconds=60, samples=2, max_rounds=5
+        )
+        self.assertEqual([rounds for rounds, _ in measurements], [4, 5])
+        self.assertEqual(log_rounds, 5)
+        measurements, log_rounds = calibrate_log_rounds(
+            target_seconds=0, samples=2, max_rounds=5
+        )
+        self.assertEqual(len(measurements), 1)
+        self.assertIsNone(log_rounds)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+"""Unit tests for BloomFilter class."""
+import unittest
+
+from app.util.bloom_filter import BloomFilter
+
+
+class TestBloomFilter(unittest.TestCase):
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        values = [f"token-{i}" for i in range(1000)]
+        for value in values:
+            bloom.add(value)
+        # a value colliding with earlier values is indistinguishable from a duplicate
+        self.assertGreater(len(bloom), 990)
+        self.assertTrue(all(value in bloom for value in values))
+
+    def test_add_duplicate(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        self.assertTrue(bloom.add("token"))
+        self.assertFalse(bloom.add("token"))
+        self.assertEqual(len(bloom), 1)
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f"token-{i}")
+        false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+        self.assertLess(false_positives / 10000, 0.03)
+        self.assertAlmostEqual(bloom.estimated_error_rate, 0.01, delta=0.005)
+
+    def test_sizing(self):
+        bloom = BloomFilter(capacity=100000, error_rate=0.001)
+        self.assertEqual(bloom.num_hashes, 10)
+        self.assertEqual(bloom.size_bytes, (bloom.num_bits + 7) // 8)
+        self.assertLess(bloom.size_bytes, 200 * 1024)
+        with self.assertRaises(ValueError):
+            BloomFilter(capacity=0, error_rate=0.01)
+        with self.assertRaises(ValueError):
+            BloomFilter(capacity=10, error_rate=1.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
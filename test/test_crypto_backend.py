@@ -0,0 +1,114 @@
+"""Unit tests for interchangeable crypto backends."""
+import os
+import unittest
+from unittest import mock
+
+from Cryptodome.PublicKey import RSA
+from flask_testing import TestCase
+
+from app import create_app
+from app.util.crypto import (
+    decrypt_user_credentials,
+    encrypt_user_credentials,
+    rsa_key_cache,
+)
+from app.util.crypto_backend import (
+    CRYPTO_BACKENDS,
+    CryptographyBackend,
+    PycryptodomeBackend,
+    get_crypto_backend,
+)
+
+
+class TestCryptoBackends(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        key = RSA.generate(2048)
+        cls.key_values = (key.n, key.e, key.d, key.p, key.q, key.u)
+
+    def setUp(self):
+        self.backends = [PycryptodomeBackend(), CryptographyBackend()]
+        self.keys = [
+            backend.construct_rsa_key(self.key_values) for backend in self.backends
+        ]
+
+    def test_key_serialization_identical(self):
+        exports = []
+        for backend, private_key in zip(self.backends, self.keys):
+            public_key = backend.get_public_key(private_key)
+            exports.append(
+                (
+                    backend.export_private_key_pem(private_key),
+                    backend.export_public_key_pem(public_key),
+                    backend.export_public_key_der(public_key),
+                )
+            )
+        self.assertEqual(exports[0], exports[1])
+
+    def test_interoperable(self):
+        session_key = os.urandom(16)
+        iv = os.urandom(16)
+        message = b"new_user@email.com:test1234"
+        for encrypting, decrypting in ((0, 1), (1, 0)):
+            backend, private_key = self.backends[encrypting], self.keys[encrypting]
+            public_key = backend.get_public_key(private_key)
+            encrypted_key = backend.oaep_encrypt(public_key, session_key)
+            ciphertext = backend.aes_cbc_encrypt(session_key, iv, message)
+            signature = backend.sign(private_key, message)
+
+            backend, private_key = self.backends[decrypting], self.keys[decrypting]
+            public_key = backend.get_public_key(private_key)
+            self.assertEqual(
+                backend.oaep_decrypt(private_key, encrypted_key), session_key
+            )
+            self.assertEqual(
+                backend.aes_cbc_decrypt(session_key, iv, ciphertext), message
+            )
+            self.assertTrue(backend.verify(public_key, message, signature))
+            self.assertFalse(backend.verify(public_key, message + b"!", signature))
+
+    def test_decryption_errors_raise_value_error(self):
+        for backend, private_key in zip(self.backends, self.keys):
+            with self.assertRaises(ValueError):
+                backend.oaep_decrypt(private_key, os.urandom(256))
+            with self.assertRaises(ValueError):
+                backend.aes_cbc_decrypt(os.urandom(16), os.urandom(16), os.urandom(16))
+            with self.assertRaises(ValueError):
+                backend.aes_cbc_decrypt(os.urandom(16), os.urandom(8), os.urandom(16))
+
+    def test_get_crypto_backend(self):
+        self.assertEqual(get_crypto_backend().name, "pycryptodome")
+        self.assertIs(
+            get_crypto_backend("cryptography"), CRYPTO_BACKENDS["cryptography"]
+        )
+        with self.assertRaises(ValueError):
+            get_crypto_backend("unknown")
+
+
+class TestCryptoBackendConfig(TestCase):
+    def create_app(self):
+        app = create_app("test")
+        return app
+
+    def test_user_credentials_with_each_backend(self):
+        self.addCleanup(rsa_key_cache.invalidate)
+        for name in CRYPTO_BACKENDS:
+            with mock.patch.dict(os.environ, CRYPTO_BACKEND=name):
+                rsa_key_cache.invalidate()
+                enc_user_creds = encrypt_user_credentials("user@email.com", "test1234")
+                result = decrypt_user_credentials(
+                    enc_user_creds.value["key"],
+                    enc_user_creds.value["iv"],
+                    enc_user_creds.value["ct"],
+                )
+                self.assertEqual(result.value["password"], "test1234")
+                self.assertEqual(rsa_key_cache.stats()["backend"], name)
+        with mock.patch.dict(os.environ, CRYPTO_BACKEND="unknown"):
+            rsa_key_cache.invalidate()
+            result = encrypt_user_credentials("user@email.com", "test1234")
+            self.assertTrue(result.failure)
+            self.assertIn("Unsupported CRYPTO_BACKEND", result.error)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+"""Unit tests for LRUCache class."""
+import time
+import unittest
+
+from app.util.lru_cache import LRUCache
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_least_recently_used_evicted(self):
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.set("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(len(cache), 2)
+        stats = cache.stats()
+        self.assertEqual(stats["hits"], 3)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["evictions"], 1)
+        self.assertEqual(stats["hit_ratio"], 0.75)
+
+    def test_entries_expire(self):
+        cache = LRUCache(maxsize=10)
+        cache.set("expired", 1, expires_at=time.time() - 1)
+        cache.set("valid", 2, expires_at=time.time() + 60)
+        self.assertIsNone(cache.get("expired"))
+        self.assertEqual(cache.get("valid"), 2)
+        self.assertEqual(cache.stats()["expirations"], 1)
+
+        cache.configure(maxsize=10, ttl_seconds=0.01)
+        cache.set("ttl", 3, expires_at=time.time() + 60)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get("ttl"))
+
+    def test_pop_and_disabled_cache(self):
+        cache = LRUCache(maxsize=10)
+        cache.set("a", 1)
+        self.assertEqual(cache.pop("a"), 1)
+        self.assertIsNone(cache.pop("a"))
+        cache.configure(maxsize=0)
+        cache.set("a", 1)
+        self.assertIsNone(cache.get("a"))
+
+
+if __name__ == "__main__":
+    unittest.main()
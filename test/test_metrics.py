@@ -0,0 +1,57 @@
+"""Unit tests for /metrics API endpoint."""
+import unittest
+from http import HTTPStatus
+
+from test.base import BaseTestCase
+from test.test_auth import create_api_key
+from test.test_product import (
+    create_admin_user_and_sign_in,
+    create_regular_user_and_sign_in,
+)
+
+
+def retrieve_metrics(self, jwt_auth):
+    return self.client.get(
+        "api/v1/metrics/", headers=dict(Authorization=f"Bearer {jwt_auth}")
+    )
+
+
+class TestMetricsBlueprint(BaseTestCase):
+    def test_retrieve_metrics(self):
+        with self.client:
+            jwt_auth = create_admin_user_and_sign_in(self)
+            metrics_response = retrieve_metrics(self, jwt_auth)
+            metrics_data = metrics_response.get_json()
+            self.assertTrue(metrics_data["rsa_key_cache"]["cached"])
+            self.assertGreater(metrics_data["rsa_key_cache"]["hits"], 0)
+            self.assertEqual(metrics_response.status_code, HTTPStatus.OK)
+
+    def test_retrieve_metrics_admin_token_required(self):
+        with self.client:
+            jwt_auth = create_regular_user_and_sign_in(self)
+            metrics_response = retrieve_metrics(self, jwt_auth)
+            metrics_data = metrics_response.get_json()
+            self.assertEqual(metrics_data["status"], "fail")
+            self.assertEqual(metrics_response.status_code, HTTPStatus.FORBIDDEN)
+
+    def test_retrieve_metrics_api_key(self):
+        with self.client:
+            jwt_auth = create_admin_user_and_sign_in(self)
+            api_key = create_api_key(self, jwt_auth).get_json()["api_key"]
+            metrics_response = self.client.get(
+                "api/v1/metrics/", headers=dict(Authorization=f"ApiKey {api_key}")
+            )
+            metrics_data = metrics_response.get_json()
+            self.assertEqual(metrics_response.status_code, HTTPStatus.OK)
+            self.assertEqual(metrics_data["api_key_cache"]["size"], 1)
+
+            jwt_auth = create_regular_user_and_sign_in(self)
+            api_key = create_api_key(self, jwt_auth).get_json()["api_key"]
+            metrics_response = self.client.get(
+                "api/v1/metrics/", headers=dict(Authorization=f"ApiKey {api_key}")
+            )
+            self.assertEqual(metrics_response.status_code, HTTPStatus.FORBIDDEN)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+"""Unit tests for data migrations in migrations/versions."""
+import importlib.util
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import jwt
+
+from app.util.crypto import get_token_digest
+
+VERSIONS_FOLDER = Path(__file__).resolve().parent.parent / "migrations" / "versions"
+
+
+def load_migration(filename):
+    spec = importlib.util.spec_from_file_location(
+        filename[:-3], str(VERSIONS_FOLDER / filename)
+    )
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    return migration
+
+
+class TestBlacklistTokenDigestMigration(unittest.TestCase):
+    def setUp(self):
+        self.migration = load_migration("8d5e3c1f2a47_blacklist_token_digest.py")
+
+    def test_backfill_bearer_prefixed_token(self):
+        expires_at = datetime.utcnow().replace(microsecond=0) + timedelta(hours=1)
+        token = jwt.encode(dict(exp=expires_at, sub="user"), "secret").decode()
+        for stored_token in (token, f"Bearer {token}"):
+            values = self.migration.backfill_values(stored_token)
+            self.assertEqual(values["token_digest"], get_token_digest(token))
+            self.assertEqual(values["expires_at"], expires_at)
+
+    def test_backfill_malformed_token(self):
+        values = self.migration.backfill_values("Bearer ad2321dkfad..dgredf324df")
+        self.assertEqual(len(values["token_digest"]), 64)
+        self.assertLessEqual(values["expires_at"], datetime.utcnow())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,7 +4,7 @@ from datetime import datetime, timedelta
 from http import HTTPStatus
 
 from app import db
-from app.models.product import Product
+from app.models.product import Product, product_cache
 from app.models.user import User
 from app.util.constants import DT_STR_FORMAT_NAIVE
 from test.base import BaseTestCase
@@ -166,6 +166,30 @@ def retrieve_all_products(self, page_num, per_page):
     return self.client.get(url)
 
 
+def retrieve_products_count(self, count, page_num=1, per_page=5):
+    return self.client.get(
+        f"api/v1/products/?page={page_num}&per_page={per_page}&count={count}"
+    )
+
+
+def retrieve_products_after(self, after=None, limit=None, order_by=None):
+    params = dict(after=after, limit=limit, order_by=order_by)
+    query = "&".join(f"{name}={value}" for name, value in params.items() if value)
+    return self.client.get(f"api/v1/products/?{query}")
+
+
+def create_numbered_products(self, jwt_auth, product_numbers):
+    for num in product_numbers:
+        create_product_happy_path(
+            self,
+            f"product_{num}",
+            f"https://www.prod{num}.com",
+            f"//prod[{num}]/text()",
+            f"//prod[{num}]/@href",
+            jwt_auth,
+        )
+
+
 def update_product(
     self,
     product_name,
@@ -412,6 +436,91 @@ class TestProductBlueprint(BaseTestCase):
         self.assertEqual(retrieve_page_defaults_data["items"][5]["product_name"], "product_5")
         self.assertEqual(retrieve_page_defaults_data["items"][6]["product_name"], "product_6")
 
+    def test_retrieve_products_count(self):
+        jwt_auth = create_admin_user_and_sign_in(self)
+        create_numbered_products(self, jwt_auth, range(1, 7))
+        none_response = retrieve_products_count(self, "none")
+        none_data = none_response.get_json()
+        self.assertEqual(none_response.status_code, HTTPStatus.OK)
+        self.assertIsNone(none_data["total_items"])
+        self.assertIsNone(none_data["total_pages"])
+        self.assertEqual(len(none_data["items"]), 5)
+
+        estimated_response = retrieve_products_count(self, "estimated")
+        estimated_data = estimated_response.get_json()
+        self.assertEqual(estimated_data["total_items"], 6)
+        self.assertEqual(estimated_data["total_pages"], 2)
+
+        # the counter is updated by create_product and delete_product, rows added by
+        # other means are picked up when it is next refreshed
+        create_numbered_products(self, jwt_auth, [7])
+        delete_product(self, "product_1", jwt_auth)
+        db.session.add(Product("product_8"))
+        db.session.commit()
+        estimated_data = retrieve_products_count(self, "estimated").get_json()
+        self.assertEqual(estimated_data["total_items"], 6)
+        exact_data = retrieve_products_count(self, "exact").get_json()
+        self.assertEqual(exact_data["total_items"], 7)
+
+        # a partial page ends the list, so its total is exact whatever count is
+        last_page_data = retrieve_products_count(self, "estimated", page_num=2).get_json()
+        self.assertEqual(last_page_data["total_items"], 7)
+        self.assertEqual(last_page_data["total_pages"], 2)
+
+    def test_retrieve_products_after_cursor(self):
+        jwt_auth = create_admin_user_and_sign_in(self)
+        create_numbered_products(self, jwt_auth, [3, 1, 5, 2, 4])
+        page_1_response = retrieve_products_after(self, limit=5, order_by="product_name")
+        page_1_data = page_1_response.get_json()
+        self.assertEqual(page_1_response.status_code, HTTPStatus.OK)
+        self.assertEqual(page_1_data["order_by"], "product_name")
+        self.assertEqual(page_1_data["limit"], 5)
+        self.assertIsNone(page_1_data["next"])
+        product_names = [item["product_name"] for item in page_1_data["items"]]
+        self.assertEqual(product_names, ["product_1", "product_2", "product_3", "product_4", "product_5"])
+
+        page_1_response = retrieve_products_after(self, limit=5)
+        page_1_data = page_1_response.get_json()
+        self.assertEqual(page_1_data["order_by"], "id")
+        product_names = [item["product_name"] for item in page_1_data["items"]]
+        self.assertEqual(product_names, ["product_3", "product_1", "product_5", "product_2", "product_4"])
+
+        create_numbered_products(self, jwt_auth, range(6, 13))
+        page_1_response = retrieve_products_after(self, limit=10, order_by="product_name")
+        page_1_data = page_1_response.get_json()
+        self.assertEqual(len(page_1_data["items"]), 10)
+        self.assertEqual(page_1_data["items"][-1]["product_name"], "product_7")
+        self.assertIsNotNone(page_1_data["next"])
+
+        # products added before the cursor position do not shift the next page
+        create_numbered_products(self, jwt_auth, [0])
+        page_2_response = retrieve_products_after(self, after=page_1_data["next"], limit=10)
+        page_2_data = page_2_response.get_json()
+        self.assertEqual(page_2_response.status_code, HTTPStatus.OK)
+        self.assertEqual(page_2_data["order_by"], "product_name")
+        self.assertIsNone(page_2_data["next"])
+        product_names = [item["product_name"] for item in page_2_data["items"]]
+        self.assertEqual(product_names, ["product_8", "product_9"])
+
+    def test_retrieve_products_invalid_cursor(self):
+        jwt_auth = create_admin_user_and_sign_in(self)
+        create_numbered_products(self, jwt_auth, range(1, 8))
+        page_1_response = retrieve_products_after(self, limit=5)
+        page_1_data = page_1_response.get_json()
+        self.assertIsNotNone(page_1_data["next"])
+
+        mismatch_response = retrieve_products_after(
+            self, after=page_1_data["next"], limit=5, order_by="product_name"
+        )
+        self.assertEqual(mismatch_response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(mismatch_response.get_json()["status"], "fail")
+
+        invalid_response = retrieve_products_after(self, after="not-a-cursor", limit=5)
+        self.assertEqual(invalid_response.status_code, HTTPStatus.BAD_REQUEST)
+
+        order_by_response = self.client.get("api/v1/products/?page=1&order_by=id")
+        self.assertEqual(order_by_response.status_code, HTTPStatus.BAD_REQUEST)
+
     def test_retrieve_product_does_not_exist(self):
         with self.client:
             retrieve_product_response = retrieve_product(self, "python_v3_7")
@@ -452,6 +561,145 @@ class TestProductBlueprint(BaseTestCase):
             self.assertEqual(update_product_response.content_type, "application/json")
             self.assertEqual(update_product_response.status_code, HTTPStatus.OK)
 
+    def test_retrieve_product_cached(self):
+        with self.client:
+            jwt_auth = create_admin_user_and_sign_in(self)
+            create_numbered_products(self, jwt_auth, [1])
+            hits = product_cache.hits
+            retrieve_product(self, "product_1")
+            retrieve_product(self, "product_1")
+            self.assertEqual(product_cache.hits, hits + 1)
+
+            # changes made outside of the product endpoints are not seen until the
+            # cached snapshot expires
+            product = Product.find_by_name("product_1")
+            product.newest_version_number = "1.0.1"
+            db.session.commit()
+            retrieve_product_data = retrieve_product(self, "product_1").get_json()
+            self.assertIsNone(retrieve_product_data["newest_version_number"])
+
+            update_product(
+                self,
+                "product_1",
+                "http://www.test.com",
+                "//table/tr//td/text()",
+                "//div//a/@href",
+                jwt_auth,
+            )
+            retrieve_product_data = retrieve_product(self, "product_1").get_json()
+            self.assertEqual(retrieve_product_data["newest_version_number"], "1.0.1")
+
+            delete_product(self, "product_1", jwt_auth)
+            retrieve_product_response = retrieve_product(self, "product_1")
+            self.assertEqual(retrieve_product_response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_retrieve_product_not_modified(self):
+        with self.client:
+            jwt_auth = create_admin_user_and_sign_in(self)
+            create_product_python(self, jwt_auth)
+            retrieve_product_response = retrieve_product(self, "python_v3_7")
+            etag = retrieve_product_response.headers.get("ETag")
+            last_modified = retrieve_product_response.headers.get("Last-Modified")
+            self.assertIsNotNone(etag)
+            self.assertIsNotNone(last_modified)
+
+            not_modified_response = self.client.get(
+                "api/v1/products/python_v3_7", headers={"If-None-Match": etag}
+            )
+            self.assertEqual(not_modified_response.status_code, HTTPStatus.NOT_MODIFIED)
+            self.assertEqual(not_modified_response.data, b"")
+            self.assertEqual(not_modified_response.headers.get("ETag"), etag)
+            not_modified_response = self.client.get(
+                "api/v1/products/python_v3_7", headers={"If-Modified-Since": last_modified}
+            )
+            self.assertEqual(not_modified_response.status_code, HTTPStatus.NOT_MODIFIED)
+
+            update_product(
+                self,
+                "python_v3_7",
+                "http://www.test.com",
+                "//table/tr//td/text()",
+                "//div//a/@href",
+                jwt_auth,
+            )
+            modified_response = self.client.get(
+                "api/v1/products/python_v3_7", headers={"If-None-Match": etag}
+            )
+            self.assertEqual(modified_response.status_code, HTTPStatus.OK)
+            self.assertNotEqual(modified_response.headers.get("ETag"), etag)
+            self.assertEqual(modified_response.get_json()["product_name"], "python_v3_7")
+
+    def test_retrieve_all_products_not_modified(self):
+        with self.client:
+            jwt_auth = create_admin_user_and_sign_in(self)
+            create_numbered_products(self, jwt_auth, [1, 2])
+            for url in ["api/v1/products/", "api/v1/products/?limit=5"]:
+                etag = self.client.get(url).headers.get("ETag")
+                not_modified_response = self.client.get(url, headers={"If-None-Match": etag})
+                self.assertEqual(not_modified_response.status_code, HTTPStatus.NOT_MODIFIED)
+
+            etag = self.client.get("api/v1/products/").headers.get("ETag")
+            delete_product(self, "product_2", jwt_auth)
+            modified_response = self.client.get("api/v1/products/", headers={"If-None-Match": etag})
+            self.assertEqual(modified_response.status_code, HTTPStatus.OK)
+            self.assertEqual(modified_response.get_json()["total_items"], 1)
+
+    def test_update_product_if_match(self):
+        with self.client:
+            jwt_auth = create_admin_user_and_sign_in(self)
+            create_numbered_products(self, jwt_auth, [1])
+            etag = retrieve_product(self, "product_1").headers.get("ETag")
+            request_data = "release_info_url=http://www.test.com"
+            headers = {"Authorization": f"Bearer {jwt_auth}", "If-Match": etag}
+            update_product_response = self.client.put(
+                "api/v1/products/product_1",
+                headers=headers,
+                data=request_data,
+                content_type="application/x-www-form-urlencoded",
+            )
+            self.assertEqual(update_product_response.status_code, HTTPStatus.OK)
+            self.assertEqual(update_product_response.get_json()["release_info_url"], "http://www.test.com")
+            updated_etag = update_product_response.headers.get("ETag")
+            self.assertNotEqual(updated_etag, etag)
+            self.assertEqual(retrieve_product(self, "product_1").headers.get("ETag"), updated_etag)
+
+            # a second update based on the same (now outdated) copy is rejected
+            conflict_response = self.client.put(
+                "api/v1/products/product_1",
+                headers=headers,
+                data="release_info_url=http://www.other.com",
+                content_type="application/x-www-form-urlencoded",
+            )
+            self.assertEqual(conflict_response.status_code, HTTPStatus.PRECONDITION_FAILED)
+            self.assertEqual(conflict_response.get_json()["status"], "fail")
+            self.assertEqual(Product.find_by_name("product_1").release_info_url, "http://www.test.com")
+
+            for if_match in ['"not-an-etag"', "W/" + updated_etag]:
+                headers["If-Match"] = if_match
+                invalid_response = self.client.put(
+                    "api/v1/products/product_1",
+                    headers=headers,
+                    data=request_data,
+                    content_type="application/x-www-form-urlencoded",
+                )
+                self.assertEqual(invalid_response.status_code, HTTPStatus.PRECONDITION_FAILED)
+
+            headers["If-Match"] = "*"
+            any_response = self.client.put(
+                "api/v1/products/product_1",
+                headers=headers,
+                data=request_data,
+                content_type="application/x-www-form-urlencoded",
+            )
+            self.assertEqual(any_response.status_code, HTTPStatus.OK)
+            not_found_response = self.client.put(
+                "api/v1/products/product_2",
+                headers=dict(headers, **{"If-Match": updated_etag}),
+                data=request_data,
+                content_type="application/x-www-form-urlencoded",
+            )
+            self.assertEqual(not_found_response.status_code, HTTPStatus.NOT_FOUND)
+
     def test_update_product_does_not_exist(self):
         with self.client:
             jwt_auth = create_admin_user_and_sign_in(self)
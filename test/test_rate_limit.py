@@ -0,0 +1,106 @@
+"""Unit tests for RateLimiter class and its bucket backends."""
+import os
+import sqlite3
+import tempfile
+import timeit
+import unittest
+from unittest import mock
+
+from app.util.rate_limit import (
+    MemoryBackend,
+    RateLimitExceeded,
+    RateLimiter,
+    SqliteBackend,
+)
+
+
+class RateLimiterTestMixin:
+    def make_backend(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.limiter = RateLimiter()
+        self.limiter.configure(
+            enabled=True, backend=self.make_backend(), limits=dict(ip=(3, 3))
+        )
+
+    def test_bucket_empties_and_refills(self):
+        with mock.patch("app.util.rate_limit.time.time", return_value=1000.0):
+            for remaining in (2, 1, 0):
+                state = self.limiter.enforce("ip", "127.0.0.1")
+                self.assertTrue(state.allowed)
+                self.assertEqual(state.remaining, remaining)
+            with self.assertRaises(RateLimitExceeded) as context:
+                self.limiter.enforce("ip", "127.0.0.1")
+            state = context.exception.state
+            self.assertEqual(state.retry_after, 1)
+            self.assertEqual(state.reset, 3)
+            self.assertEqual(state.headers["Retry-After"], "1")
+            self.assertTrue(self.limiter.enforce("ip", "127.0.0.2").allowed)
+        with mock.patch("app.util.rate_limit.time.time", return_value=1001.0):
+            state = self.limiter.enforce("ip", "127.0.0.1")
+            self.assertEqual(state.remaining, 0)
+            self.assertNotIn("Retry-After", state.headers)
+        stats = self.limiter.stats()
+        self.assertEqual(stats["checks"], 6)
+        self.assertEqual(stats["limited"], 1)
+
+    def test_unlimited_scope(self):
+        self.assertIsNone(self.limiter.enforce("email", "user@email.com"))
+        self.limiter.enabled = False
+        self.assertIsNone(self.limiter.enforce("ip", "127.0.0.1"))
+
+
+class TestMemoryBackend(RateLimiterTestMixin, unittest.TestCase):
+    def make_backend(self):
+        return MemoryBackend(maxsize=2)
+
+    def test_least_recently_used_bucket_discarded(self):
+        for key in ("a", "b", "a", "c"):
+            self.limiter.hit("ip", key)
+        self.assertEqual(list(self.limiter.backend._buckets), ["ip:a", "ip:c"])
+
+    def test_hit_cost(self):
+        self.limiter.configure(
+            enabled=True, backend=MemoryBackend(), limits=dict(ip=(10 ** 9, 1))
+        )
+        number = 10000
+        seconds = timeit.timeit(
+            lambda: self.limiter.hit("ip", "127.0.0.1"), number=number
+        )
+        self.assertLess(seconds / number, 50e-6)
+
+
+class TestSqliteBackend(RateLimiterTestMixin, unittest.TestCase):
+    def make_backend(self):
+        fd, self.path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.addCleanup(os.remove, self.path)
+        return SqliteBackend(self.path)
+
+    def test_buckets_shared_between_backends(self):
+        other_backend = SqliteBackend(self.path)
+        with mock.patch("app.util.rate_limit.time.time", return_value=1000.0):
+            self.limiter.enforce("ip", "127.0.0.1")
+            allowed, tokens = other_backend.take("ip:127.0.0.1", 3, 1, 1000.0)
+        self.assertTrue(allowed)
+        self.assertEqual(tokens, 1)
+
+    def test_locked_database_fails_open(self):
+        backend = self.limiter.backend
+        backend.take("ip:127.0.0.1", 3, 1, 1000.0)
+        locking_connection = sqlite3.connect(self.path, isolation_level=None)
+        locking_connection.execute("BEGIN IMMEDIATE")
+        try:
+            backend.timeout_seconds = 0
+            other_backend = SqliteBackend(self.path, timeout_seconds=0)
+            allowed, tokens = other_backend.take("ip:127.0.0.1", 3, 1, 1000.0)
+        finally:
+            locking_connection.execute("ROLLBACK")
+            locking_connection.close()
+        self.assertTrue(allowed)
+        self.assertEqual(other_backend.errors, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()